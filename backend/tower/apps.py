@@ -1,4 +1,11 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 class TowerConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
\ No newline at end of file
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from .db import check_connections, health_checks_enabled
+
+        if health_checks_enabled():
+            request_started.connect(check_connections, dispatch_uid='tower_db_health_checks')
@@ -0,0 +1,262 @@
+"""
+Monthly archives of the Auditlog table.
+Whole months older than the retention window are exported to gzipped JSON
+Lines files (newest row first) and removed from the hot table. Archived
+months can still be read back for date-filtered audit queries, paged by a
+cursor holding the (timestamp, id) of the last row returned.
+"""
+import base64
+import binascii
+import gzip
+import heapq
+import json
+import os
+import re
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from itertools import dropwhile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .audit import get_audit_config
+from .models import Auditlog
+
+ARCHIVE_FIELDS = ('id', 'user', 'action', 'object_type', 'object_repr', 'object_id', 'timestamp', 'changes')
+ARCHIVE_NAME = re.compile(r'^auditlog-(\d{4})-(\d{2})(?:\.part(\d+))?\.jsonl\.gz$')
+
+
+def get_archive_dir():
+    return get_audit_config()['ARCHIVE_DIR']
+
+
+def month_bounds(year, month):
+    """Return the [start, end) datetimes of a calendar month in UTC."""
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+def archived_months():
+    """
+    List archived months and their files.
+
+    Returns:
+        dict: {(year, month): [file paths]} sorted newest month first
+    """
+    directory = get_archive_dir()
+    if not os.path.isdir(directory):
+        return {}
+
+    months = {}
+    for name in sorted(os.listdir(directory)):
+        match = ARCHIVE_NAME.match(name)
+        if match:
+            key = (int(match.group(1)), int(match.group(2)))
+            months.setdefault(key, []).append(os.path.join(directory, name))
+    return dict(sorted(months.items(), reverse=True))
+
+
+def _archived_ids(paths):
+    ids = set()
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            ids.update(json.loads(line)['id'] for line in archive if line.strip())
+    return ids
+
+
+def _delete_rows(ids, batch_size):
+    for position in range(0, len(ids), batch_size):
+        Auditlog.objects.filter(pk__in=ids[position:position + batch_size]).delete()
+
+
+def archive_month(year, month, delete_batch_size=5000):
+    """
+    Export one month of audit rows to a compressed file and delete them.
+
+    Re-running for a month that already has files writes an extra part file
+    for rows that arrived later. Rows already present in the month's files
+    (left in the table by a run interrupted before its delete) are deleted
+    instead of being exported a second time.
+
+    Returns:
+        int: Number of rows archived
+    """
+    directory = get_archive_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    existing = archived_months().get((year, month), [])
+    suffix = f".part{len(existing)}" if existing else ''
+    path = os.path.join(directory, f"auditlog-{year:04d}-{month:02d}{suffix}.jsonl.gz")
+    start, end = month_bounds(year, month)
+
+    rows = Auditlog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    already_archived = _archived_ids(existing)
+    if already_archived:
+        leftover = [pk for pk in rows.values_list('pk', flat=True).iterator() if pk in already_archived]
+        _delete_rows(leftover, delete_batch_size)
+
+    archived_ids = []
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+        for row in rows.order_by('-timestamp', '-id').values(*ARCHIVE_FIELDS).iterator(chunk_size=2000):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            archived_ids.append(row['id'])
+
+    if not archived_ids:
+        os.remove(tmp_path)
+        return 0
+
+    os.replace(tmp_path, path)
+    _delete_rows(archived_ids, delete_batch_size)
+    return len(archived_ids)
+
+
+def months_before(cutoff):
+    """Return the (year, month) pairs with hot rows entirely older than ``cutoff``."""
+    cutoff_month = datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc)
+    return [
+        (day.year, day.month)
+        for day in Auditlog.objects.filter(timestamp__lt=cutoff_month).dates('timestamp', 'month')
+    ]
+
+
+def _iter_file(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            if line.strip():
+                row = json.loads(line)
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                yield Auditlog(**row)
+
+
+def _matches(entry, filters):
+    for field in ('user', 'action', 'object_type'):
+        if filters.get(field) and getattr(entry, field) != filters[field]:
+            return False
+    if filters.get('object_id') is not None and entry.object_id != int(filters['object_id']):
+        return False
+
+    timestamp_range = filters.get('timestamp')
+    if timestamp_range:
+        if timestamp_range.start and entry.timestamp < timestamp_range.start:
+            return False
+        if timestamp_range.stop and entry.timestamp > timestamp_range.stop:
+            return False
+    return True
+
+
+def overlapping_months(timestamp_range):
+    """Return the archived months that a ``slice(start, stop)`` date range touches."""
+    if not timestamp_range or not (timestamp_range.start or timestamp_range.stop):
+        return []
+
+    months = []
+    for (year, month) in archived_months():
+        start, end = month_bounds(year, month)
+        if timestamp_range.start and end <= timestamp_range.start:
+            continue
+        if timestamp_range.stop and start > timestamp_range.stop:
+            continue
+        months.append((year, month))
+    return months
+
+
+def encode_position(entry):
+    """Return an opaque cursor for the rows after ``entry`` in (-timestamp, -id) order."""
+    payload = json.dumps({'t': entry.timestamp.isoformat(), 'id': entry.id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_position(cursor):
+    """Return the (timestamp, id) stored in a cursor, or raise ValueError if it is not one."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp, pk = parse_datetime(payload['t']), payload['id']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor.')
+    if timestamp is None or timestamp.tzinfo is None or type(pk) is not int:
+        raise ValueError('Invalid cursor.')
+    return timestamp, pk
+
+
+def _key(entry):
+    return entry.timestamp, entry.id
+
+
+def iter_archived_entries(months, filters, before=None):
+    """
+    Iterate archived Auditlog rows (unsaved instances) newest first.
+
+    Args:
+        months (list): (year, month) pairs to read
+        filters (dict): Cleaned AuditlogFilter data
+        before (tuple): Optional (timestamp, id) to resume below; later months are not read
+
+    Yields:
+        Auditlog: Matching archived rows ordered by (-timestamp, -id)
+    """
+    files = archived_months()
+    if before:
+        months = [month for month in months if month_bounds(*month)[0] <= before[0]]
+    streams = [_iter_file(path) for month in months for path in files.get(month, [])]
+    if before:
+        streams = [dropwhile(lambda e: _key(e) >= before, stream) for stream in streams]
+    merged = heapq.merge(*streams, key=_key, reverse=True)
+    return (entry for entry in merged if _matches(entry, filters))
+
+
+def iter_with_archive(queryset, months, filters, before=None):
+    """
+    Merge a filtered hot-table queryset with archived months, newest first.
+
+    Args:
+        queryset (QuerySet): Filtered Auditlog queryset
+        months (list): (year, month) pairs to read from the archive
+        filters (dict): Cleaned AuditlogFilter data
+        before (tuple): Optional (timestamp, id) from ``decode_position`` to resume below
+
+    Yields:
+        Auditlog: Rows ordered by (-timestamp, -id)
+    """
+    returned = []
+    if before:
+        timestamp, pk = before
+        # Table rows of the previous page whose archived copy sorts below the cursor
+        returned = [
+            key for key in queryset.filter(
+                timestamp__gte=timestamp, timestamp__lte=timestamp + timedelta(milliseconds=1)
+            ).values_list('timestamp', 'id')
+            if key >= before
+        ]
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+    hot = queryset.order_by('-timestamp', '-id').iterator(chunk_size=500)
+    return _drop_duplicates(heapq.merge(
+        hot,
+        iter_archived_entries(months, filters, before),
+        key=_key,
+        reverse=True
+    ), returned)
+
+
+def _drop_duplicates(entries, returned=()):
+    """
+    Skip rows seen already: a row is both archived and in the table until an
+    interrupted archive run is repeated. Archived timestamps are truncated to
+    the millisecond, so both copies are at most 1 ms apart in the merge and
+    only the ids of the last millisecond are kept. ``returned`` holds the
+    (timestamp, id) of rows a previous page already returned.
+    """
+    recent = deque(sorted(returned, reverse=True))  # (timestamp, id), newest first
+    seen = {pk for _, pk in recent}
+    for entry in entries:
+        if entry.id in seen:
+            continue
+        horizon = entry.timestamp + timedelta(milliseconds=1)
+        while recent and recent[0][0] > horizon:
+            seen.discard(recent.popleft()[1])
+        recent.append(_key(entry))
+        seen.add(entry.id)
+        yield entry
@@ -0,0 +1,313 @@
+"""
+Async counterparts of the Tower API helpers in tower.utils.
+Used by the ASGI views (tower.async_views). Requests go through one
+httpx.AsyncClient per event loop, whose connection pool is shared by every
+Tower target; credentials are passed per request. Errors are raised as
+requests.RequestException with the same messages as the sync helpers so
+both paths produce identical responses.
+"""
+import asyncio
+import time
+import weakref
+from urllib.parse import urljoin
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .breaker import arecord_result, get_breaker, is_failure_status
+from .deadlines import (
+    call_timeout, deadline_outcome, latency_key, mark_partial, record_latency, remaining, time_left
+)
+from .metrics import instrumented, record_remote, record_secret_lookup
+from .profiling import record_tower_call
+from .secret_cache import get_instance_password, get_secret_cache, prime_secrets
+
+RETRY_STATUSES = (502, 503, 504)
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the AsyncClient of the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            verify=False,
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'TOWER_ASYNC_MAX_CONNECTIONS', 200),
+                max_keepalive_connections=getattr(settings, 'TOWER_ASYNC_MAX_KEEPALIVE', 50),
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _load_instances(queryset):
+    instances = list(queryset.defer('password'))
+    prime_secrets(instances)
+    return instances
+
+
+async def load_instances(queryset):
+    """Evaluate a TowerInstance queryset (password deferred) and cache the instances' secrets."""
+    return await sync_to_async(_load_instances)(queryset)
+
+
+async def get_instance_auth(tower_instance):
+    """Return (username, password) for a TowerInstance, normally without touching the database."""
+    password = get_secret_cache().get(tower_instance.pk, tower_instance.updated_at)
+    if password is None:
+        # get_instance_password records the miss
+        password = await sync_to_async(get_instance_password)(tower_instance)
+    else:
+        record_secret_lookup(True)
+    return tower_instance.username, password
+
+
+async def _send(method, url, auth, timeout, **kwargs):
+    retries = getattr(settings, 'TOWER_HTTP_RETRIES', 3) if method in ('GET', 'HEAD', 'OPTIONS') else 0
+    backoff = getattr(settings, 'TOWER_HTTP_BACKOFF_FACTOR', 0.5)
+    client = get_async_client()
+
+    for attempt in range(retries + 1):
+        response = await client.request(method, url, auth=auth, timeout=timeout, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            break
+        await asyncio.sleep(backoff * (2 ** attempt))
+    return response
+
+
+async def request(method, url, auth, timeout=10, tower_instance=None, **kwargs):
+    """
+    Send one request, retrying idempotent ones on 502/503/504 like the sync sessions.
+
+    Like ``utils.TowerSession``, the timeout is bounded by the request
+    deadline, calls to a ``tower_instance`` go through its circuit breaker
+    and latency history, and every call is recorded in the metrics.
+
+    Raises:
+        CircuitOpenError: If the instance's circuit is open
+        DeadlineExceeded: If the request deadline has already passed
+        httpx.HTTPError: If the request fails or the final status is an error
+    """
+    key = latency_key(tower_instance) if tower_instance is not None else None
+    label = tower_instance.name if tower_instance is not None else 'unregistered'
+    timeout, budget_bound = call_timeout(key, timeout)
+    breaker = get_breaker(tower_instance) if tower_instance is not None else None
+    if breaker is not None:
+        breaker.allow()
+
+    started = time.monotonic()
+    try:
+        response = await _send(method, url, auth, timeout, **kwargs)
+    except asyncio.CancelledError:
+        # Abandoned by afan_out at the deadline
+        elapsed = time.monotonic() - started
+        record_remote(label, method, 'cancelled', elapsed)
+        record_tower_call(label, method, url, 'cancelled', elapsed)
+        if breaker is not None:
+            breaker.release()
+        raise
+    except Exception as e:
+        elapsed = time.monotonic() - started
+        record_remote(label, method, 'error', elapsed)
+        record_tower_call(label, method, url, 'error', elapsed)
+        if budget_bound and isinstance(e, httpx.TimeoutException):
+            mark_partial()
+            if breaker is not None:
+                breaker.release()
+        elif breaker is not None:
+            await arecord_result(breaker, False, e)
+        raise
+
+    elapsed = time.monotonic() - started
+    record_remote(label, method, response.status_code, elapsed)
+    record_tower_call(label, method, url, response.status_code, elapsed)
+    failed = is_failure_status(response.status_code)
+    if not failed:
+        record_latency(key, elapsed)
+    if breaker is not None:
+        await arecord_result(breaker, not failed, f"HTTP {response.status_code}" if failed else None)
+
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+
+async def aiter_tower_results(base_url, path, auth, params=None, page_size=None, timeout=10, first_page=None,
+                              tower_instance=None, deadline=None):
+    """Async version of ``utils.iter_tower_results`` (the next page is fetched while one is consumed)."""
+    if page_size is None:
+        page_size = getattr(settings, 'TOWER_PAGE_SIZE', 200)
+
+    url = base_url.rstrip('/') + path
+    params = dict(params or {}, page_size=page_size)
+
+    async def get_page(page_url, page_params=None):
+        return (await request(
+            'GET', page_url, auth, timeout=time_left(timeout, deadline), tower_instance=tower_instance,
+            params=page_params
+        )).json()
+
+    page = first_page if first_page is not None else await get_page(url, params)
+    while True:
+        next_url = page.get('next')
+        pending = asyncio.ensure_future(get_page(urljoin(url, next_url))) if next_url else None
+        try:
+            for item in page.get('results', []):
+                yield item
+        except BaseException:
+            if pending:
+                pending.cancel()
+            raise
+
+        if not pending:
+            return
+        page = await pending
+
+
+@instrumented('afetch_tower_credential_types')
+async def afetch_tower_credential_types(tower_instance, etag=None, last_modified=None, timeout=10):
+    """Async version of ``utils.fetch_tower_credential_types``."""
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    path = '/api/v2/credential_types/'
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    deadline = time.monotonic() + timeout
+    try:
+        auth = await get_instance_auth(tower_instance)
+        response = await request(
+            'GET',
+            tower_instance.url.rstrip('/') + path,
+            auth,
+            timeout=timeout,
+            tower_instance=tower_instance,
+            params={'page_size': getattr(settings, 'TOWER_PAGE_SIZE', 200)},
+            headers=headers,
+        )
+        if response.status_code == 304:
+            return {'not_modified': True, 'results': None, 'etag': etag, 'last_modified': last_modified}
+
+        results = [
+            item async for item in aiter_tower_results(
+                tower_instance.url, path, auth, timeout=timeout, first_page=response.json(),
+                tower_instance=tower_instance, deadline=deadline
+            )
+        ]
+        return {
+            'not_modified': False,
+            'results': results,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+    except (httpx.HTTPError, requests.RequestException) as e:
+        raise requests.RequestException(f"Failed to fetch credential types from {tower_instance.name}: {e}")
+
+
+@instrumented('aget_tower_credential_types')
+async def aget_tower_credential_types(tower_instance, timeout=10):
+    """Async version of ``utils.get_tower_credential_types``."""
+    return (await afetch_tower_credential_types(tower_instance, timeout=timeout))['results']
+
+
+@instrumented('aget_tower_credentials')
+async def aget_tower_credentials(tower_instance, timeout=10):
+    """Async version of ``utils.get_tower_credentials``."""
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    try:
+        auth = await get_instance_auth(tower_instance)
+        return [
+            item async for item in aiter_tower_results(
+                tower_instance.url, '/api/v2/credentials/', auth, timeout=timeout, tower_instance=tower_instance,
+                deadline=time.monotonic() + timeout
+            )
+        ]
+
+    except (httpx.HTTPError, requests.RequestException) as e:
+        raise requests.RequestException(f"Failed to fetch credentials from {tower_instance.name}: {e}")
+
+
+@instrumented('acreate_tower_credential_type')
+async def acreate_tower_credential_type(tower_instance, credential_type_data):
+    """Async version of ``utils.create_tower_credential_type``."""
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    try:
+        response = await request(
+            'POST',
+            tower_instance.url.rstrip('/') + '/api/v2/credential_types/',
+            await get_instance_auth(tower_instance),
+            tower_instance=tower_instance,
+            json=credential_type_data,
+        )
+        return response.json()
+
+    except (httpx.HTTPError, requests.RequestException) as e:
+        raise requests.RequestException(f"Failed to create credential type in {tower_instance.name}: {e}")
+
+
+async def afan_out(instances, func, max_workers=None):
+    """
+    Async version of ``utils.fan_out``: awaits ``func(instance)`` for every instance concurrently.
+
+    Instances still running when the request deadline passes are cancelled
+    and reported with a DeadlineExceeded error and ``timed_out`` set.
+
+    Args:
+        instances (iterable): TowerInstance model objects
+        func (callable): Coroutine function called as ``func(instance)``
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+
+    Returns:
+        list: Outcome dictionaries (see ``utils.iter_fan_out``) in the order of ``instances``
+    """
+    instances = list(instances)
+    if max_workers is None:
+        max_workers = getattr(settings, 'TOWER_FANOUT_MAX_WORKERS', 16)
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def timed_call(instance):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result, error = await func(instance), None
+            except Exception as e:
+                result, error = None, e
+            return {
+                'instance': instance,
+                'result': result,
+                'error': error,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            }
+
+    if not instances:
+        return []
+
+    # Tasks run in a copy of the current context, so the request deadline applies to them
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(timed_call(instance)) for instance in instances]
+    left = remaining()
+    done, pending = await asyncio.wait(tasks, timeout=None if left is None else max(0, left))
+    if pending:
+        mark_partial()
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return [
+        task.result() if task in done else deadline_outcome(instance, started)
+        for task, instance in zip(tasks, instances)
+    ]
@@ -0,0 +1,277 @@
+"""
+Async (ASGI) versions of the Tower-facing views.
+Selected by tower.urls when TOWER_ASYNC_VIEWS is set (asgi.py sets it), so
+Tower calls wait on the event loop instead of blocking a worker thread.
+They answer the same URLs with the same payloads as the DRF views in
+tower.views and reuse their helpers; database work runs via sync_to_async.
+"""
+import json
+from functools import wraps
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, JsonResponse
+from rest_framework import exceptions, permissions
+from rest_framework.settings import api_settings
+
+from .async_tower import (
+    acreate_tower_credential_type,
+    afan_out,
+    aget_tower_credential_types,
+    aget_tower_credentials,
+    aiter_tower_results,
+    load_instances,
+    request as tower_request,
+)
+from .cache import afetch_cached_credential_types, aget_credential_type_index
+from .credential_search import parse_listing_params, select_instances, wants_merged_listing
+from .models import TowerConfig, TowerInstance
+from .sync import snapshot_credential_type_outcomes
+from .views import (
+    VERIFY_REQUEST_MESSAGE,
+    _credential_snapshot,
+    _credential_sources,
+    _credential_type_matrix,
+    _duplicate_outcome_results,
+    _instance_timing,
+    _match_alternative_names,
+    _merged_credentials_page,
+    _parse_duplicate_jobs,
+    _parse_verify_request,
+    _plan_duplicates,
+    _verify_results,
+    _wants_stream,
+)
+
+
+def _authenticate(request):
+    """Runs the configured DRF authentication classes against a plain Django request."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return AnonymousUser()
+
+
+def async_api_view(methods, permission_classes=(permissions.IsAuthenticated,)):
+    """
+    Minimal @api_view for async views: method check, authentication,
+    permissions and a parsed JSON body in ``request.data``.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            try:
+                request.user = await sync_to_async(_authenticate)(request)
+            except exceptions.APIException as e:
+                return JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+
+            for permission_class in permission_classes:
+                if not permission_class().has_permission(request, None):
+                    if not request.user.is_authenticated:
+                        detail, code = 'Authentication credentials were not provided.', 401
+                    else:
+                        detail, code = 'You do not have permission to perform this action.', 403
+                    return JsonResponse({'detail': detail}, status=code)
+
+            request.data = {}
+            if request.body:
+                try:
+                    request.data = json.loads(request.body)
+                except ValueError as e:
+                    return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
+
+            return await view(request, *args, **kwargs)
+
+        # Token-authenticated API: no session cookie, so no CSRF check (as with DRF views)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def _load_instances_by_name(names):
+    """Async counterpart of ``views._instances_by_name`` that also caches the instances' secrets."""
+    instances = {}
+    for instance in await load_instances(TowerInstance.objects.filter(name__in=names)):
+        instances.setdefault(instance.name, instance)
+    return instances
+
+
+# ========================
+# Connection Testing
+# ========================
+@async_api_view(['POST'])
+async def test_connection(request):
+    """Tests connection to an AAP instance with provided credentials."""
+    url = request.data.get('url')
+    username = request.data.get('username')
+    password = request.data.get('password')
+
+    if not all([url, username, password]):
+        return JsonResponse({'message': 'URL, username, and password are required.'}, status=400)
+
+    try:
+        await tower_request('GET', url.rstrip('/') + '/api/v2/ping/', (username, password), timeout=5)
+        return JsonResponse({'message': 'Connection successful!'})
+
+    except httpx.TimeoutException:
+        return JsonResponse({'message': 'Connection timed out.'}, status=408)
+
+    except httpx.ConnectError:
+        return JsonResponse({'message': 'Could not connect to the AAP instance. Check the URL.'}, status=503)
+
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in [401, 403]:
+            return JsonResponse({'message': 'Authentication failed: Invalid credentials.'}, status=401)
+        return JsonResponse(
+            {'message': f'HTTP Error: {e.response.status_code} - {e.response.reason_phrase}'},
+            status=e.response.status_code
+        )
+
+    except Exception as e:
+        return JsonResponse({'message': f'An unexpected error occurred: {str(e)}'}, status=500)
+
+
+# ========================
+# Tower Credential Proxy
+# ========================
+@async_api_view(['GET'])
+async def tower_credentials(request):
+    """Proxies credential list calls to Ansible Tower using DB-stored credentials."""
+    if wants_merged_listing(request.GET):
+        return await _merged_credentials(request)
+
+    instance_id = request.GET.get('instance')
+    if instance_id:
+        snapshot = await sync_to_async(_credential_snapshot)(instance_id)
+        if snapshot is None:
+            return JsonResponse({"detail": "Inventory of this instance has not been synced yet."}, status=404)
+        credentials, headers = snapshot
+        response = JsonResponse(credentials, safe=False)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    cfg = await sync_to_async(TowerConfig.objects.first)()
+    if not cfg:
+        return JsonResponse({"detail": "TowerConfig not configured."}, status=503)
+
+    try:
+        credentials = [
+            item async for item in aiter_tower_results(
+                cfg.base_url, '/api/v2/credentials/', (cfg.username, cfg.password), timeout=10
+            )
+        ]
+        return JsonResponse(credentials, safe=False)
+
+    except httpx.HTTPError as e:
+        return JsonResponse({"detail": f"Error contacting Tower: {e}"}, status=502)
+
+
+async def _merged_credentials(request):
+    """Async counterpart of ``TowerCredentialProxy.list_merged``."""
+    try:
+        listing = parse_listing_params(request.GET)
+    except exceptions.ValidationError as e:
+        return JsonResponse({'detail': e.detail[0]}, status=400)
+
+    instances = await load_instances(select_instances(request.GET))
+    snapshot, live_instances = await sync_to_async(_credential_sources)(request.GET, instances)
+
+    timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+    live = {
+        o['instance'].pk: o
+        for o in await afan_out(live_instances, lambda instance: aget_tower_credentials(instance, timeout=timeout))
+    }
+    outcomes = [snapshot.get(instance.pk) or live[instance.pk] for instance in instances]
+    return JsonResponse(_merged_credentials_page(request, outcomes, listing))
+
+
+# ========================
+# Credential Type Management
+# ========================
+@async_api_view(['GET'])
+async def credential_type_status(request):
+    """Returns all unique CredentialTypes found across Tower instances with their presence status."""
+    instances = await load_instances(TowerInstance.objects.all())
+    refresh = request.GET.get('refresh') in ('1', 'true')
+    source = request.GET.get('source', getattr(settings, 'TOWER_INVENTORY_SOURCE', 'snapshot'))
+
+    if source == 'snapshot' and not refresh:
+        snapshot, live_instances = await sync_to_async(snapshot_credential_type_outcomes)(instances)
+    else:
+        snapshot, live_instances = {}, instances
+
+    live = {o['instance'].pk: o for o in await afetch_cached_credential_types(live_instances, refresh=refresh)}
+    outcomes = [snapshot.get(instance.pk) or live[instance.pk] for instance in instances]
+
+    return JsonResponse({
+        'results': _credential_type_matrix(outcomes),
+        'instances': [_instance_timing(outcome) for outcome in outcomes],
+    })
+
+
+@async_api_view(['POST'])
+async def duplicate_missing_credential_type(request):
+    """
+    Duplicates credential types to instances where they are missing.
+
+    Same payloads as the sync view. Django 3.2 cannot stream from async
+    views, so ?stream=1 returns the complete NDJSON body at once.
+    """
+    jobs = _parse_duplicate_jobs(request.data)
+    if not jobs:
+        return JsonResponse({'message': 'Credential type name and missing instances are required.'}, status=400)
+
+    instances = await _load_instances_by_name({name for _, names in jobs for name in names})
+    types_by_instance, results = _plan_duplicates(jobs, instances)
+
+    async def duplicate(instance):
+        existing = {t.get('name') for t in await aget_tower_credential_types(instance)}
+        instance_results, created = [], []
+        for type_data in types_by_instance[instance.name]:
+            result = {'instance': instance.name, 'credential_type': type_data['name']}
+            if type_data['name'] in existing:
+                result['status'] = 'already_exists'
+            else:
+                try:
+                    created.append(await acreate_tower_credential_type(instance, type_data))
+                    existing.add(type_data['name'])
+                    result['status'] = 'duplicated'
+                except Exception as e:
+                    result.update(status='error', message=str(e))
+            instance_results.append(result)
+        return instance_results, created
+
+    targets = [instances[name] for name in types_by_instance]
+    record_outcome = sync_to_async(_duplicate_outcome_results)
+    for outcome in await afan_out(targets, duplicate):
+        results += await record_outcome(outcome, types_by_instance[outcome['instance'].name])
+
+    if _wants_stream(request):
+        body = ''.join(json.dumps(result) + '\n' for result in results)
+        return HttpResponse(body, content_type='application/x-ndjson')
+    return JsonResponse(results, safe=False)
+
+
+@async_api_view(['POST'])
+async def verify_credential_type_by_name(request):
+    """Verifies if a credential type exists under an alternative name in missing instances."""
+    params, errors = _parse_verify_request(request.data)
+    if errors:
+        return JsonResponse({'message': VERIFY_REQUEST_MESSAGE, 'errors': errors}, status=400)
+    alternative_names, missing_in_instances, limit = params
+
+    instances = await _load_instances_by_name(missing_in_instances)
+
+    async def verify(instance):
+        return _match_alternative_names(await aget_credential_type_index(instance), alternative_names, limit)
+
+    targets = [instances[name] for name in dict.fromkeys(missing_in_instances) if name in instances]
+    outcomes = {o['instance'].name: o for o in await afan_out(targets, verify)}
+    return JsonResponse(_verify_results(missing_in_instances, outcomes), safe=False)
@@ -0,0 +1,299 @@
+"""
+Batched audit log pipeline.
+Entries are queued in-process and written with bulk_create by a background
+thread once BATCH_SIZE entries are waiting or FLUSH_INTERVAL seconds have
+passed, together with the daily activity rollups. If the database is
+unavailable the batch is appended to a local spool file (shared by the
+worker processes under a file lock) and replayed after the next successful
+flush.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, InterfaceError, OperationalError, connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .metrics import AUDIT_ENTRIES, AUDIT_FLUSH_DURATION
+from .models import Auditlog
+from .rollups import apply_rollups
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, the spool is then safe for a single process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'async',  # 'async' (background batches) or 'sync' (write in the request, e.g. tests)
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+    'SPOOL_PATH': 'audit_spool.jsonl',
+    'RETENTION_DAYS': 90,  # months older than this are moved to ARCHIVE_DIR
+    'ARCHIVE_DIR': 'audit_archive',
+}
+
+SPOOL_FIELDS = ('user', 'action', 'object_type', 'object_repr', 'object_id', 'timestamp', 'changes')
+
+
+def get_audit_config():
+    """Return the audit pipeline settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_AUDIT', {}))
+
+
+class AuditWriter:
+    """Queues Auditlog rows and flushes them in batches."""
+
+    def __init__(self, config):
+        self.config = config
+        self._queue = queue.Queue(maxsize=config['MAX_QUEUE'])
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # Entries taken off the queue by the background thread but not yet written
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._write_lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'last_flush_ms': None,
+            'max_flush_ms': None,
+        }
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def stats(self):
+        """Return counters, queue depth and flush latency."""
+        with self._stats_lock:
+            return dict(self._stats, queue_depth=self._queue.qsize(), mode=self.config['MODE'])
+
+    def submit(self, entries):
+        """Queue unsaved Auditlog instances (written immediately in sync mode)."""
+        if not entries:
+            return
+        self._count(enqueued=len(entries))
+
+        if self.config['MODE'] == 'sync':
+            self._write(entries)
+            return
+
+        self._ensure_thread()
+        for position, entry in enumerate(entries):
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                # Never block the request: keep the overflow on disk instead
+                self._spool(entries[position:])
+                return
+
+    def flush(self):
+        """Write everything that is currently queued and wait for the batch in progress."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.config['BATCH_SIZE']:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+        with self._idle:
+            self._idle.wait_for(lambda: self._in_flight == 0, timeout=self.config['FLUSH_INTERVAL'] + 5)
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            with self._idle:
+                self._in_flight = 1
+            deadline = time.monotonic() + self.config['FLUSH_INTERVAL']
+            while len(batch) < self.config['BATCH_SIZE']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                with self._idle:
+                    self._in_flight += 1
+            try:
+                self._write(batch)
+            except Exception:
+                # Keep the writer alive: later batches must still be written
+                self._count(dropped=len(batch))
+                logger.exception("Error writing audit log batch of %d entries", len(batch))
+            finally:
+                with self._idle:
+                    self._in_flight = 0
+                    self._idle.notify_all()
+
+    def _write(self, batch):
+        """Insert one batch, falling back to the spool file if the database is down."""
+        if not batch:
+            return
+
+        started = time.monotonic()
+        with self._write_lock:
+            try:
+                self._bulk_insert(batch)
+            except (OperationalError, InterfaceError) as e:
+                logger.warning("Audit log database unavailable, spooling %d entries: %s", len(batch), e)
+                self._count(failed_flushes=1)
+                self._spool(batch)
+                connection.close()
+                AUDIT_FLUSH_DURATION.observe(time.monotonic() - started, outcome='spooled')
+                AUDIT_ENTRIES.inc(len(batch), outcome='spooled')
+                return
+
+            self._count(written=len(batch), flushes=1)
+            self._replay_spool()
+
+        elapsed = time.monotonic() - started
+        AUDIT_FLUSH_DURATION.observe(elapsed, outcome='written')
+        AUDIT_ENTRIES.inc(len(batch), outcome='written')
+        elapsed_ms = round(elapsed * 1000, 1)
+        with self._stats_lock:
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'] or 0, elapsed_ms)
+
+    def _bulk_insert(self, batch):
+        try:
+            with transaction.atomic():
+                Auditlog.objects.bulk_create(batch, batch_size=self.config['BATCH_SIZE'])
+                apply_rollups(batch)
+        except (OperationalError, InterfaceError):
+            raise
+        except DatabaseError as e:
+            # A single bad row must not sink the whole batch
+            logger.warning("Error creating audit log batch, retrying row by row: %s", e)
+            for entry in batch:
+                try:
+                    with transaction.atomic():
+                        entry.save()
+                        apply_rollups([entry])
+                except (OperationalError, InterfaceError):
+                    raise
+                except DatabaseError as row_error:
+                    self._count(dropped=1)
+                    logger.error("Error creating audit log: %s", row_error)
+
+    def _spool(self, entries):
+        path = self.config['SPOOL_PATH']
+        lines = [_spool_line(entry) for entry in entries]
+        with self._write_lock, _spool_lock(path), open(path, 'a', encoding='utf-8') as spool:
+            spool.writelines(lines)
+        self._count(spooled=len(entries))
+
+    def _replay_spool(self):
+        """
+        Move spooled entries into the database once it accepts writes again.
+
+        All worker processes share the spool file, so the whole replay runs
+        under an exclusive lock on it. Entries stay in the ``.replaying`` file
+        until they are inserted: a replay that fails or is interrupted is
+        picked up again by the next one, in any process.
+        """
+        path = self.config['SPOOL_PATH']
+        replaying = path + '.replaying'
+        if not os.path.exists(path) and not os.path.exists(replaying):
+            return
+
+        with _spool_lock(path):
+            if os.path.exists(path):
+                if os.path.exists(replaying):
+                    # Left over by an interrupted replay: keep it and add the new entries
+                    with open(replaying, 'a', encoding='utf-8') as pending, open(path, encoding='utf-8') as spool:
+                        pending.write(spool.read())
+                    os.remove(path)
+                else:
+                    os.replace(path, replaying)
+            if not os.path.exists(replaying):
+                return
+
+            entries, rejected = [], []
+            with open(replaying, encoding='utf-8') as spool:
+                for line in spool:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                        row['timestamp'] = parse_datetime(row['timestamp'])
+                        entries.append(Auditlog(**row))
+                    except (ValueError, TypeError, KeyError) as e:
+                        rejected.append(line.rstrip('\n') + '\n')
+                        logger.error("Skipping unreadable audit spool entry: %s", e)
+
+            if rejected:
+                # Set aside for inspection instead of failing every later replay
+                with open(path + '.rejected', 'a', encoding='utf-8') as quarantine:
+                    quarantine.writelines(rejected)
+                with open(replaying, 'w', encoding='utf-8') as pending:
+                    pending.writelines(_spool_line(entry) for entry in entries)
+                self._count(dropped=len(rejected))
+
+            try:
+                self._bulk_insert(entries)
+            except (OperationalError, InterfaceError):
+                # Still unavailable: the entries stay in the replaying file for the next attempt
+                connection.close()
+                return
+
+            os.remove(replaying)
+        self._count(replayed=len(entries))
+
+
+def _spool_line(entry):
+    return json.dumps({field: getattr(entry, field) for field in SPOOL_FIELDS}, cls=DjangoJSONEncoder) + '\n'
+
+
+@contextmanager
+def _spool_lock(path):
+    """Exclusive lock on the spool file, across threads and worker processes."""
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Return the process-wide audit writer."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(get_audit_config())
+            atexit.register(_writer.flush)
+        return _writer
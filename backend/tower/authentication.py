@@ -0,0 +1,94 @@
+"""
+JWT authentication without a user SELECT per request.
+Access tokens carry ``username`` and ``role`` claims (added at issue time by
+TowerTokenObtainPairSerializer), so requests are authenticated from the
+token alone. Tokens issued before the claims existed fall back to the
+regular database lookup. An optional per-process cache re-checks that the
+user still exists, is active and has the same role at most once every
+REVOCATION_CACHE_TTL seconds: a user deactivated, deleted or demoted
+elsewhere (another worker, the admin, a shell) keeps their previous access
+until that TTL expires (changes through UserViewSet apply at once in the
+process that made them).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+DEFAULTS = {
+    'REVOCATION_CHECK': True,
+    'REVOCATION_CACHE_TTL': 60,
+}
+
+CLAIMS = ('username', 'role')
+
+# user id -> (expires_at, is_active, role), or (expires_at, None, None) for deleted users
+_user_states = {}
+_user_states_lock = threading.Lock()
+
+
+def get_jwt_claims_config():
+    """Return the claims authentication settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_JWT_CLAIMS', {}))
+
+
+class ClaimsTokenUser(TokenUser):
+    """Stateless user built from the claims of a validated access token."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', 'viewer')
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+def get_user_state(user_id, ttl):
+    """Return (is_active, role) of a user, reading the database at most once per ``ttl`` seconds."""
+    current = time.monotonic()
+    with _user_states_lock:
+        state = _user_states.get(user_id)
+        if state and state[0] > current:
+            return state[1], state[2]
+
+    row = get_user_model().objects.filter(pk=user_id).values_list('is_active', 'role').first()
+    is_active, role = row if row else (None, None)
+    with _user_states_lock:
+        _user_states[user_id] = (current + ttl, is_active, role)
+    return is_active, role
+
+
+def forget_user(user_id):
+    """Drop the cached state of a user that was changed or deleted in this process."""
+    with _user_states_lock:
+        _user_states.pop(user_id, None)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the username/role claims instead of loading the user."""
+
+    def get_user(self, validated_token):
+        claims = CLAIMS + (api_settings.USER_ID_CLAIM,)
+        if not all(claim in validated_token for claim in claims):
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+
+        config = get_jwt_claims_config()
+        if config['REVOCATION_CHECK']:
+            is_active, role = get_user_state(user.id, config['REVOCATION_CACHE_TTL'])
+            if is_active is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            if not is_active:
+                raise AuthenticationFailed("User is inactive", code="user_inactive")
+            # A role change applies before the token expires
+            user.role = role
+
+        return user
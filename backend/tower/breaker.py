@@ -0,0 +1,288 @@
+"""
+Per-instance circuit breakers for Tower calls.
+Every request made through a TowerInstance session (tower.utils) or the
+async client (tower.async_tower) is recorded here. When the failure rate in
+the last WINDOW seconds reaches FAILURE_RATE (over at least MIN_CALLS
+calls), the circuit opens and calls fail fast with CircuitOpenError instead
+of waiting for the timeout. After OPEN_TIMEOUT seconds (doubled on every
+consecutive re-open up to MAX_OPEN_TIMEOUT, with +/- JITTER) a single probe
+call is let through: success closes the circuit, failure re-opens it.
+Opening and closing also flips ``TowerInstance.status`` between 'active'
+and 'unavailable'; changes recorded in fan-out worker threads are queued
+and written by the request thread, so workers never open a database
+connection. Breakers are kept per process.
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.timezone import now
+
+from .models import TowerInstance
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WINDOW': 60,
+    'MIN_CALLS': 3,
+    'FAILURE_RATE': 0.5,
+    'OPEN_TIMEOUT': 30,
+    'MAX_OPEN_TIMEOUT': 300,
+    'JITTER': 0.2,
+}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# TowerInstance.status values managed by the breaker; other values (set by hand) are left alone
+STATUS_FOR_STATE = {CLOSED: 'active', OPEN: 'unavailable'}
+
+
+def get_breaker_config():
+    """Return the circuit breaker settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_CIRCUIT_BREAKER', {}))
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a Tower instance whose circuit is open."""
+
+
+def is_failure_status(status_code):
+    """Server errors count against the instance; 4xx answers mean it is up."""
+    return status_code >= 500
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker of one Tower instance."""
+
+    def __init__(self, pk, name, config):
+        self.pk = pk
+        self.name = name
+        self.config = config
+        self.state = CLOSED
+        self._calls = deque()  # (monotonic time, succeeded)
+        self._lock = threading.Lock()
+        self._probing = False
+        self._reopen_count = 0
+        self._retry_at = None
+        # The status column may still reflect another process or run until the first result
+        self._status_synced = False
+        self.opened_at = None
+        self.last_error = ''
+        self.last_failure_at = None
+        self.totals = {'calls': 0, 'failures': 0, 'rejected': 0}
+
+    def _prune(self, current):
+        horizon = current - self.config['WINDOW']
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _open(self, current):
+        self.state = OPEN
+        self.opened_at = now()
+        delay = min(
+            self.config['OPEN_TIMEOUT'] * (2 ** self._reopen_count),
+            self.config['MAX_OPEN_TIMEOUT'],
+        )
+        jitter = self.config['JITTER']
+        self._retry_at = current + delay * random.uniform(1 - jitter, 1 + jitter)
+        self._reopen_count += 1
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        if self.state != OPEN:
+            return 0
+        return max(0.0, round(self._retry_at - time.monotonic(), 1))
+
+    def allow(self):
+        """
+        Admit one call.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a probe is already in flight
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() >= self._retry_at:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.totals['rejected'] += 1
+            retry_in = self.retry_in()
+
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open, next probe in {retry_in}s)")
+
+    def release(self):
+        """Give back an admitted call that ended without a verdict (e.g. cut short by the request deadline)."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, succeeded, error=None):
+        """
+        Record the result of an admitted call.
+
+        Returns:
+            str: The new state when ``TowerInstance.status`` should be updated, else None
+        """
+        current = time.monotonic()
+        with self._lock:
+            previous = self.state
+            self.totals['calls'] += 1
+            self._calls.append((current, succeeded))
+            self._prune(current)
+
+            if succeeded:
+                if self.state == HALF_OPEN:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    self._reopen_count = 0
+                    self.opened_at = None
+            else:
+                self.totals['failures'] += 1
+                self.last_error = str(error or '')
+                self.last_failure_at = now()
+                if self.state == HALF_OPEN:
+                    self._open(current)
+                elif self.state == CLOSED:
+                    failures = sum(1 for _, ok in self._calls if not ok)
+                    if (len(self._calls) >= self.config['MIN_CALLS']
+                            and failures >= self.config['FAILURE_RATE'] * len(self._calls)):
+                        self._open(current)
+
+            if self.state != HALF_OPEN:
+                self._probing = False
+
+            if self.state in STATUS_FOR_STATE and (self.state != previous or not self._status_synced):
+                self._status_synced = True
+                return self.state
+            return None
+
+    def snapshot(self):
+        """Return the current state and window statistics."""
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            return {
+                'state': self.state,
+                'window_calls': calls,
+                'window_failures': failures,
+                'failure_rate': round(failures / calls, 3) if calls else 0.0,
+                'opened_at': self.opened_at,
+                'retry_in': self.retry_in(),
+                'last_error': self.last_error,
+                'last_failure_at': self.last_failure_at,
+                'totals': dict(self.totals),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(tower_instance):
+    """Return the breaker of a TowerInstance, or None when breakers are disabled."""
+    config = get_breaker_config()
+    if not config['ENABLED']:
+        return None
+    with _breakers_lock:
+        breaker = _breakers.get(tower_instance.pk)
+        if breaker is None:
+            breaker = _breakers[tower_instance.pk] = CircuitBreaker(tower_instance.pk, tower_instance.name, config)
+        breaker.name = tower_instance.name
+        return breaker
+
+
+def forget_breaker(tower_instance):
+    """Drop the breaker of an instance that was changed or deleted."""
+    with _breakers_lock:
+        _breakers.pop(tower_instance.pk, None)
+
+
+def update_instance_status(pk, state):
+    """Mirror a breaker transition in TowerInstance.status (without bumping the row version)."""
+    # Imported here: tower.dashboard imports tower.utils, which imports this module
+    from .dashboard import invalidate_dashboard
+
+    status = STATUS_FOR_STATE[state]
+    managed = list(STATUS_FOR_STATE.values())
+    if TowerInstance.objects.filter(pk=pk, status__in=managed).exclude(status=status).update(status=status):
+        invalidate_dashboard()
+
+
+# Status changes recorded in worker threads wait here for a request (or command)
+# thread: a DB write from a fan-out worker would leave a connection open in it
+_pending_status = {}
+_pending_lock = threading.Lock()
+_in_worker = contextvars.ContextVar('tower_breaker_in_worker', default=False)
+
+
+@contextmanager
+def worker_thread():
+    """Mark the current (worker) context: its status changes are queued instead of written."""
+    token = _in_worker.set(True)
+    try:
+        yield
+    finally:
+        _in_worker.reset(token)
+
+
+def flush_status_updates():
+    """Write the queued status changes; does nothing when called from a worker."""
+    if _in_worker.get():
+        return
+    with _pending_lock:
+        if not _pending_status:
+            return
+        pending = dict(_pending_status)
+        _pending_status.clear()
+    for pk, state in pending.items():
+        update_instance_status(pk, state)
+
+
+def record_result(breaker, succeeded, error=None):
+    """Record a call result and persist the status change it causes, if any (later, from a worker)."""
+    state = breaker.record(succeeded, error)
+    if state:
+        with _pending_lock:
+            _pending_status[breaker.pk] = state
+    flush_status_updates()
+
+
+async def arecord_result(breaker, succeeded, error=None):
+    """Async version of ``record_result``."""
+    state = breaker.record(succeeded, error)
+    if state:
+        await sync_to_async(update_instance_status)(breaker.pk, state)
+
+
+def health_scoreboard(instances):
+    """
+    Build one health entry per instance from its breaker.
+
+    Args:
+        instances (iterable): TowerInstance model objects
+
+    Returns:
+        list: Entries with the stored status, breaker state and window statistics
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+
+    scoreboard = []
+    for instance in instances:
+        breaker = breakers.get(instance.pk)
+        entry = {'id': instance.pk, 'name': instance.name, 'status': instance.status}
+        if breaker is None:
+            entry.update(state=CLOSED, window_calls=0, window_failures=0, failure_rate=0.0, totals=None)
+        else:
+            entry.update(breaker.snapshot())
+        entry['score'] = 0.0 if entry['state'] == OPEN else round(1 - entry['failure_rate'], 3)
+        scoreboard.append(entry)
+    return scoreboard
@@ -0,0 +1,300 @@
+"""
+Cache layer for remote Tower credential-type inventories.
+Entries are fresh for TTL seconds; after that they are served stale for up
+to STALE_TTL more seconds while a background thread revalidates them.
+The ``a``-prefixed functions are the async equivalents used by the ASGI views.
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .name_index import CredentialTypeNameIndex
+from .async_tower import afan_out, afetch_tower_credential_types
+from .utils import fan_out, fetch_tower_credential_types
+
+DEFAULTS = {
+    'BACKEND': 'local',  # 'local' (per process) or 'django' (shared between workers)
+    'ALIAS': 'default',  # Django cache alias used by the 'django' backend
+    'TTL': 300,
+    'STALE_TTL': 600,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMemoryBackend:
+    """Per-process dictionary backend."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DjangoCacheBackend:
+    """Backend on top of Django's cache framework, shared by all workers."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, value, timeout):
+        caches[self.alias].set(key, value, timeout)
+
+    def delete(self, key):
+        caches[self.alias].delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+# Name indexes per instance pk: (inventory version, CredentialTypeNameIndex)
+_name_indexes = {}
+_name_indexes_lock = threading.Lock()
+
+
+def get_cache_config():
+    """Return the cache settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_CREDENTIAL_TYPE_CACHE', {}))
+
+
+def get_backend():
+    """Return the configured cache backend (created once per process)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            config = get_cache_config()
+            if config['BACKEND'] == 'django':
+                _backend = DjangoCacheBackend(config['ALIAS'])
+            else:
+                _backend = LocalMemoryBackend()
+        return _backend
+
+
+def _cache_key(tower_instance):
+    return f"tower:credential_types:{tower_instance.pk}"
+
+
+def _new_entry(entry, response):
+    return {
+        'results': entry['results'] if response['not_modified'] else response['results'],
+        'etag': response['etag'],
+        'last_modified': response['last_modified'],
+        'fetched_at': time.time(),
+    }
+
+
+def _entry_timeout():
+    config = get_cache_config()
+    return config['TTL'] + config['STALE_TTL']
+
+
+def _revalidate(tower_instance, entry, timeout):
+    """Fetch (or conditionally revalidate) an instance's inventory, store and return the new entry."""
+    response = fetch_tower_credential_types(
+        tower_instance,
+        etag=entry and entry.get('etag'),
+        last_modified=entry and entry.get('last_modified'),
+        timeout=timeout
+    )
+    new_entry = _new_entry(entry, response)
+    get_backend().set(_cache_key(tower_instance), new_entry, _entry_timeout())
+    return new_entry
+
+
+def _revalidate_in_background(tower_instance, entry, timeout):
+    """Start at most one background revalidation per instance."""
+    key = _cache_key(tower_instance)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _revalidate(tower_instance, entry, timeout)
+        except Exception:
+            logger.exception("Error refreshing credential types of %s", tower_instance.name)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+            # The database cache and password lookups open connections owned by this thread
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _usable_entry(tower_instance, entry, refresh, timeout):
+    """Return ``entry`` if it may be served (revalidating stale ones in the background), else None."""
+    if not entry or refresh:
+        return None
+    config = get_cache_config()
+    age = time.time() - entry['fetched_at']
+    if age < config['TTL']:
+        return entry
+    if age < config['TTL'] + config['STALE_TTL']:
+        _revalidate_in_background(tower_instance, entry, timeout)
+        return entry
+    return None
+
+
+def _get_entry(tower_instance, refresh, timeout):
+    """Return the cache entry of an instance, fetching or revalidating as needed."""
+    entry = get_backend().get(_cache_key(tower_instance))
+    return _usable_entry(tower_instance, entry, refresh, timeout) or _revalidate(tower_instance, entry, timeout)
+
+
+async def _abackend(method, *args):
+    """Call a backend method; the Django cache may do network I/O, so it runs in a thread."""
+    backend = get_backend()
+    if isinstance(backend, LocalMemoryBackend):
+        return getattr(backend, method)(*args)
+    return await sync_to_async(getattr(backend, method))(*args)
+
+
+async def _aget_entry(tower_instance, refresh, timeout):
+    """Async version of ``_get_entry``."""
+    entry = await _abackend('get', _cache_key(tower_instance))
+    usable = _usable_entry(tower_instance, entry, refresh, timeout)
+    if usable:
+        return usable
+
+    response = await afetch_tower_credential_types(
+        tower_instance,
+        etag=entry and entry.get('etag'),
+        last_modified=entry and entry.get('last_modified'),
+        timeout=timeout
+    )
+    new_entry = _new_entry(entry, response)
+    await _abackend('set', _cache_key(tower_instance), new_entry, _entry_timeout())
+    return new_entry
+
+
+def get_cached_credential_types(tower_instance, refresh=False, timeout=10):
+    """
+    Return the credential types of a Tower instance through the cache.
+
+    Args:
+        tower_instance: TowerInstance model object
+        refresh (bool): Skip the cached copy and revalidate against Tower
+        timeout (float): Request timeout in seconds for a synchronous fetch
+
+    Returns:
+        list: List of credential type dictionaries
+
+    Raises:
+        requests.RequestException: If a synchronous fetch fails
+    """
+    return _get_entry(tower_instance, refresh, timeout)['results']
+
+
+async def aget_cached_credential_types(tower_instance, refresh=False, timeout=10):
+    """Async version of ``get_cached_credential_types``."""
+    return (await _aget_entry(tower_instance, refresh, timeout))['results']
+
+
+def get_credential_type_index(tower_instance, refresh=False, timeout=10):
+    """
+    Return the name index of a Tower instance's cached credential types.
+
+    The index is built once per inventory version and reused across requests.
+
+    Args:
+        tower_instance: TowerInstance model object
+        refresh (bool): Skip the cached copy and revalidate against Tower
+        timeout (float): Request timeout in seconds for a synchronous fetch
+
+    Returns:
+        CredentialTypeNameIndex: Index over the instance's credential types
+
+    Raises:
+        requests.RequestException: If a synchronous fetch fails
+    """
+    return _index_for_entry(tower_instance, _get_entry(tower_instance, refresh, timeout))
+
+
+async def aget_credential_type_index(tower_instance, refresh=False, timeout=10):
+    """Async version of ``get_credential_type_index``."""
+    return _index_for_entry(tower_instance, await _aget_entry(tower_instance, refresh, timeout))
+
+
+def _index_for_entry(tower_instance, entry):
+    version = (entry['fetched_at'], entry['etag'], entry['last_modified'])
+
+    with _name_indexes_lock:
+        cached = _name_indexes.get(tower_instance.pk)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    index = CredentialTypeNameIndex(entry['results'])
+    with _name_indexes_lock:
+        _name_indexes[tower_instance.pk] = (version, index)
+    return index
+
+
+def invalidate_credential_types(tower_instance):
+    """Drop the cached inventory and name index of a Tower instance."""
+    get_backend().delete(_cache_key(tower_instance))
+    with _name_indexes_lock:
+        _name_indexes.pop(tower_instance.pk, None)
+
+
+def fetch_cached_credential_types(instances, refresh=False, max_workers=None, timeout=None):
+    """
+    Cached counterpart of ``utils.fetch_credential_types_for_instances``.
+
+    Args:
+        instances (iterable): TowerInstance model objects
+        refresh (bool): Skip cached copies and revalidate against every Tower
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+        timeout (float): Per-instance timeout in seconds (defaults to TOWER_FANOUT_TIMEOUT)
+
+    Returns:
+        list: Outcome dictionaries (see ``utils.iter_fan_out``) in the order of ``instances``
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+
+    return fan_out(
+        instances,
+        lambda instance: get_cached_credential_types(instance, refresh=refresh, timeout=timeout),
+        max_workers=max_workers,
+    )
+
+
+async def afetch_cached_credential_types(instances, refresh=False, max_workers=None, timeout=None):
+    """Async version of ``fetch_cached_credential_types``."""
+    if timeout is None:
+        timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+
+    return await afan_out(
+        instances,
+        lambda instance: aget_cached_credential_types(instance, refresh=refresh, timeout=timeout),
+        max_workers=max_workers,
+    )
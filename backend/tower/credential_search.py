@@ -0,0 +1,203 @@
+"""
+Cross-instance credential listing for TowerCredentialProxy.
+Credentials of the selected TowerInstances are merged into one list, each
+tagged with its source instance, then filtered (?search=), sorted
+(?ordering=) and paged with an opaque cursor. The cursor holds the sort key
+of the last row returned rather than an offset, so paging stays stable while
+credentials are added or removed between requests.
+"""
+import base64
+import binascii
+import heapq
+import json
+from functools import cmp_to_key
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from .models import TowerInstance
+
+SELECTION_PARAMS = ('instances', 'region', 'environment')
+ORDERING_FIELDS = ('name', 'id', 'kind', 'credential_type', 'created', 'modified', 'tower_instance')
+DEFAULT_ORDERING = ('name',)
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def wants_merged_listing(params):
+    """True when the query selects TowerInstances (?instances=, ?region= or ?environment=)."""
+    return any(params.get(param) for param in SELECTION_PARAMS)
+
+
+def _split(value):
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(part) for part in value)
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def select_instances(params):
+    """
+    Return the TowerInstances selected by the query parameters.
+
+    ``instances`` takes ids and/or names (or ``all``); ``region`` and
+    ``environment`` take comma-separated values. Filters are combined.
+    """
+    queryset = TowerInstance.objects.order_by('name')
+    requested = _split(params.get('instances'))
+    if requested and requested != ['all']:
+        ids = [value for value in requested if value.isdigit()]
+        queryset = queryset.filter(Q(pk__in=ids) | Q(name__in=requested))
+    for field in ('region', 'environment'):
+        values = _split(params.get(field))
+        if values:
+            queryset = queryset.filter(**{f'{field}__in': values})
+    return queryset
+
+
+def encode_cursor(ordering, key):
+    payload = json.dumps({'o': list(ordering), 'k': key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _valid_key_part(part):
+    # Same shapes as _key_part produces: [0, number], [1, text] or [2, '']
+    if not isinstance(part, list) or len(part) != 2 or type(part[0]) is not int:
+        return False
+    rank, value = part
+    if rank == 0:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if rank == 1:
+        return isinstance(value, str)
+    return rank == 2 and value == ''
+
+
+def decode_cursor(cursor, ordering):
+    """Return the sort key stored in a cursor, or raise ValidationError if it does not fit ``ordering``."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key = payload['k']
+        # One part per ordering field plus the (instance, remote id) tie-breakers
+        valid = (payload['o'] == list(ordering) and isinstance(key, list) and len(key) == len(ordering) + 2
+                 and all(_valid_key_part(part) for part in key))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise ValidationError('Invalid cursor.')
+    return key
+
+
+def parse_listing_params(params):
+    """
+    Validate ?search=, ?ordering=, ?limit= and ?cursor=.
+
+    Returns:
+        dict: Keyword arguments for ``paginate_credentials``
+
+    Raises:
+        ValidationError: If a parameter is invalid
+    """
+    ordering = _split(params.get('ordering')) or list(DEFAULT_ORDERING)
+    for field in ordering:
+        if field.lstrip('-') not in ORDERING_FIELDS:
+            raise ValidationError(f"Unknown ordering field '{field.lstrip('-')}'. Use one of: {', '.join(ORDERING_FIELDS)}.")
+
+    try:
+        limit = int(params.get('limit', PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValidationError('limit must be an integer.')
+
+    cursor = params.get('cursor')
+    return {
+        'search': (params.get('search') or '').strip().casefold(),
+        'ordering': ordering,
+        'limit': min(max(limit, 1), MAX_PAGE_SIZE),
+        'after': decode_cursor(cursor, ordering) if cursor else None,
+    }
+
+
+def merge_credentials(outcomes):
+    """Flatten per-instance fan-out outcomes into one list, tagging every credential with its instance."""
+    credentials = []
+    for outcome in outcomes:
+        if outcome['error'] is not None:
+            continue
+        instance = outcome['instance']
+        for item in outcome['result']:
+            credentials.append(dict(item, tower_instance=instance.name, tower_instance_id=instance.pk))
+    return credentials
+
+
+def _credential_type_name(item):
+    summary = (item.get('summary_fields') or {}).get('credential_type') or {}
+    return summary.get('name') or item.get('credential_type')
+
+
+def _field_value(item, field):
+    if field == 'credential_type':
+        return _credential_type_name(item)
+    return item.get(field)
+
+
+def _matches(item, search):
+    values = (item.get('name'), item.get('description'), item.get('kind'),
+              _credential_type_name(item), item['tower_instance'])
+    return any(isinstance(value, str) and search in value.casefold() for value in values)
+
+
+def _key_part(value):
+    # Comparable (and JSON-serializable) across value types: numbers, then text, then empty
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return [0, value]
+    if value is None or value == '':
+        return [2, '']
+    return [1, str(value).casefold()]
+
+
+def _sort_key(item, fields):
+    # (instance, remote id) makes every key unique, which the cursor relies on
+    return [_key_part(_field_value(item, field)) for field in fields] + [
+        _key_part(item['tower_instance_id']), _key_part(item.get('id')),
+    ]
+
+
+def _compare(a, b, descending):
+    for x, y, desc in zip(a, b, descending):
+        if x != y:
+            return (1 if x > y else -1) * (-1 if desc else 1)
+    return 0
+
+
+def paginate_credentials(credentials, search, ordering, limit, after=None):
+    """
+    Filter, sort and page a merged credential list.
+
+    Only the requested page is sorted in full (a bounded heap selects it),
+    so a page of a large estate costs about O(n log limit).
+
+    Args:
+        credentials (list): Output of ``merge_credentials``
+        search (str): Case-insensitive substring matched against name,
+            description, kind, credential type and instance name
+        ordering (list): Field names, ``-`` prefixed for descending
+        limit (int): Page size
+        after (list): Sort key from a cursor; rows up to it are skipped
+
+    Returns:
+        dict: ``count`` (rows matching the search), ``results`` and ``next_cursor``
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    descending = [field.startswith('-') for field in ordering] + [False, False]
+
+    if search:
+        credentials = [item for item in credentials if _matches(item, search)]
+    keyed = [(_sort_key(item, fields), item) for item in credentials]
+    count = len(keyed)
+    if after is not None:
+        keyed = [pair for pair in keyed if _compare(pair[0], after, descending) > 0]
+
+    page = heapq.nsmallest(limit + 1, keyed, key=cmp_to_key(lambda a, b: _compare(a[0], b[0], descending)))
+    return {
+        'count': count,
+        'results': [item for _, item in page[:limit]],
+        'next_cursor': encode_cursor(ordering, page[limit - 1][0]) if len(page) > limit else None,
+    }
@@ -0,0 +1,187 @@
+"""
+Aggregates for the dashboard.
+Local counts come from one grouped query per model; job statistics are
+fetched from every Tower concurrently and summed per day. Both are cached
+in a Django cache shared by the worker processes (see CACHES) for a
+configurable interval. Local writes through the audited viewsets drop the
+counts; job charts only depend on the Towers themselves and are dropped
+when the set of instances changes. An unavailable cache is logged and
+bypassed rather than failing the request.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Q
+from django.utils.timezone import now
+
+from .models import Auditlog, Credential, ExecutionEnvironment, TowerInstance
+from .utils import fan_out, get_tower_job_stats
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'COUNTS_TTL': 60,
+    'JOB_CHART_TTL': 300,
+}
+
+JOB_CHART_PERIODS = ('day', 'week', 'two_weeks', 'month')
+COUNTS_KEY = 'tower:dashboard:counts'
+# Credentials and environments are grouped by the region/environment of their instance
+_BY_INSTANCE = {'region': F('tower_instance__region'), 'environment': F('tower_instance__environment')}
+
+logger = logging.getLogger(__name__)
+
+
+def get_dashboard_config():
+    """Return the dashboard cache settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_DASHBOARD', {}))
+
+
+def _cache():
+    return caches[get_dashboard_config()['ALIAS']]
+
+
+def _job_chart_key(period):
+    return f"tower:dashboard:job_chart:{period}"
+
+
+def _cache_call(method, *args):
+    """Call a cache method, logging (and returning None on) errors such as a missing cache table."""
+    try:
+        return getattr(_cache(), method)(*args)
+    except Exception:
+        logger.exception("Dashboard cache %s failed", method)
+        return None
+
+
+def invalidate_dashboard():
+    """Drop the cached counts after a local write."""
+    _cache_call('delete', COUNTS_KEY)
+
+
+def invalidate_job_charts():
+    """Drop the cached job charts after Tower instances were added, changed or removed."""
+    _cache_call('delete_many', [_job_chart_key(period) for period in JOB_CHART_PERIODS])
+
+
+def _rollup(rows, fields):
+    """Sum grouped ``values().annotate(count=...)`` rows into one counter per field."""
+    totals = {field: Counter() for field in fields}
+    for row in rows:
+        for field in fields:
+            totals[field][row[field] or 'unspecified'] += row['count']
+    return {f'by_{field}': dict(counter) for field, counter in totals.items()}
+
+
+def compute_dashboard_counts():
+    """
+    Count instances, credentials, environments and recent audit activity.
+
+    Returns:
+        dict: Totals and per-region/environment/status (or type/action)
+        breakdowns, plus ``generated_at``
+    """
+    instances = list(
+        TowerInstance.objects.values('region', 'environment', 'status')
+        .annotate(count=Count('id')).order_by()
+    )
+    credentials = list(
+        Credential.objects.values('type', **_BY_INSTANCE)
+        .annotate(count=Count('id')).order_by()
+    )
+    environments = list(
+        ExecutionEnvironment.objects.values(**_BY_INSTANCE)
+        .annotate(count=Count('id')).order_by()
+    )
+
+    current = now()
+    activity = list(
+        Auditlog.objects.filter(timestamp__gte=current - timedelta(days=7))
+        .values('action')
+        .annotate(count=Count('id'), last_24h=Count('id', filter=Q(timestamp__gte=current - timedelta(days=1))))
+        .order_by()
+    )
+
+    def section(rows, fields):
+        return dict(total=sum(row['count'] for row in rows), **_rollup(rows, fields))
+
+    return {
+        'instances': section(instances, ('region', 'environment', 'status')),
+        'credentials': section(credentials, ('type', 'region', 'environment')),
+        'environments': section(environments, ('region', 'environment')),
+        'activity': {
+            'last_24h': {row['action']: row['last_24h'] for row in activity},
+            'last_7d': {row['action']: row['count'] for row in activity},
+        },
+        'generated_at': current,
+    }
+
+
+def get_dashboard_counts():
+    """Return the dashboard counts through the cache."""
+    counts = _cache_call('get', COUNTS_KEY)
+    if counts is None:
+        counts = compute_dashboard_counts()
+        _cache_call('set', COUNTS_KEY, counts, get_dashboard_config()['COUNTS_TTL'])
+    return counts
+
+
+def compute_job_chart_data(period='month', max_workers=None, timeout=None):
+    """
+    Sum the job graphs of every Tower instance per day.
+
+    Args:
+        period (str): One of JOB_CHART_PERIODS
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+        timeout (float): Per-instance timeout in seconds (defaults to TOWER_FANOUT_TIMEOUT)
+
+    Returns:
+        dict: ``labels`` (ISO dates), aligned ``successful`` / ``failed``
+        series, ``totals`` and one status entry per instance
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+
+    outcomes = fan_out(
+        TowerInstance.objects.defer('password'),
+        lambda instance: get_tower_job_stats(instance, period=period, timeout=timeout),
+        max_workers=max_workers,
+    )
+
+    series = {'successful': Counter(), 'failed': Counter()}
+    instances = []
+    for outcome in outcomes:
+        instance = outcome['instance']
+        instances.append({
+            'id': instance.id,
+            'name': instance.name,
+            'ok': outcome['error'] is None,
+            'error': str(outcome['error']) if outcome['error'] else None,
+            'elapsed_ms': outcome['elapsed_ms'],
+        })
+        for name, counter in series.items():
+            for timestamp, count in (outcome['result'] or {}).get(name, []):
+                counter[timestamp] += count
+
+    timestamps = sorted(set(series['successful']) | set(series['failed']))
+    return {
+        'period': period,
+        'labels': [datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat() for ts in timestamps],
+        'successful': [series['successful'][ts] for ts in timestamps],
+        'failed': [series['failed'][ts] for ts in timestamps],
+        'totals': {name: sum(counter.values()) for name, counter in series.items()},
+        'instances': instances,
+    }
+
+
+def get_job_chart_data(period='month'):
+    """Return the job chart through the cache; charts with unreachable instances are not cached."""
+    key = _job_chart_key(period)
+    data = _cache_call('get', key)
+    if data is None:
+        data = compute_job_chart_data(period)
+        if all(instance['ok'] for instance in data['instances']):
+            _cache_call('set', key, data, get_dashboard_config()['JOB_CHART_TTL'])
+    return data
@@ -0,0 +1,25 @@
+"""
+Database connection health checks for persistent connections.
+With CONN_MAX_AGE > 0 a connection is reused across requests, so one that
+the server or a pooler dropped while idle would fail the next request.
+Django 3.2 has no CONN_HEALTH_CHECKS option; this hook does the same: at the
+start of each request every open persistent connection is pinged once and
+closed if it is no longer usable, so Django reconnects on first use.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """request_started receiver: close persistent connections that went away while idle."""
+    for conn in connections.all():
+        if conn.connection is None or conn.in_atomic_block:
+            continue
+        if not conn.settings_dict.get('CONN_MAX_AGE'):
+            continue
+        if not conn.is_usable():
+            conn.close()
+
+
+def health_checks_enabled():
+    return getattr(settings, 'TOWER_DB_HEALTH_CHECKS', False)
@@ -0,0 +1,221 @@
+"""
+Per-request deadlines and adaptive timeouts for Tower calls.
+RequestDeadlineMiddleware gives every request a time budget (REQUEST_BUDGET
+seconds, or less if the client sends X-Request-Timeout). The budget lives in
+a context variable, so it follows the request into fan-out threads (which
+run in a copy of the caller's context) and async tasks. Each Tower call gets
+the smaller of its adaptive timeout and the time left: the adaptive timeout
+is P99_FACTOR x the p99 of the instance's recent latencies, once
+MIN_SAMPLES are known. Fan-outs stop waiting when the budget is spent and
+report the instances they gave up on; the response is then flagged with
+``X-Partial-Results: true``.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+
+DEFAULTS = {
+    'REQUEST_BUDGET': 25,
+    'MAX_BUDGET': 60,
+    'HEADER': 'X-Request-Timeout',
+    'ADAPTIVE': True,
+    'LATENCY_SAMPLES': 200,
+    'MIN_SAMPLES': 20,
+    'P99_FACTOR': 3,
+    'MIN_TIMEOUT': 1,
+}
+
+PARTIAL_HEADER = 'X-Partial-Results'
+
+
+def get_deadline_config():
+    """Return the deadline settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_DEADLINES', {}))
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised instead of starting a Tower call once the request's budget is spent."""
+
+
+class Budget:
+    """Time budget of one request; ``partial`` is set when work was cut short."""
+
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+        self.partial = False
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+
+_budget = contextvars.ContextVar('tower_request_budget', default=None)
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None outside a budgeted request."""
+    budget = _budget.get()
+    return None if budget is None else budget.remaining()
+
+
+def mark_partial():
+    """Flag the current response as missing results because the budget ran out."""
+    budget = _budget.get()
+    if budget is not None:
+        budget.partial = True
+
+
+class request_deadline:
+    """Context manager that runs a block under a budget of ``seconds``."""
+
+    def __init__(self, seconds):
+        self.budget = Budget(seconds)
+
+    def __enter__(self):
+        self._token = _budget.set(self.budget)
+        return self.budget
+
+    def __exit__(self, *exc_info):
+        _budget.reset(self._token)
+
+
+# Recent latencies (seconds) of successful calls, per Tower target
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+
+def latency_key(tower_instance):
+    return ('TowerInstance', tower_instance.pk)
+
+
+def record_latency(key, seconds):
+    if key is None:
+        return
+    with _latencies_lock:
+        samples = _latencies.get(key)
+        if samples is None:
+            samples = _latencies[key] = deque(maxlen=get_deadline_config()['LATENCY_SAMPLES'])
+        samples.append(seconds)
+
+
+def forget_latencies(key):
+    with _latencies_lock:
+        _latencies.pop(key, None)
+
+
+def adaptive_timeout(key, default):
+    """``P99_FACTOR`` x p99 of the recent latencies of ``key``, within [MIN_TIMEOUT, default]."""
+    config = get_deadline_config()
+    if key is None or not config['ADAPTIVE']:
+        return default
+    with _latencies_lock:
+        samples = sorted(_latencies.get(key, ()))
+    if len(samples) < config['MIN_SAMPLES']:
+        return default
+    p99 = samples[max(0, math.ceil(0.99 * len(samples)) - 1)]
+    return min(default, max(config['MIN_TIMEOUT'], p99 * config['P99_FACTOR']))
+
+
+def call_timeout(key, default):
+    """
+    Timeout for one Tower call: the adaptive timeout, capped by the time left.
+
+    Args:
+        key: Latency key of the target (None: no adaptive timeout)
+        default (float): The caller's timeout in seconds
+
+    Returns:
+        tuple: (timeout, whether the request budget is what limits it)
+
+    Raises:
+        DeadlineExceeded: If the request budget is already spent
+    """
+    timeout = adaptive_timeout(key, default) if default is not None else None
+    left = remaining()
+    if left is None:
+        return timeout, False
+    if left <= 0:
+        mark_partial()
+        raise DeadlineExceeded("Request deadline exceeded before calling Tower")
+    if timeout is None or left < timeout:
+        return left, True
+    return timeout, False
+
+
+def time_left(timeout, deadline):
+    """
+    Timeout for one call of a multi-call fetch (e.g. every page of a list) that must end by ``deadline``.
+
+    Args:
+        timeout (float): The call's own timeout in seconds
+        deadline (float): ``time.monotonic()`` value the whole fetch must finish by (None: no cap)
+
+    Returns:
+        float: ``timeout``, capped by the seconds left until ``deadline``
+
+    Raises:
+        requests.Timeout: If the deadline has passed
+    """
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise requests.Timeout("Timed out before fetching the next page")
+    return left if timeout is None else min(timeout, left)
+
+
+def deadline_outcome(instance, started):
+    """Fan-out outcome for an instance that was abandoned when the budget ran out."""
+    return {
+        'instance': instance,
+        'result': None,
+        'error': DeadlineExceeded(f"{instance.name} did not answer before the request deadline"),
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        'timed_out': True,
+    }
+
+
+def _budget_seconds(request, config):
+    # Unusable client values (garbage, 0, negative, nan, inf) get the default budget
+    value = request.headers.get(config['HEADER'])
+    try:
+        seconds = float(value) if value else config['REQUEST_BUDGET']
+    except ValueError:
+        seconds = config['REQUEST_BUDGET']
+    if not math.isfinite(seconds) or seconds <= 0:
+        seconds = config['REQUEST_BUDGET']
+    return max(0.0, min(seconds, config['MAX_BUDGET']))
+
+
+class RequestDeadlineMiddleware:
+    """Runs every request under a deadline budget and flags partial responses."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with request_deadline(_budget_seconds(request, get_deadline_config())) as budget:
+            response = self.get_response(request)
+        return self._flag(response, budget)
+
+    async def __acall__(self, request):
+        with request_deadline(_budget_seconds(request, get_deadline_config())) as budget:
+            response = await self.get_response(request)
+        return self._flag(response, budget)
+
+    @staticmethod
+    def _flag(response, budget):
+        if budget.partial:
+            response[PARTIAL_HEADER] = 'true'
+        return response
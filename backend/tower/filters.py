@@ -0,0 +1,16 @@
+import django_filters
+
+from .models import Auditlog
+
+
+class AuditlogFilter(django_filters.FilterSet):
+    """Server-side audit log filters; dates via ?timestamp_after= / ?timestamp_before=."""
+    user = django_filters.CharFilter()
+    action = django_filters.ChoiceFilter(choices=Auditlog.ACTION_CHOICES)
+    object_type = django_filters.CharFilter()
+    object_id = django_filters.NumberFilter()
+    timestamp = django_filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Auditlog
+        fields = ['user', 'action', 'object_type', 'object_id', 'timestamp']
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from tower.archive import archive_month, get_archive_dir, months_before
+from tower.audit import get_audit_config
+
+
+class Command(BaseCommand):
+    help = "Move whole months of audit log rows older than the retention window to compressed archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=None,
+            help="Retention window in days (defaults to TOWER_AUDIT['RETENTION_DAYS'])."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only list the months that would be archived."
+        )
+
+    def handle(self, *args, **options):
+        days = options['older_than_days'] or get_audit_config()['RETENTION_DAYS']
+        months = months_before(now() - timedelta(days=days))
+
+        if not months:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        for year, month in months:
+            label = f"{year:04d}-{month:02d}"
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {label}")
+                continue
+            count = archive_month(year, month)
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} rows of {label} to {get_archive_dir()}"))
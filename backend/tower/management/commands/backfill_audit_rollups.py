@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+
+from tower.archive import archived_months
+from tower.models import Auditlog
+from tower.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily audit activity rollups from the audit log and its archives. "
+        "New entries are rolled up as they are written; run this once after upgrading, "
+        "or for past days after repairing audit data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD, defaults to the oldest entry).")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD, defaults to today).")
+        parser.add_argument(
+            '--skip-archive', action='store_true',
+            help="Only count rows still in the audit log table."
+        )
+        parser.add_argument(
+            '--chunk-days', type=int, default=31,
+            help="Days rebuilt per transaction."
+        )
+
+    def _parse(self, value, name):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--{name} must be a date in YYYY-MM-DD format.")
+        return day
+
+    def handle(self, *args, **options):
+        end = self._parse(options['end'], 'end') if options['end'] else localdate()
+        if options['start']:
+            start = self._parse(options['start'], 'start')
+        else:
+            candidates = []
+            oldest = Auditlog.objects.aggregate(oldest=Min('timestamp'))['oldest']
+            if oldest:
+                candidates.append(localdate(oldest))
+            if not options['skip_archive'] and archived_months():
+                candidates.append(date(*min(archived_months()), 1))
+            if not candidates:
+                self.stdout.write("Nothing to backfill.")
+                return
+            start = min(candidates)
+
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        total = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), end)
+            count = rebuild_rollups(chunk_start, chunk_end, include_archive=not options['skip_archive'])
+            self.stdout.write(f"{chunk_start} .. {chunk_end}: {count} entries")
+            total += count
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} audit entries from {start} to {end}"))
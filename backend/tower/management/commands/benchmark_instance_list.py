@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec of GET /api/instances/ in-process for several CONN_MAX_AGE values "
+        "(e.g. 0 = new connection per request vs. persistent connections)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="User the requests are made as.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per run.")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests before each run.")
+        parser.add_argument(
+            '--conn-max-age', default='0,60',
+            help="Comma-separated CONN_MAX_AGE values to compare."
+        )
+        parser.add_argument('--path', default='/api/instances/', help="Endpoint to request.")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+            ages = [int(age) for age in options['conn_max_age'].split(',')]
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist.")
+        except ValueError:
+            raise CommandError("--conn-max-age must be a comma-separated list of integers.")
+
+        client = APIClient()
+        client.force_authenticate(user)
+        connection = connections['default']
+        original_age = connection.settings_dict.get('CONN_MAX_AGE', 0)
+
+        self.stdout.write(f"{options['requests']} x GET {options['path']} against {connection.settings_dict['HOST'] or 'local'}")
+        try:
+            for age in ages:
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = age
+                for _ in range(options['warmup']):
+                    client.get(options['path'])
+
+                latencies = []
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request_started = time.perf_counter()
+                    response = client.get(options['path'])
+                    latencies.append((time.perf_counter() - request_started) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f"{options['path']} returned {response.status_code}")
+                elapsed = time.perf_counter() - started
+
+                latencies.sort()
+                self.stdout.write(
+                    f"CONN_MAX_AGE={age:<4} {options['requests'] / elapsed:8.1f} req/s  "
+                    f"mean {statistics.mean(latencies):7.2f} ms  "
+                    f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms"
+                )
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = original_age
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tower.credential_search import select_instances
+from tower.probes import prune_probes, probe_instances
+
+
+def _format_percentiles(stats):
+    if not stats['count']:
+        return "no successful probes"
+    return f"p50 {stats['p50']} ms, p90 {stats['p90']} ms, p99 {stats['p99']} ms, max {stats['max']} ms"
+
+
+class Command(BaseCommand):
+    help = "Ping /api/v2/ping/ on every TowerInstance concurrently and record latency, TLS handshake time and status."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--instance', action='append', dest='instances', default=[],
+            help="Only probe the TowerInstance with this name or id (repeatable)."
+        )
+        parser.add_argument('--region', default='', help="Only probe instances in these regions (comma-separated).")
+        parser.add_argument(
+            '--environment', default='', help="Only probe instances in these environments (comma-separated)."
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=None,
+            help="Seconds allowed per instance (defaults to TOWER_PROBES['TIMEOUT'])."
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and probe every --interval seconds."
+        )
+        parser.add_argument('--interval', type=int, default=60, help="Seconds between probes in --loop mode.")
+
+    def handle(self, *args, **options):
+        params = {
+            'instances': options['instances'],
+            'region': options['region'],
+            'environment': options['environment'],
+        }
+
+        while True:
+            started = time.monotonic()
+            self.probe_once(params, options['timeout'])
+            pruned = prune_probes()
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} old probes.")
+
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+
+    def probe_once(self, params, timeout):
+        instances = select_instances(params).only('id', 'name', 'url', 'region', 'environment')
+        summary = probe_instances(instances, timeout=timeout)
+
+        for result in summary['results']:
+            if result['ok']:
+                tls = f", TLS {result['tls_ms']} ms" if result['tls_ms'] is not None else ''
+                self.stdout.write(self.style.SUCCESS(
+                    f"{result['name']}: HTTP {result['http_status']} in {result['total_ms']} ms{tls}"
+                ))
+            else:
+                self.stderr.write(f"{result['name']}: unreachable after {result['total_ms']} ms: {result['error']}")
+
+        self.stdout.write(
+            f"{summary['reachable']}/{summary['probed']} reachable in {summary['elapsed_ms']} ms; "
+            f"latency {_format_percentiles(summary['latency'])}; "
+            f"TLS handshake {_format_percentiles(summary['tls_handshake'])}"
+        )
+        for region, stats in summary['by_region'].items():
+            self.stdout.write(f"  region {region}: {_format_percentiles(stats)}")
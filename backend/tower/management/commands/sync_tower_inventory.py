@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tower.models import TowerInstance
+from tower.sync import sync_instances
+
+
+class Command(BaseCommand):
+    help = "Sync credential types and credentials of every TowerInstance into the local snapshot tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--instance', action='append', dest='instances', default=[],
+            help="Only sync the TowerInstance with this name (repeatable)."
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running and sync every --interval seconds."
+        )
+        parser.add_argument(
+            '--interval', type=int, default=None,
+            help="Seconds between syncs in --loop mode (defaults to TOWER_INVENTORY_SYNC_INTERVAL)."
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or getattr(settings, 'TOWER_INVENTORY_SYNC_INTERVAL', 300)
+
+        while True:
+            started = time.monotonic()
+            self.sync_once(options['instances'])
+
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+    def sync_once(self, names):
+        instances = TowerInstance.objects.defer('password')
+        if names:
+            instances = instances.filter(name__in=names)
+
+        for summary in sync_instances(list(instances)):
+            if summary['status'] == 'ok':
+                types, creds = summary['credential_types'], summary['credentials']
+                self.stdout.write(self.style.SUCCESS(
+                    f"{summary['instance']}: synced in {summary['duration_ms']} ms "
+                    f"(credential types +{types['created']} ~{types['updated']} -{types['deleted']}, "
+                    f"credentials +{creds['created']} ~{creds['updated']} -{creds['deleted']})"
+                ))
+            else:
+                self.stderr.write(f"{summary['instance']}: sync failed: {summary['error']}")
@@ -0,0 +1,333 @@
+"""
+In-process metrics exposed in the Prometheus text format on /metrics.
+Counters and histograms are plain dictionaries behind a lock per metric, so
+recording costs a lock and a bisect. MetricsMiddleware records view latency
+and database time; Tower sessions, the async client, the secret cache and
+the audit pipeline record their own costs. Values are per process: scrape
+every worker (or run one per container).
+
+Clients can ask for a Server-Timing header (SERVER_TIMING 'request': send
+X-Server-Timing: 1; 'always': every response) that splits the request into
+database, Tower and render time.
+"""
+import asyncio
+import bisect
+import contextvars
+import hmac
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+DEFAULTS = {
+    'TOKEN': None,
+    'SERVER_TIMING': 'request',
+}
+
+SERVER_TIMING_REQUEST_HEADER = 'X-Server-Timing'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def get_metrics_config():
+    """Return the metrics settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_METRICS', {}))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _label_values(names, labels):
+    # Label values are strings, so samples sort even when a label mixes 'error' and status codes
+    return tuple(str(labels.get(name, '')) for name in names)
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_values(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Histogram with fixed upper bounds and labels."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_values(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                yield self.name + '_bucket', _format_labels(self.labelnames, key, (le,)), cumulative
+            yield self.name + '_sum', _format_labels(self.labelnames, key), total
+            yield self.name + '_count', _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'tower_http_requests_total', 'API requests handled.', ('view', 'method', 'status')))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    'tower_http_request_duration_seconds', 'API request latency.', ('view', 'method')))
+DB_QUERIES = REGISTRY.register(Histogram(
+    'tower_db_queries_per_request', 'Database queries per API request.', ('view',), buckets=COUNT_BUCKETS))
+DB_DURATION = REGISTRY.register(Histogram(
+    'tower_db_duration_seconds', 'Database time per API request.', ('view',)))
+RENDER_DURATION = REGISTRY.register(Histogram(
+    'tower_render_duration_seconds', 'JSON rendering time per API response.', ('view',)))
+REMOTE_REQUESTS = REGISTRY.register(Counter(
+    'tower_remote_requests_total', 'HTTP requests sent to Tower instances.', ('instance', 'method', 'status')))
+REMOTE_DURATION = REGISTRY.register(Histogram(
+    'tower_remote_request_duration_seconds', 'Latency of HTTP requests to Tower instances.', ('instance', 'method')))
+HELPER_DURATION = REGISTRY.register(Histogram(
+    'tower_helper_duration_seconds', 'Duration of Tower helper and audit calls.', ('helper', 'outcome')))
+SECRET_LOOKUPS = REGISTRY.register(Counter(
+    'tower_secret_cache_lookups_total', 'Instance password lookups by cache result.', ('result',)))
+SECRET_DECRYPT_DURATION = REGISTRY.register(Histogram(
+    'tower_secret_decrypt_duration_seconds', 'Time spent loading and decrypting instance passwords.'))
+AUDIT_FLUSH_DURATION = REGISTRY.register(Histogram(
+    'tower_audit_flush_duration_seconds', 'Duration of audit log batch writes.', ('outcome',)))
+AUDIT_ENTRIES = REGISTRY.register(Counter(
+    'tower_audit_entries_total', 'Audit log entries by outcome.', ('outcome',)))
+
+
+class RequestTimings:
+    """Time spent by one request in the database, in Tower calls and in rendering."""
+
+    def __init__(self):
+        self.db = 0.0
+        self.db_queries = 0
+        self.remote = 0.0
+        self.remote_calls = 0
+        self.render = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        # Fan-out threads add to the same request concurrently
+        with self._lock:
+            for field, amount in amounts.items():
+                setattr(self, field, getattr(self, field) + amount)
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(db=time.monotonic() - started, db_queries=1)
+
+
+_timings = contextvars.ContextVar('tower_request_timings', default=None)
+
+
+def current_timings():
+    return _timings.get()
+
+
+def record_remote(instance, method, status, seconds):
+    """Record one HTTP request to a Tower instance (``status`` is the code or 'error')."""
+    REMOTE_REQUESTS.inc(instance=instance, method=method, status=status)
+    REMOTE_DURATION.observe(seconds, instance=instance, method=method)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(remote=seconds, remote_calls=1)
+
+
+def record_secret_lookup(hit):
+    SECRET_LOOKUPS.inc(result='hit' if hit else 'miss')
+
+
+def instrumented(helper):
+    """Decorator recording the duration and outcome of a (sync or async) helper."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started, outcome = time.monotonic(), 'error'
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = 'ok'
+                    return result
+                finally:
+                    HELPER_DURATION.observe(time.monotonic() - started, helper=helper, outcome=outcome)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started, outcome = time.monotonic(), 'error'
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                HELPER_DURATION.observe(time.monotonic() - started, helper=helper, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that adds its rendering time to the current request's timings."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.monotonic()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            timings = _timings.get()
+            if timings is not None:
+                timings.add(render=time.monotonic() - started)
+
+
+def view_label(request):
+    """Metrics label of the view that handled ``request`` (URL name or dotted path)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unmatched'
+
+
+def _wants_server_timing(request, mode):
+    return mode == 'always' or (mode == 'request' and bool(request.headers.get(SERVER_TIMING_REQUEST_HEADER)))
+
+
+def server_timing_header(timings, total):
+    """Format a Server-Timing header value (durations in milliseconds)."""
+    def entry(name, seconds, description):
+        return f'{name};dur={seconds * 1000:.1f};desc="{description}"'
+
+    return ', '.join([
+        entry('db', timings.db, f'{timings.db_queries} queries'),
+        entry('tower', timings.remote, f'{timings.remote_calls} Tower calls (cumulative)'),
+        entry('render', timings.render, 'JSON rendering'),
+        entry('total', total, 'request'),
+    ])
+
+
+class MetricsMiddleware:
+    """Records request latency, status and database time, and adds Server-Timing on request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.monotonic()
+        try:
+            with connection.execute_wrapper(timings.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._record(request, response, timings, time.monotonic() - started)
+
+    async def __acall__(self, request):
+        # Database work runs in sync_to_async threads here, so only Tower and render time are split out
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = time.monotonic()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._record(request, response, timings, time.monotonic() - started)
+
+    def _record(self, request, response, timings, total):
+        view = view_label(request)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_DURATION.observe(total, view=view, method=request.method)
+        DB_QUERIES.observe(timings.db_queries, view=view)
+        DB_DURATION.observe(timings.db, view=view)
+        if timings.render:
+            RENDER_DURATION.observe(timings.render, view=view)
+
+        if _wants_server_timing(request, get_metrics_config()['SERVER_TIMING']):
+            response['Server-Timing'] = server_timing_header(timings, total)
+        return response
+
+
+def authorized(request):
+    """True when /metrics may be served: a TOKEN is configured and sent as the bearer token."""
+    token = get_metrics_config()['TOKEN']
+    if not token:
+        return False
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
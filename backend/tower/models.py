@@ -29,10 +29,32 @@ class Auditlog(models.Model):
     timestamp = models.DateTimeField(default=now)
     changes = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['object_type', 'object_id', 'timestamp'], name='auditlog_object_idx'),
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_idx'),
+        ]
+
     def __str__(self):
         return f"{self.timestamp} {self.user} {self.action} {self.object_type} ({self.object_id})"
 
 
+class AuditActivityRollup(models.Model):
+    """Number of audit entries per day, user, action and object type."""
+    day = models.DateField()
+    user = models.CharField(max_length=100)
+    action = models.CharField(max_length=100)
+    object_type = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'user', 'action', 'object_type')
+
+    def __str__(self):
+        return f"{self.day} {self.user} {self.action} {self.object_type}: {self.count}"
+
+
 class TowerInstance(models.Model):
     name = models.CharField(max_length=100)
     url = models.URLField()
@@ -41,6 +63,8 @@ class TowerInstance(models.Model):
     region = models.CharField(max_length=50, blank=True)
     environment = models.CharField(max_length=50, blank=True)
     status = models.CharField(max_length=20, default='active')
+    # Row version: keys the decrypted password in tower.secret_cache
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.region} - {self.environment})"
@@ -75,6 +99,91 @@ class ExecutionEnvironment(models.Model):
         return self.name
 
 
+class RemoteCredentialType(models.Model):
+    """Local snapshot of a credential type defined in a Tower instance."""
+    tower_instance = models.ForeignKey(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="remote_credential_types"
+    )
+    remote_id = models.IntegerField()
+    name = models.CharField(max_length=512)
+    description = models.TextField(blank=True)
+    kind = models.CharField(max_length=50, blank=True)
+    modified = models.DateTimeField(null=True, blank=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ('tower_instance', 'remote_id')
+
+    def __str__(self):
+        return f"{self.name} ({self.tower_instance_id}:{self.remote_id})"
+
+
+class RemoteCredential(models.Model):
+    """Local snapshot of a credential stored in a Tower instance."""
+    tower_instance = models.ForeignKey(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="remote_credentials"
+    )
+    remote_id = models.IntegerField()
+    name = models.CharField(max_length=512)
+    credential_type = models.IntegerField(null=True, blank=True)
+    modified = models.DateTimeField(null=True, blank=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ('tower_instance', 'remote_id')
+
+    def __str__(self):
+        return f"{self.name} ({self.tower_instance_id}:{self.remote_id})"
+
+
+class InventorySync(models.Model):
+    """Outcome of the last inventory sync of a Tower instance."""
+    tower_instance = models.OneToOneField(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="inventory_sync"
+    )
+    last_synced = models.DateTimeField(null=True, blank=True)
+    last_attempt = models.DateTimeField(default=now)
+    duration_ms = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=20, default='pending')
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.tower_instance_id} {self.status} ({self.last_synced})"
+
+
+class ConnectivityProbe(models.Model):
+    """One /api/v2/ping/ probe of a Tower instance, with per-phase timings in milliseconds."""
+    tower_instance = models.ForeignKey(
+        TowerInstance,
+        on_delete=models.CASCADE,
+        related_name="connectivity_probes"
+    )
+    timestamp = models.DateTimeField(default=now)
+    ok = models.BooleanField(default=False)
+    http_status = models.IntegerField(null=True, blank=True)
+    dns_ms = models.FloatField(null=True, blank=True)
+    connect_ms = models.FloatField(null=True, blank=True)
+    tls_ms = models.FloatField(null=True, blank=True)
+    ttfb_ms = models.FloatField(null=True, blank=True)
+    total_ms = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='probe_timestamp_idx'),
+            models.Index(fields=['tower_instance', 'timestamp'], name='probe_instance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tower_instance_id} {self.http_status or self.error} ({self.total_ms} ms)"
+
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('admin', 'Admin'),
@@ -0,0 +1,80 @@
+"""
+In-memory name index over a credential-type inventory.
+Names are case-folded and whitespace-normalized for exact lookups, and a
+trigram index gives scored fuzzy candidates for alias matching.
+"""
+from collections import defaultdict
+
+
+def normalize_name(name):
+    """Case-fold and collapse whitespace so 'My  Type' and 'my type' match."""
+    return ' '.join((name or '').casefold().split())
+
+
+def trigrams(text):
+    """Return the set of character trigrams of an already normalized name."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CredentialTypeNameIndex:
+    """Exact and trigram lookups over one instance's credential types."""
+
+    def __init__(self, credential_types):
+        self._exact = {}
+        self._entries = []
+        self._postings = defaultdict(set)
+
+        for item in credential_types:
+            normalized = normalize_name(item.get('name'))
+            if not normalized:
+                continue
+            self._exact.setdefault(normalized, item)
+            grams = trigrams(normalized)
+            position = len(self._entries)
+            self._entries.append((item, grams))
+            for gram in grams:
+                self._postings[gram].add(position)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def exact(self, name):
+        """Return the credential type whose normalized name equals ``name``, or None."""
+        return self._exact.get(normalize_name(name))
+
+    def search(self, name, limit=5, min_score=0.3):
+        """
+        Return the best fuzzy matches for ``name``.
+
+        Args:
+            name (str): Name to look up
+            limit (int): Maximum number of candidates
+            min_score (float): Minimum trigram Jaccard similarity (0-1)
+
+        Returns:
+            list: Dictionaries with ``name``, ``score`` and ``credential_type``,
+            best match first
+        """
+        normalized = normalize_name(name)
+        if not normalized:
+            return []
+
+        query = trigrams(normalized)
+        overlaps = defaultdict(int)
+        for gram in query:
+            for position in self._postings.get(gram, ()):
+                overlaps[position] += 1
+
+        candidates = []
+        for position, overlap in overlaps.items():
+            item, grams = self._entries[position]
+            if normalize_name(item.get('name')) == normalized:
+                score = 1.0
+            else:
+                score = overlap / (len(query) + len(grams) - overlap)
+            if score >= min_score:
+                candidates.append({'name': item.get('name'), 'score': round(score, 3), 'credential_type': item})
+
+        candidates.sort(key=lambda c: (-c['score'], c['name']))
+        return candidates[:limit]
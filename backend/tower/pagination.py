@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AuditlogCursorPagination(CursorPagination):
+    """Keyset pagination on timestamp, so deep pages cost the same as the first."""
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
+    ordering = ('-timestamp', '-id')
@@ -0,0 +1,23 @@
+import csv
+import io
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class CSVParser(BaseParser):
+    """Parses a CSV upload with a header row into a list of dicts; empty cells are omitted."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            text = io.StringIO(stream.read().decode(encoding))
+            return [
+                {key.strip(): value for key, value in row.items() if key and value not in (None, '')}
+                for row in csv.DictReader(text)
+            ]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ParseError(f"CSV parse error - {e}")
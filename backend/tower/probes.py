@@ -0,0 +1,264 @@
+"""
+Estate-wide connectivity probes.
+Every selected TowerInstance is pinged on /api/v2/ping/ concurrently over a
+fresh connection so that DNS, TCP connect, TLS handshake and time to first
+byte can be timed separately (pooled sessions would hide the handshake).
+Each probe is bounded by TIMEOUT seconds overall, name resolution included
+(it runs on a small resolver pool, so a hanging resolver only costs the
+probe its budget), and a batch takes about as long as the slowest reachable
+instance. Results are stored in
+ConnectivityProbe for latency trends per region and environment.
+"""
+import http.client
+import math
+import socket
+import ssl
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Trunc
+from django.utils.timezone import now
+
+from .models import ConnectivityProbe
+
+DEFAULTS = {
+    'TIMEOUT': 5,
+    'MAX_WORKERS': 64,
+    'RETENTION_DAYS': 30,
+}
+
+PING_PATH = '/api/v2/ping/'
+RESOLVER_THREADS = 8
+TREND_BUCKETS = ('hour', 'day')
+TREND_GROUPS = {
+    'region': 'tower_instance__region',
+    'environment': 'tower_instance__environment',
+    'instance': 'tower_instance__name',
+}
+
+
+def get_probe_config():
+    """Return the connectivity probe settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_PROBES', {}))
+
+
+# getaddrinfo() has no timeout of its own; lookups are waited for at most the probe's budget
+_resolver = ThreadPoolExecutor(max_workers=RESOLVER_THREADS, thread_name_prefix='tower-probe-dns')
+
+
+def _ms(started):
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def probe_url(url, timeout):
+    """
+    Ping one Tower over a new connection, timing each phase.
+
+    TLS certificates are not verified, as with the pooled sessions.
+
+    Args:
+        url (str): Tower base URL
+        timeout (float): Budget in seconds for the whole probe
+
+    Returns:
+        dict: ``ok``, ``http_status``, ``dns_ms``, ``connect_ms``, ``tls_ms``
+        (None over plain HTTP), ``ttfb_ms``, ``total_ms`` and ``error``
+    """
+    result = {
+        'ok': False, 'http_status': None, 'dns_ms': None, 'connect_ms': None,
+        'tls_ms': None, 'ttfb_ms': None, 'total_ms': None, 'error': '',
+    }
+    started = time.monotonic()
+    deadline = started + timeout
+
+    def remaining():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout('timed out')
+        return left
+
+    sock = None
+    try:
+        parts = urlsplit(url)
+        if not parts.hostname:
+            raise ValueError(f"Invalid URL: {url!r}")
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+
+        phase = time.monotonic()
+        lookup = _resolver.submit(socket.getaddrinfo, parts.hostname, port, type=socket.SOCK_STREAM)
+        try:
+            family, socktype, proto, _, address = lookup.result(timeout=remaining())[0]
+        except FuturesTimeoutError:
+            lookup.cancel()
+            raise socket.timeout('name resolution timed out')
+        result['dns_ms'] = _ms(phase)
+
+        phase = time.monotonic()
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(remaining())
+        sock.connect(address)
+        result['connect_ms'] = _ms(phase)
+
+        if secure:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            phase = time.monotonic()
+            sock.settimeout(remaining())
+            sock = context.wrap_socket(sock, server_hostname=parts.hostname)
+            result['tls_ms'] = _ms(phase)
+
+        connection = http.client.HTTPConnection(parts.hostname, port)
+        connection.sock = sock
+        phase = time.monotonic()
+        sock.settimeout(remaining())
+        connection.request('GET', parts.path.rstrip('/') + PING_PATH, headers={'Accept': 'application/json'})
+        response = connection.getresponse()
+        result['ttfb_ms'] = _ms(phase)
+        sock.settimeout(remaining())
+        response.read()
+
+        result['http_status'] = response.status
+        result['ok'] = 200 <= response.status < 400
+        if not result['ok']:
+            result['error'] = f"HTTP {response.status} {response.reason}"
+
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        result['error'] = str(e) or e.__class__.__name__
+
+    finally:
+        if sock is not None:
+            sock.close()
+
+    result['total_ms'] = _ms(started)
+    return result
+
+
+def _percentile(ordered, q):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_percentiles(values):
+    """Return count, p50, p90, p99 and max of the non-empty latencies in ``values``."""
+    ordered = sorted(value for value in values if value is not None)
+    if not ordered:
+        return {'count': 0, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+    return {
+        'count': len(ordered),
+        'p50': _percentile(ordered, 50),
+        'p90': _percentile(ordered, 90),
+        'p99': _percentile(ordered, 99),
+        'max': ordered[-1],
+    }
+
+
+def probe_instances(instances, timeout=None, max_workers=None):
+    """
+    Probe many Tower instances concurrently and record the results.
+
+    Args:
+        instances (iterable): TowerInstance model objects
+        timeout (float): Per-instance budget in seconds (defaults to TOWER_PROBES['TIMEOUT'])
+        max_workers (int): Concurrency cap (defaults to TOWER_PROBES['MAX_WORKERS'])
+
+    Returns:
+        dict: Batch summary with latency and TLS handshake percentiles overall
+        and per region/environment, plus one result per instance
+    """
+    config = get_probe_config()
+    timeout = timeout or config['TIMEOUT']
+    instances = list(instances)
+    started = time.monotonic()
+
+    results = []
+    if instances:
+        workers = max(1, min(max_workers or config['MAX_WORKERS'], len(instances)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda instance: probe_url(instance.url, timeout), instances))
+
+    timestamp = now()
+    ConnectivityProbe.objects.bulk_create([
+        ConnectivityProbe(tower_instance=instance, timestamp=timestamp, **result)
+        for instance, result in zip(instances, results)
+    ])
+
+    by_region, by_environment = defaultdict(list), defaultdict(list)
+    for instance, result in zip(instances, results):
+        if result['ok']:
+            by_region[instance.region or 'unspecified'].append(result['total_ms'])
+            by_environment[instance.environment or 'unspecified'].append(result['total_ms'])
+
+    return {
+        'timestamp': timestamp,
+        'elapsed_ms': _ms(started),
+        'probed': len(instances),
+        'reachable': sum(1 for result in results if result['ok']),
+        'latency': latency_percentiles(result['total_ms'] for result in results if result['ok']),
+        'tls_handshake': latency_percentiles(result['tls_ms'] for result in results if result['ok']),
+        'by_region': {key: latency_percentiles(values) for key, values in sorted(by_region.items())},
+        'by_environment': {key: latency_percentiles(values) for key, values in sorted(by_environment.items())},
+        'results': [
+            dict(result, id=instance.pk, name=instance.name, region=instance.region, environment=instance.environment)
+            for instance, result in zip(instances, results)
+        ],
+    }
+
+
+def latest_probes():
+    """Return the most recent probe of every instance."""
+    latest_ids = ConnectivityProbe.objects.values('tower_instance').annotate(last=Max('id')).values('last')
+    return ConnectivityProbe.objects.filter(id__in=latest_ids).select_related('tower_instance')
+
+
+def probe_trends(start, bucket='hour', group='region'):
+    """
+    Latency percentiles per time bucket and region, environment or instance.
+
+    Args:
+        start (datetime): Oldest probe to include
+        bucket (str): 'hour' or 'day'
+        group (str): 'region', 'environment' or 'instance'
+
+    Returns:
+        list: One entry per (bucket, group) with probe and failure counts and
+        percentiles of the total and TLS handshake times of successful probes
+    """
+    rows = ConnectivityProbe.objects.filter(timestamp__gte=start).annotate(
+        bucket=Trunc('timestamp', bucket)
+    ).values_list('bucket', TREND_GROUPS[group], 'ok', 'total_ms', 'tls_ms')
+
+    series = defaultdict(lambda: {'probes': 0, 'failures': 0, 'total': [], 'tls': []})
+    for when, key, ok, total_ms, tls_ms in rows.iterator():
+        entry = series[(when, key or 'unspecified')]
+        entry['probes'] += 1
+        if ok:
+            entry['total'].append(total_ms)
+            entry['tls'].append(tls_ms)
+        else:
+            entry['failures'] += 1
+
+    return [
+        {
+            'bucket': when,
+            group: key,
+            'probes': entry['probes'],
+            'failures': entry['failures'],
+            'latency': latency_percentiles(entry['total']),
+            'tls_handshake': latency_percentiles(entry['tls']),
+        }
+        for (when, key), entry in sorted(series.items())
+    ]
+
+
+def prune_probes(retention_days=None):
+    """Delete probes older than RETENTION_DAYS; returns the number of rows deleted."""
+    retention_days = retention_days or get_probe_config()['RETENTION_DAYS']
+    deleted, _ = ConnectivityProbe.objects.filter(timestamp__lt=now() - timedelta(days=retention_days)).delete()
+    return deleted
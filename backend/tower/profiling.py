@@ -0,0 +1,293 @@
+"""
+Sampling profiler for slow API requests (opt-in with TOWER_PROFILER['ENABLED']).
+SamplingProfilerMiddleware registers every request with one background
+sampler thread. A request is sampled every INTERVAL_MS once it has run for
+THRESHOLD_MS, or from the start for 1 in SAMPLE_ONE_IN requests, including
+the fan-out worker threads it started. Fast requests are never sampled and
+only pay for registration and for keeping their TOP_CALLS slowest SQL
+statements and Tower calls, so the profiler can stay enabled in production.
+
+Profiled requests are appended to OUTPUT_DIR:
+``stacks.collapsed`` holds one "view;thread;frame;...;frame count" line per
+distinct stack (the collapsed format read by flamegraph.pl and speedscope),
+``slow_requests.jsonl`` one summary per request with its slowest SQL
+statements (without parameters) and Tower calls. Both files are rotated at
+MAX_FILE_BYTES, keeping BACKUP_COUNT old files. Async views are not
+profiled: they share the event loop thread.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.timezone import now
+
+from .metrics import view_label
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 1000,
+    'SAMPLE_ONE_IN': 0,
+    'INTERVAL_MS': 10,
+    'MAX_DEPTH': 64,
+    'TOP_CALLS': 10,
+    'OUTPUT_DIR': 'profiles',
+    'MAX_FILE_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
+STACKS_FILE = 'stacks.collapsed'
+REQUESTS_FILE = 'slow_requests.jsonl'
+MAX_SQL_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def get_profiler_config():
+    """Return the profiler settings merged over the defaults (SAMPLE_ONE_IN <= 0: none)."""
+    config = dict(DEFAULTS, **getattr(settings, 'TOWER_PROFILER', {}))
+    try:
+        config['SAMPLE_ONE_IN'] = max(0, int(config['SAMPLE_ONE_IN'] or 0))
+    except (TypeError, ValueError):
+        raise ImproperlyConfigured(
+            f"TOWER_PROFILER['SAMPLE_ONE_IN'] must be an integer, not {config['SAMPLE_ONE_IN']!r}"
+        )
+    return config
+
+
+def _collapse(frame, max_depth):
+    # Innermost MAX_DEPTH frames, outermost first
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+_sequence = itertools.count()
+
+
+class RequestTrace:
+    """Stack samples and slowest SQL statements and Tower calls of one request."""
+
+    def __init__(self, request, config, sampled):
+        self.request = request
+        self.config = config
+        self.sampled = sampled
+        self.started = time.monotonic()
+        self.due_at = self.started if sampled else self.started + config['THRESHOLD_MS'] / 1000
+        self.threads = {threading.get_ident(): 'request'}
+        self.stacks = Counter()
+        self.samples = 0
+        self._sql = []
+        self._tower_calls = []
+        self._lock = threading.Lock()
+
+    def sample(self, frames):
+        with self._lock:
+            threads = list(self.threads.items())
+        collapsed = [
+            (role, _collapse(frames[ident], self.config['MAX_DEPTH']))
+            for ident, role in threads if ident in frames
+        ]
+        with self._lock:
+            for key in collapsed:
+                self.stacks[key] += 1
+            self.samples += 1
+
+    def _keep(self, heap, seconds, entry):
+        # Min-heap of the TOP_CALLS slowest entries
+        item = (seconds, next(_sequence), entry)
+        with self._lock:
+            if len(heap) < self.config['TOP_CALLS']:
+                heapq.heappush(heap, item)
+            elif seconds > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self._keep(self._sql, time.monotonic() - started, {'sql': sql[:MAX_SQL_LENGTH], 'many': many})
+
+    def add_tower_call(self, instance, method, url, status, seconds):
+        self._keep(self._tower_calls, seconds, {'instance': instance, 'method': method, 'url': url, 'status': status})
+
+    @staticmethod
+    def _slowest(heap):
+        return [dict(entry, ms=round(seconds * 1000, 1)) for seconds, _, entry in sorted(heap, reverse=True)]
+
+    def summary(self, response, elapsed, reason):
+        return {
+            'timestamp': now().isoformat(),
+            'view': view_label(self.request),
+            'method': self.request.method,
+            'path': self.request.path,
+            'status': response.status_code,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'reason': reason,
+            'samples': self.samples,
+            'interval_ms': self.config['INTERVAL_MS'],
+            'slowest_sql': self._slowest(self._sql),
+            'slowest_tower_calls': self._slowest(self._tower_calls),
+        }
+
+
+_trace = contextvars.ContextVar('tower_request_trace', default=None)
+
+_active = {}
+_active_lock = threading.Lock()
+_wake = threading.Event()
+_sampler = None
+
+
+def _run_sampler(interval):
+    while True:
+        with _active_lock:
+            traces = list(_active.values())
+            current = time.monotonic()
+            due = [trace for trace in traces if trace.due_at <= current]
+            if not due:
+                # Cleared under the lock, so a request registered from now on wakes the sampler
+                _wake.clear()
+        if not due:
+            # Sleep until the earliest threshold (or a new request): fast requests are never walked
+            _wake.wait(min(trace.due_at for trace in traces) - current if traces else None)
+            continue
+        frames = sys._current_frames()
+        for trace in due:
+            trace.sample(frames)
+        time.sleep(interval)
+
+
+def _register(trace):
+    global _sampler
+    with _active_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(
+                target=_run_sampler, args=(trace.config['INTERVAL_MS'] / 1000,),
+                name='tower-profiler', daemon=True,
+            )
+            _sampler.start()
+        _active[id(trace)] = trace
+        _wake.set()
+
+
+def _unregister(trace):
+    with _active_lock:
+        _active.pop(id(trace), None)
+
+
+@contextmanager
+def profiled_thread(role='fan-out'):
+    """Include the current (worker) thread in the stack samples of the request it works for."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    ident = threading.get_ident()
+    with trace._lock:
+        trace.threads[ident] = role
+    try:
+        yield
+    finally:
+        with trace._lock:
+            trace.threads.pop(ident, None)
+
+
+def record_tower_call(instance, method, url, status, seconds):
+    """Offer one Tower call to the slowest-calls list of the request being profiled, if any."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_tower_call(instance, method, url, status, seconds)
+
+
+def _rotate(path, max_bytes, backup_count):
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+        for index in range(backup_count - 1, 0, -1):
+            if os.path.exists(f'{path}.{index}'):
+                os.replace(f'{path}.{index}', f'{path}.{index + 1}')
+        if backup_count:
+            os.replace(path, f'{path}.1')
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        # Not written yet, or rotated meanwhile by another worker
+        pass
+
+
+_write_lock = threading.Lock()
+
+
+def write_profile(trace, summary):
+    """Append a profiled request to the collapsed-stack and summary files."""
+    config = trace.config
+    prefix = summary['view'].replace(';', '_').replace(' ', '_')
+    stacks = ''.join(
+        f'{prefix};{role};{stack} {count}\n' for (role, stack), count in sorted(trace.stacks.items())
+    )
+    try:
+        os.makedirs(config['OUTPUT_DIR'], exist_ok=True)
+        with _write_lock:
+            for name, text in ((STACKS_FILE, stacks), (REQUESTS_FILE, json.dumps(summary) + '\n')):
+                if not text:
+                    continue
+                path = os.path.join(config['OUTPUT_DIR'], name)
+                _rotate(path, config['MAX_FILE_BYTES'], config['BACKUP_COUNT'])
+                with open(path, 'a', encoding='utf-8') as output:
+                    output.write(text)
+    except OSError as e:
+        logger.error("Error writing request profile: %s", e)
+
+
+class SamplingProfilerMiddleware:
+    """Profiles slow (and 1 in SAMPLE_ONE_IN) sync requests when TOWER_PROFILER is enabled."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        config = get_profiler_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        one_in = config['SAMPLE_ONE_IN']
+        trace = RequestTrace(request, config, sampled=bool(one_in) and random.randrange(one_in) == 0)
+        token = _trace.set(trace)
+        _register(trace)
+        try:
+            with connection.execute_wrapper(trace.sql_wrapper):
+                response = self.get_response(request)
+        finally:
+            _unregister(trace)
+            _trace.reset(token)
+
+        elapsed = time.monotonic() - trace.started
+        if trace.sampled or elapsed * 1000 >= config['THRESHOLD_MS']:
+            write_profile(trace, trace.summary(response, elapsed, 'sampled' if trace.sampled else 'threshold'))
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
@@ -0,0 +1,135 @@
+"""
+Daily audit activity rollups.
+Every batch written by the audit pipeline increments AuditActivityRollup
+counters (day x user x action x object_type) in the same transaction, so
+activity charts read a few hundred rollup rows instead of scanning the
+Auditlog table. ``rebuild_rollups`` recomputes a date range from the hot
+table and the monthly archives.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+from .models import AuditActivityRollup, Auditlog
+
+DIMENSIONS = ('user', 'action', 'object_type')
+
+
+def _count_entries(entries):
+    return Counter(
+        (localdate(entry.timestamp), entry.user, entry.action, entry.object_type)
+        for entry in entries
+    )
+
+
+def _apply_counts(counts):
+    """Add counts keyed by (day, user, action, object_type); safe against concurrent writers."""
+    # Make sure every row exists, then increment in the database so that
+    # concurrent flushes from other processes never overwrite each other
+    AuditActivityRollup.objects.bulk_create(
+        [AuditActivityRollup(day=day, user=user, action=action, object_type=object_type)
+         for day, user, action, object_type in counts],
+        ignore_conflicts=True
+    )
+    for (day, user, action, object_type), count in counts.items():
+        AuditActivityRollup.objects.filter(
+            day=day, user=user, action=action, object_type=object_type
+        ).update(count=F('count') + count)
+
+
+def apply_rollups(entries):
+    """Increment the rollups for Auditlog rows that were just written (call inside their transaction)."""
+    counts = _count_entries(entries)
+    if counts:
+        _apply_counts(counts)
+
+
+def rebuild_rollups(start, end, include_archive=True):
+    """
+    Recompute the rollups of ``start``..``end`` (inclusive dates) from scratch.
+
+    Args:
+        start (date): First day to rebuild
+        end (date): Last day to rebuild
+        include_archive (bool): Also count archived months in the range
+
+    Returns:
+        int: Number of audit entries counted
+    """
+    hot = (
+        Auditlog.objects.annotate(day=TruncDate('timestamp'))
+        .filter(day__gte=start, day__lte=end)
+        .values('day', *DIMENSIONS)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    counts = Counter({(row['day'], row['user'], row['action'], row['object_type']): row['count'] for row in hot})
+
+    if include_archive:
+        # Imported here: the archive module depends on the audit pipeline, which imports this one
+        from .archive import archived_months, iter_archived_entries
+
+        months = [
+            month for month in archived_months()
+            if (start.year, start.month) <= month <= (end.year, end.month)
+        ]
+        archived = (
+            entry for entry in iter_archived_entries(months, {})
+            if start <= localdate(entry.timestamp) <= end
+        )
+        counts.update(_count_entries(archived))
+
+    with transaction.atomic():
+        AuditActivityRollup.objects.filter(day__gte=start, day__lte=end).delete()
+        AuditActivityRollup.objects.bulk_create(
+            [AuditActivityRollup(day=day, user=user, action=action, object_type=object_type, count=count)
+             for (day, user, action, object_type), count in counts.items()],
+            batch_size=1000
+        )
+    return sum(counts.values())
+
+
+def activity_summary(start, end, series='action', filters=None):
+    """
+    Chart data for a date range, read from the rollups only.
+
+    Args:
+        start (date): First day (inclusive)
+        end (date): Last day (inclusive)
+        series (str): Dimension that splits the daily series (one of DIMENSIONS)
+        filters (dict): Optional exact filters on user/action/object_type
+
+    Returns:
+        dict: ``days`` (ISO dates), ``series`` ({value: counts aligned with
+        days}), ``totals`` per dimension and the overall ``total``
+    """
+    rows = (
+        AuditActivityRollup.objects.filter(day__gte=start, day__lte=end, **(filters or {}))
+        .values_list('day', *DIMENSIONS, 'count')
+    )
+
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    position = {day: index for index, day in enumerate(days)}
+    split = {}
+    totals = {dimension: Counter() for dimension in DIMENSIONS}
+    total = 0
+
+    for day, user, action, object_type, count in rows.iterator():
+        values = {'user': user, 'action': action, 'object_type': object_type}
+        split.setdefault(values[series], [0] * len(days))[position[day]] += count
+        for dimension in DIMENSIONS:
+            totals[dimension][values[dimension]] += count
+        total += count
+
+    return {
+        'start': start,
+        'end': end,
+        'days': [day.isoformat() for day in days],
+        'series': dict(sorted(split.items())),
+        'totals': {dimension: dict(counter.most_common()) for dimension, counter in totals.items()},
+        'total': total,
+    }
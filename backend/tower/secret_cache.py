@@ -0,0 +1,144 @@
+"""
+Short-lived in-process cache of decrypted TowerInstance passwords.
+The password column is Fernet-encrypted, so every loaded row costs a
+decryption. Views load instances with the column deferred and Tower helpers
+fetch the password from here instead: entries are keyed by instance id and
+row version (``updated_at``), expire after TTL seconds, and the LRU is
+bounded to MAX_SIZE entries. Hits and misses are counted where a password
+is read (``get_instance_password``), not when the cache is primed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import SECRET_DECRYPT_DURATION, record_secret_lookup
+from .models import TowerInstance
+
+DEFAULTS = {
+    'MAX_SIZE': 1024,
+    'TTL': 300,
+}
+
+
+def get_secret_cache_config():
+    """Return the secret cache settings merged over the defaults."""
+    return dict(DEFAULTS, **getattr(settings, 'TOWER_SECRET_CACHE', {}))
+
+
+class SecretCache:
+    """Bounded LRU of secrets keyed by (pk, row version)."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # pk -> (version, expires_at, secret)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, pk, version):
+        entry = self._entries.get(pk)
+        if entry is None:
+            return None
+        if entry[0] != version or entry[1] < time.monotonic():
+            del self._entries[pk]
+            return None
+        self._entries.move_to_end(pk)
+        return entry[2]
+
+    def contains(self, pk, version):
+        with self._lock:
+            return self._lookup(pk, version) is not None
+
+    def get(self, pk, version):
+        """Return the cached secret, or None on a miss, a newer row version or expiry."""
+        with self._lock:
+            return self._lookup(pk, version)
+
+    def put(self, pk, version, secret):
+        with self._lock:
+            self._entries.pop(pk, None)
+            self._entries[pk] = (version, time.monotonic() + self.ttl, secret or '')
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_secret_cache():
+    """Return the process-wide secret cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = get_secret_cache_config()
+            _cache = SecretCache(config['MAX_SIZE'], config['TTL'])
+        return _cache
+
+
+def _password_loaded(tower_instance):
+    return 'password' not in tower_instance.get_deferred_fields()
+
+
+def prime_secrets(instances):
+    """
+    Make sure the passwords of ``instances`` are cached, decrypting misses in one query.
+
+    Called before fanning out so that worker threads only read the cache.
+    """
+    cache = get_secret_cache()
+    missing = []
+    for instance in instances:
+        if cache.contains(instance.pk, instance.updated_at):
+            continue
+        if _password_loaded(instance):
+            cache.put(instance.pk, instance.updated_at, instance.password)
+        else:
+            missing.append(instance.pk)
+
+    if missing:
+        started = time.monotonic()
+        rows = list(TowerInstance.objects.filter(pk__in=missing).values_list('pk', 'updated_at', 'password'))
+        SECRET_DECRYPT_DURATION.observe(time.monotonic() - started)
+        for pk, version, password in rows:
+            cache.put(pk, version, password)
+
+
+def get_instance_password(tower_instance):
+    """Return the decrypted password of a TowerInstance, through the cache."""
+    cache = get_secret_cache()
+    password = cache.get(tower_instance.pk, tower_instance.updated_at)
+    record_secret_lookup(password is not None)
+    if password is not None:
+        return password
+
+    if _password_loaded(tower_instance):
+        password = tower_instance.password
+        cache.put(tower_instance.pk, tower_instance.updated_at, password)
+        return password or ''
+
+    # The row may have changed since this object was loaded; cache the current version
+    started = time.monotonic()
+    row = TowerInstance.objects.filter(pk=tower_instance.pk).values_list('updated_at', 'password').first()
+    SECRET_DECRYPT_DURATION.observe(time.monotonic() - started)
+    if row is None:
+        return ''
+    cache.put(tower_instance.pk, row[0], row[1])
+    return row[1] or ''
+
+
+def invalidate_secret(tower_instance):
+    """Drop the cached password of an instance that changed or was deleted."""
+    get_secret_cache().invalidate(tower_instance.pk)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
-from .models import TowerInstance, Credential, ExecutionEnvironment, Auditlog
+from django.utils import timezone
+from .models import TowerInstance, Credential, ExecutionEnvironment, Auditlog, ConnectivityProbe
 
 User = get_user_model()
 
@@ -38,6 +40,101 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
+class TowerTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Embeds username and role in issued tokens (see tower.authentication)."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['role'] = user.role
+        return token
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that can resolve pks from a batch prefetched by BulkListSerializer."""
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except Exception:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return self.prefetched[pk]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Validates many items with one query per related field instead of one per item."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for name, field in self.child.fields.items():
+                if isinstance(field, BulkPrimaryKeyRelatedField) and not field.read_only:
+                    pks = {item.get(name) for item in data if isinstance(item, dict)} - {None, ''}
+                    field.prefetched = field.get_queryset().in_bulk(pks) if pks else {}
+        return super().to_internal_value(data)
+
+
+class ChangeTrackingModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer whose update() writes only the changed columns.
+    
+    The instance loaded for the request is the snapshot: only fields present
+    in validated_data are compared, and secret fields are masked in the diff
+    without being read (so they are never decrypted).
+    """
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    secret_fields = ('password',)
+    secret_mask = '********'
+
+    def apply_changes(self, instance, validated_data):
+        """
+        Assign changed values to the instance without saving it.
+        
+        Returns:
+            tuple: (changes dict for the audit log, list of fields to save)
+        """
+        opts = instance._meta
+        changes = {}
+        update_fields = []
+        for attr, value in validated_data.items():
+            field = opts.get_field(attr)
+            if attr in self.secret_fields:
+                changes[attr] = {'from': self.secret_mask, 'to': self.secret_mask}
+            else:
+                old_val = getattr(instance, field.attname)
+                new_val = value.pk if field.is_relation and value is not None else value
+                if old_val == new_val:
+                    continue
+                changes[attr] = {'from': old_val, 'to': new_val}
+            setattr(instance, attr, value)
+            update_fields.append(attr)
+
+        if update_fields:
+            # Set here as well: bulk_update() does not run pre_save()
+            current = timezone.now()
+            for f in opts.concrete_fields:
+                if getattr(f, 'auto_now', False):
+                    setattr(instance, f.attname, current)
+                    update_fields.append(f.name)
+        return changes, update_fields
+
+    def update(self, instance, validated_data):
+        opts = instance._meta
+        if any(opts.get_field(attr).many_to_many for attr in validated_data):
+            self.changes = {}
+            return super().update(instance, validated_data)
+
+        self.changes, update_fields = self.apply_changes(instance, validated_data)
+        if update_fields:
+            instance.save(update_fields=update_fields)
+        return instance
+
+
 class AuditlogSerializer(serializers.ModelSerializer):
     """Serializer for audit log entries - fixed naming consistency."""
     
@@ -46,31 +143,105 @@ class AuditlogSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TowerInstanceSerializer(serializers.ModelSerializer):
+class TowerInstanceSerializer(ChangeTrackingModelSerializer):
     """Serializer for Tower instances with secure password handling."""
     
     class Meta:
         model = TowerInstance
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
 
-class CredentialSerializer(serializers.ModelSerializer):
+class CredentialSerializer(ChangeTrackingModelSerializer):
     """Serializer for credentials with secure password handling."""
     
     class Meta:
         model = Credential
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
 
-class ExecutionEnvironmentSerializer(serializers.ModelSerializer):
+class ExecutionEnvironmentSerializer(ChangeTrackingModelSerializer):
     """Serializer for execution environments."""
     
     class Meta:
         model = ExecutionEnvironment
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = BulkListSerializer
+
+
+class CredentialSummarySerializer(serializers.ModelSerializer):
+    """Lightweight read-only credential representation for nested instance reads."""
+    
+    class Meta:
+        model = Credential
+        fields = ['id', 'name', 'type', 'username']
+        read_only_fields = fields
+
+
+class ExecutionEnvironmentSummarySerializer(serializers.ModelSerializer):
+    """Lightweight read-only execution environment representation for nested instance reads."""
+    
+    class Meta:
+        model = ExecutionEnvironment
+        fields = ['id', 'name', 'image', 'description']
+        read_only_fields = fields
+
+
+class TowerInstanceExpandedSerializer(TowerInstanceSerializer):
+    """Tower instance with its credentials and/or environments nested (see ?expand=)."""
+    EXPANDABLE = ('credentials', 'environments')
+
+    credentials = CredentialSummarySerializer(many=True, read_only=True)
+    environments = ExecutionEnvironmentSummarySerializer(many=True, read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand', self.EXPANDABLE)
+        for name in self.EXPANDABLE:
+            if name not in expand:
+                self.fields.pop(name)
+
+    class Meta(TowerInstanceSerializer.Meta):
+        pass
+
+
+class ConnectivityProbeSerializer(serializers.ModelSerializer):
+    """Read-only probe history entry with its instance's name, region and environment."""
+    name = serializers.CharField(source='tower_instance.name', read_only=True)
+    region = serializers.CharField(source='tower_instance.region', read_only=True)
+    environment = serializers.CharField(source='tower_instance.environment', read_only=True)
+
+    class Meta:
+        model = ConnectivityProbe
+        fields = [
+            'id', 'tower_instance', 'name', 'region', 'environment', 'timestamp', 'ok', 'http_status',
+            'dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'total_ms', 'error',
+        ]
+        read_only_fields = fields
+
+
+class VerifyCredentialTypeSerializer(serializers.Serializer):
+    """Payload of verify-credential-type/: names to look for and the instances to search."""
+    MAX_LIMIT = 50
+
+    original_name = serializers.CharField()
+    alternative_name = serializers.CharField(required=False, allow_blank=True)
+    alternative_names = serializers.ListField(child=serializers.CharField(), required=False)
+    missing_in_instances = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_LIMIT, default=5)
+
+    def validate(self, attrs):
+        names = list(attrs.get('alternative_names', []))
+        if attrs.get('alternative_name'):
+            names.insert(0, attrs['alternative_name'])
+        if not names:
+            raise serializers.ValidationError({'alternative_names': ['At least one alternative name is required.']})
+        attrs['alternative_names'] = names
+        return attrs
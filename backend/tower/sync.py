@@ -0,0 +1,250 @@
+"""
+Inventory sync between Tower instances and the local snapshot tables.
+Remote credential types and credentials are fetched concurrently and
+upserted incrementally: rows are diffed by remote id and ``modified``.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from .models import InventorySync, RemoteCredential, RemoteCredentialType
+from .utils import fan_out, get_tower_session, iter_tower_results
+
+
+def _credential_type_fields(item):
+    return {
+        'name': item.get('name', ''),
+        'description': item.get('description') or '',
+        'kind': item.get('kind') or '',
+    }
+
+
+def _credential_fields(item):
+    return {
+        'name': item.get('name', ''),
+        'credential_type': item.get('credential_type'),
+    }
+
+
+def _fetch_inventory(tower_instance):
+    """Download the credential types and credentials of one Tower instance."""
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    session = get_tower_session(tower_instance)
+    timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+    return {
+        'credential_types': list(iter_tower_results(
+            session, tower_instance.url, '/api/v2/credential_types/', timeout=timeout
+        )),
+        'credentials': list(iter_tower_results(
+            session, tower_instance.url, '/api/v2/credentials/', timeout=timeout
+        )),
+    }
+
+
+def _upsert(model, tower_instance, items, build_fields):
+    """
+    Apply a remote listing to one snapshot table of one instance.
+
+    Only rows whose ``modified`` timestamp changed are rewritten.
+
+    Returns:
+        dict: Number of rows created, updated and deleted
+    """
+    existing = {
+        row.remote_id: row
+        for row in model.objects.filter(tower_instance=tower_instance).only('id', 'remote_id', 'modified')
+    }
+
+    to_create, to_update, seen = [], [], set()
+    for item in items:
+        remote_id = item.get('id')
+        if remote_id is None:
+            continue
+        seen.add(remote_id)
+        modified = parse_datetime(item['modified']) if item.get('modified') else None
+        row = existing.get(remote_id)
+
+        if row is None:
+            to_create.append(model(
+                tower_instance=tower_instance,
+                remote_id=remote_id,
+                modified=modified,
+                data=item,
+                **build_fields(item)
+            ))
+        elif modified is None or row.modified != modified:
+            for field, value in build_fields(item).items():
+                setattr(row, field, value)
+            row.modified = modified
+            row.data = item
+            to_update.append(row)
+
+    stale_ids = [remote_id for remote_id in existing if remote_id not in seen]
+
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        update_fields = list(build_fields({}).keys()) + ['modified', 'data']
+        model.objects.bulk_update(to_update, update_fields, batch_size=500)
+    if stale_ids:
+        model.objects.filter(tower_instance=tower_instance, remote_id__in=stale_ids).delete()
+
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(stale_ids)}
+
+
+def _record_outcome(outcome):
+    """Write one fetched inventory into the snapshot tables."""
+    tower_instance = outcome['instance']
+    started = time.monotonic()
+    summary = {'instance': tower_instance.name}
+
+    if outcome['error'] is not None:
+        InventorySync.objects.update_or_create(
+            tower_instance=tower_instance,
+            defaults={
+                'last_attempt': now(),
+                'duration_ms': outcome['elapsed_ms'],
+                'status': 'error',
+                'error': str(outcome['error']),
+            }
+        )
+        summary.update(status='error', error=str(outcome['error']), duration_ms=outcome['elapsed_ms'])
+        return summary
+
+    with transaction.atomic():
+        summary['credential_types'] = _upsert(
+            RemoteCredentialType, tower_instance, outcome['result']['credential_types'], _credential_type_fields
+        )
+        summary['credentials'] = _upsert(
+            RemoteCredential, tower_instance, outcome['result']['credentials'], _credential_fields
+        )
+        duration_ms = round(outcome['elapsed_ms'] + (time.monotonic() - started) * 1000, 1)
+        InventorySync.objects.update_or_create(
+            tower_instance=tower_instance,
+            defaults={
+                'last_synced': now(),
+                'last_attempt': now(),
+                'duration_ms': duration_ms,
+                'status': 'ok',
+                'error': '',
+            }
+        )
+
+    summary.update(status='ok', duration_ms=duration_ms)
+    return summary
+
+
+def sync_instances(instances, max_workers=None):
+    """
+    Sync the snapshot tables of the given Tower instances.
+
+    Remote calls run concurrently; database writes happen on the calling
+    thread, one transaction per instance.
+
+    Args:
+        instances (iterable): TowerInstance model objects
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+
+    Returns:
+        list: Per-instance summary dictionaries
+    """
+    return [_record_outcome(outcome) for outcome in fan_out(instances, _fetch_inventory, max_workers)]
+
+
+def upsert_credential_type(tower_instance, item):
+    """Record a credential type just created through the API in the snapshot."""
+    modified = parse_datetime(item['modified']) if item.get('modified') else None
+    RemoteCredentialType.objects.update_or_create(
+        tower_instance=tower_instance,
+        remote_id=item['id'],
+        defaults=dict(_credential_type_fields(item), modified=modified, data=item)
+    )
+
+
+def is_stale(last_synced):
+    """True when a snapshot is older than TOWER_INVENTORY_STALE_AFTER seconds."""
+    stale_after = getattr(settings, 'TOWER_INVENTORY_STALE_AFTER', 900)
+    return last_synced is None or last_synced < now() - timedelta(seconds=stale_after)
+
+
+def _snapshot_outcomes(instances, results_for):
+    """
+    Build fan-out style outcomes from the snapshot tables.
+
+    ``results_for(instance_ids)`` returns the rows of the synced instances
+    as {instance id: [items]}.
+    """
+    synced = {
+        sync.tower_instance_id: sync
+        for sync in InventorySync.objects.filter(tower_instance__in=instances, last_synced__isnull=False)
+    }
+    results = results_for(list(synced))
+
+    outcomes, unsynced = {}, []
+    for instance in instances:
+        sync = synced.get(instance.pk)
+        if sync is None:
+            unsynced.append(instance)
+            continue
+        outcomes[instance.pk] = {
+            'instance': instance,
+            'result': results.get(instance.pk, []),
+            'error': None,
+            'elapsed_ms': 0,
+            'source': 'snapshot',
+            'last_synced': sync.last_synced,
+            'stale': is_stale(sync.last_synced),
+        }
+    return outcomes, unsynced
+
+
+def _snapshot_credential_types(instance_ids):
+    types_by_instance = {}
+    rows = RemoteCredentialType.objects.filter(tower_instance__in=instance_ids).values_list(
+        'tower_instance_id', 'name', 'description'
+    )
+    for instance_id, name, description in rows:
+        types_by_instance.setdefault(instance_id, []).append({'name': name, 'description': description})
+    return types_by_instance
+
+
+def _snapshot_credentials(instance_ids):
+    credentials_by_instance = {}
+    rows = RemoteCredential.objects.filter(tower_instance__in=instance_ids).order_by('remote_id').values_list(
+        'tower_instance_id', 'data'
+    )
+    for instance_id, data in rows:
+        credentials_by_instance.setdefault(instance_id, []).append(data)
+    return credentials_by_instance
+
+
+def snapshot_credential_type_outcomes(instances):
+    """
+    Build fan-out style outcomes for credential types from the snapshot table.
+
+    Args:
+        instances (list): TowerInstance model objects
+
+    Returns:
+        tuple: (outcomes keyed by instance pk, instances that were never synced)
+    """
+    return _snapshot_outcomes(instances, _snapshot_credential_types)
+
+
+def snapshot_credential_outcomes(instances):
+    """
+    Build fan-out style outcomes for credentials (full Tower payloads) from the snapshot table.
+
+    Args:
+        instances (list): TowerInstance model objects
+
+    Returns:
+        tuple: (outcomes keyed by instance pk, instances that were never synced)
+    """
+    return _snapshot_outcomes(instances, _snapshot_credentials)
@@ -0,0 +1,1607 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, OperationalError, connection, connections
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, JsonResponse
+from django.urls import path
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    archive, async_tower, async_views, authentication, breaker, cache, dashboard, db, deadlines, probes, profiling,
+    rollups, sync, utils
+)
+from .audit import AuditWriter, get_audit_config
+from .credential_search import encode_cursor, paginate_credentials
+from .metrics import SECRET_LOOKUPS, record_remote
+from .permissions import IsAdmin
+from .models import (
+    AuditActivityRollup, Auditlog, ConnectivityProbe, Credential, ExecutionEnvironment, InventorySync, RemoteCredential,
+    RemoteCredentialType, TowerInstance
+)
+from .secret_cache import get_instance_password, get_secret_cache, prime_secrets
+from .utils import (
+    fetch_credential_types_for_instances, get_tower_session, iter_fan_out, iter_tower_results, log_action, log_actions,
+    session_pool_stats,
+)
+
+
+class FakeTowerHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        request = {'method': self.command, 'path': parsed.path, 'query': parse_qs(parsed.query),
+                   'headers': dict(self.headers), 'body': json.loads(self.rfile.read(length)) if length else None}
+        self.server.requests.append(request)
+        status, body, headers = self.server.route(request)
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_tower(testcase, route):
+    """
+    Serve a fake Tower API on localhost for the duration of a test.
+
+    ``route(request)`` returns (status, JSON body, headers); requests (with
+    their decoded JSON body) are recorded in ``server.requests``. Returns (server, base URL).
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTowerHandler)
+    server.route = route
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    testcase.addCleanup(server.server_close)
+    testcase.addCleanup(server.shutdown)
+    # Breakers and latency history are per instance id, which later tests reuse
+    testcase.addCleanup(breaker._breakers.clear)
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def sync_audit_writer():
+    """Audit writer that writes in the request, so tests can assert on Auditlog rows."""
+    return mock.patch('tower.audit._writer', AuditWriter(dict(get_audit_config(), MODE='sync')))
+
+
+class TowerInstanceExpandTests(TestCase):
+    """?expand= on the instance list must not issue queries per instance."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+
+    def create_instances(self, count):
+        for i in range(count):
+            instance = TowerInstance.objects.create(
+                name=f'tower-{TowerInstance.objects.count()}', url='https://tower.example.com', username='admin'
+            )
+            Credential.objects.create(
+                name=f'cred-{i}', type='ssh', username='svc', password='pw', tower_instance=instance
+            )
+            ExecutionEnvironment.objects.create(
+                name=f'ee-{i}', image='https://registry.example.com/ee', tower_instance=instance
+            )
+
+    def test_expanded_list_uses_constant_queries(self):
+        self.create_instances(2)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/instances/?expand=credentials,environments')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+        self.create_instances(8)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/instances/?expand=credentials,environments')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(response.data[0]['credentials'][0]['name'], 'cred-0')
+        self.assertEqual(response.data[0]['environments'][0]['name'], 'ee-0')
+        self.assertNotIn('password', response.data[0]['credentials'][0])
+
+    def test_expand_is_optional_and_selective(self):
+        self.create_instances(1)
+        response = self.client.get('/api/instances/')
+        self.assertNotIn('credentials', response.data[0])
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/instances/?expand=environments')
+        self.assertIn('environments', response.data[0])
+        self.assertNotIn('credentials', response.data[0])
+
+
+class BulkEndpointTests(TestCase):
+    """<prefix>/bulk/ validates the whole batch and writes it in one transaction."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        self.tower = TowerInstance.objects.create(name='tower', url='https://tower.example.com', username='admin')
+        audit = sync_audit_writer()
+        audit.start()
+        self.addCleanup(audit.stop)
+
+    def create_environments(self, *names):
+        return [
+            ExecutionEnvironment.objects.create(name=name, image='https://registry.example.com/ee', tower_instance=self.tower)
+            for name in names
+        ]
+
+    def test_bulk_create(self):
+        payload = [
+            {'name': f'ee-{i}', 'image': 'https://registry.example.com/ee', 'tower_instance': self.tower.pk}
+            for i in range(3)
+        ]
+        response = self.client.post('/api/environments/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ExecutionEnvironment.objects.count(), 3)
+        if connection.features.can_return_rows_from_bulk_insert:
+            # Audit entries need the primary keys set by bulk_create (PostgreSQL)
+            self.assertEqual(Auditlog.objects.filter(action='created', object_type='ExecutionEnvironment').count(), 3)
+
+    def test_bulk_create_rejects_whole_batch_on_partial_errors(self):
+        payload = [
+            {'name': 'ok', 'image': 'https://registry.example.com/ee', 'tower_instance': self.tower.pk},
+            {'name': 'bad', 'image': 'not a url', 'tower_instance': self.tower.pk},
+        ]
+        response = self.client.post('/api/environments/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('image', response.data['errors'][1])
+        self.assertFalse(ExecutionEnvironment.objects.exists())
+
+    def test_bulk_update(self):
+        first, second = self.create_environments('a', 'b')
+        response = self.client.patch('/api/environments/bulk/', [
+            {'id': first.pk, 'description': 'first'},
+            {'id': str(second.pk), 'name': 'renamed'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.description, second.name), ('first', 'renamed'))
+        self.assertEqual(Auditlog.objects.filter(action='updated').count(), 2)
+
+    def test_bulk_update_reports_per_item_errors(self):
+        (environment,) = self.create_environments('a')
+        response = self.client.patch('/api/environments/bulk/', [
+            {'id': environment.pk, 'name': 'renamed'},
+            {'id': environment.pk + 100, 'name': 'missing'},
+            {'id': environment.pk, 'image': 'not a url'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {'id': ['Not found.']})
+        self.assertIn('image', errors[2])
+        environment.refresh_from_db()
+        self.assertEqual(environment.name, 'a')
+
+    def test_bulk_update_rejects_non_integer_ids(self):
+        self.create_environments('a')
+        response = self.client.patch('/api/environments/bulk/', [{'id': 'abc', 'name': 'x'}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_update_rolls_back_when_a_write_fails(self):
+        first, second = self.create_environments('a', 'b')
+        real_bulk_update = QuerySet.bulk_update
+        calls = []
+
+        def failing_bulk_update(queryset, objs, fields, batch_size=None):
+            calls.append(fields)
+            if len(calls) > 1:
+                raise DatabaseError('connection lost')
+            return real_bulk_update(queryset, objs, fields, batch_size=batch_size)
+
+        # Different changed columns: two bulk_update calls, the second one fails
+        with mock.patch.object(QuerySet, 'bulk_update', failing_bulk_update):
+            with self.assertRaises(DatabaseError):
+                self.client.patch('/api/environments/bulk/', [
+                    {'id': first.pk, 'description': 'changed'},
+                    {'id': second.pk, 'name': 'changed'},
+                ], format='json')
+
+        self.assertEqual(len(calls), 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.description, second.name), ('', 'b'))
+        self.assertFalse(Auditlog.objects.filter(action='updated').exists())
+
+    def test_bulk_destroy(self):
+        first, second, third = self.create_environments('a', 'b', 'c')
+        response = self.client.delete(
+            '/api/environments/bulk/', {'ids': [first.pk, second.pk, third.pk + 100]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'deleted': 2, 'not_found': [third.pk + 100], 'duplicates': []})
+        self.assertEqual(list(ExecutionEnvironment.objects.values_list('name', flat=True)), ['c'])
+        self.assertEqual(Auditlog.objects.filter(action='deleted').count(), 2)
+
+    def test_bulk_destroy_reports_repeated_ids(self):
+        first, second = self.create_environments('a', 'b')
+        response = self.client.delete(
+            '/api/environments/bulk/', [str(first.pk), first.pk, second.pk, 999, 999], format='json'
+        )
+        self.assertEqual(response.data, {'deleted': 2, 'not_found': [999], 'duplicates': [first.pk, 999]})
+        self.assertEqual(Auditlog.objects.filter(action='deleted').count(), 2)
+
+    def test_failed_bulk_destroy_is_not_audited(self):
+        (environment,) = self.create_environments('a')
+        with mock.patch.object(QuerySet, 'delete', side_effect=DatabaseError('connection lost')), \
+                mock.patch('tower.views.invalidate_dashboard') as invalidate:
+            with self.assertRaises(DatabaseError):
+                self.client.delete('/api/environments/bulk/', [environment.pk], format='json')
+        self.assertTrue(ExecutionEnvironment.objects.filter(pk=environment.pk).exists())
+        self.assertFalse(Auditlog.objects.filter(action='deleted').exists())
+        invalidate.assert_not_called()
+
+    def test_bulk_destroy_rejects_non_integer_ids(self):
+        self.create_environments('a')
+        response = self.client.delete('/api/environments/bulk/', ['abc'], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ExecutionEnvironment.objects.count(), 1)
+
+
+class AuditWriterTests(TestCase):
+    """Batching, spooling while the database is down, and replay of the spool."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.spool = os.path.join(directory, 'audit_spool.jsonl')
+        self.writer = AuditWriter(dict(get_audit_config(), MODE='async', BATCH_SIZE=2, SPOOL_PATH=self.spool))
+        # Batches are written by flush() in the test thread, not by the background thread
+        patcher = mock.patch.object(self.writer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def entries(self, count, user='alice'):
+        return [
+            Auditlog(user=user, action='updated', object_type='TowerInstance', object_repr=f'tower-{i}',
+                     object_id=i, timestamp=now(), changes={})
+            for i in range(count)
+        ]
+
+    def database_down(self):
+        return mock.patch.object(Auditlog.objects, 'bulk_create', side_effect=OperationalError('database is down'))
+
+    def test_flush_writes_in_batches(self):
+        self.writer.submit(self.entries(5))
+        self.assertFalse(Auditlog.objects.exists())
+
+        self.writer.flush()
+        self.assertEqual(Auditlog.objects.count(), 5)
+        stats = self.writer.stats()
+        self.assertEqual((stats['written'], stats['flushes'], stats['queue_depth']), (5, 3, 0))
+
+    def test_spools_while_database_is_down_and_replays_after(self):
+        self.writer.submit(self.entries(2, user='spooled'))
+        with self.database_down(), self.assertLogs('tower.audit', 'WARNING') as logs:
+            self.writer.flush()
+        self.assertIn('spooling 2 entries', logs.output[0])
+        self.assertFalse(Auditlog.objects.exists())
+        with open(self.spool, encoding='utf-8') as spool:
+            self.assertEqual(len(spool.readlines()), 2)
+        self.assertEqual(self.writer.stats()['spooled'], 2)
+
+        self.writer.submit(self.entries(1, user='live'))
+        self.writer.flush()
+        self.assertEqual(Auditlog.objects.filter(user='spooled').count(), 2)
+        self.assertEqual(Auditlog.objects.filter(user='live').count(), 1)
+        self.assertFalse(os.path.exists(self.spool))
+        self.assertFalse(os.path.exists(self.spool + '.replaying'))
+        self.assertEqual(self.writer.stats()['replayed'], 2)
+
+    def test_failed_replay_keeps_entries_for_the_next_one(self):
+        with self.database_down():
+            self.writer.submit(self.entries(1, user='first'))
+            self.writer.flush()
+        self.writer.submit(self.entries(1, user='live'))
+        real_bulk_create = Auditlog.objects.bulk_create
+        calls = []
+
+        def fail_on_replay(batch, **kwargs):
+            calls.append(batch)
+            if len(calls) > 1:
+                raise OperationalError('database went away again')
+            return real_bulk_create(batch, **kwargs)
+
+        with mock.patch.object(Auditlog.objects, 'bulk_create', side_effect=fail_on_replay):
+            self.writer.flush()
+        self.assertTrue(os.path.exists(self.spool + '.replaying'))
+        self.assertFalse(Auditlog.objects.filter(user='first').exists())
+
+        # More entries spooled meanwhile are merged into the pending replay
+        with self.database_down():
+            self.writer.submit(self.entries(1, user='second'))
+            self.writer.flush()
+        self.writer.submit(self.entries(1, user='live'))
+        self.writer.flush()
+        self.assertEqual(Auditlog.objects.filter(user__in=['first', 'second']).count(), 2)
+        self.assertFalse(os.path.exists(self.spool + '.replaying'))
+
+    def test_unreadable_spool_lines_are_quarantined(self):
+        with self.database_down():
+            self.writer.submit(self.entries(1, user='spooled'))
+            self.writer.flush()
+        with open(self.spool, 'a', encoding='utf-8') as spool:
+            spool.write('{"truncated": \n')
+
+        self.writer.submit(self.entries(1, user='live'))
+        with self.assertLogs('tower.audit', 'ERROR') as logs:
+            self.writer.flush()
+        self.assertIn('Skipping unreadable audit spool entry', logs.output[0])
+        self.assertEqual(Auditlog.objects.filter(user='spooled').count(), 1)
+        with open(self.spool + '.rejected', encoding='utf-8') as rejected:
+            self.assertEqual(rejected.read(), '{"truncated": \n')
+        self.assertFalse(os.path.exists(self.spool + '.replaying'))
+
+
+    def test_queuing_errors_are_logged_not_raised(self):
+        instance = TowerInstance.objects.create(name='tower', url='https://tower.example.com')
+        with mock.patch('tower.utils.get_audit_writer', side_effect=RuntimeError('queue is gone')):
+            with self.assertLogs('tower.utils', 'ERROR') as logs:
+                log_action('alice', 'updated', instance)
+                log_actions('alice', 'deleted', [instance])
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('Error queuing audit log entries', logs.output[0])
+        self.assertIsNotNone(logs.records[0].exc_info)
+
+
+class DuplicateCredentialTypeTests(TestCase):
+    """Bulk duplication of credential types to the instances missing them, as a list or NDJSON stream."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        self.inventories = {'t0': [{'id': 1, 'name': 'Machine'}], 't1': []}
+
+        def route(request):
+            name = request['path'].split('/')[1]
+            if request['method'] == 'POST':
+                created = dict(request['body'], id=100 + len(self.inventories[name]))
+                self.inventories[name].append(created)
+                return 201, created, None
+            return 200, {'next': None, 'results': self.inventories[name]}, None
+
+        self.server, url = start_fake_tower(self, route)
+        for name in self.inventories:
+            TowerInstance.objects.create(name=name, url=f'{url}/{name}', username='admin', password='pw')
+        self.payload = {'credential_types': [{'name': 'Machine'}, {'name': 'Vault', 'description': 'secrets'}],
+                        'instances': ['t0', 't1', 'missing']}
+
+    def statuses(self, results):
+        return sorted((result['instance'], result['credential_type'], result['status']) for result in results)
+
+    def test_bulk_payload_creates_only_missing_types(self):
+        response = self.client.post('/api/duplicate-credential-type/', self.payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response.data), [
+            ('missing', 'Machine', 'instance_not_found'), ('missing', 'Vault', 'instance_not_found'),
+            ('t0', 'Machine', 'already_exists'), ('t0', 'Vault', 'duplicated'),
+            ('t1', 'Machine', 'duplicated'), ('t1', 'Vault', 'duplicated'),
+        ])
+        posted = [request['body'] for request in self.server.requests if request['method'] == 'POST']
+        self.assertIn({'name': 'Vault', 'description': 'secrets'}, posted)
+        self.assertEqual(len(posted), 3)
+        # Created types are recorded in the snapshot right away
+        self.assertEqual(sorted(RemoteCredentialType.objects.values_list('tower_instance__name', 'name')),
+                         [('t0', 'Vault'), ('t1', 'Machine'), ('t1', 'Vault')])
+
+    def test_streams_ndjson(self):
+        response = self.client.post('/api/duplicate-credential-type/?stream=1', self.payload, format='json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(self.statuses(map(json.loads, lines))[2:], [
+            ('t0', 'Machine', 'already_exists'), ('t0', 'Vault', 'duplicated'),
+            ('t1', 'Machine', 'duplicated'), ('t1', 'Vault', 'duplicated'),
+        ])
+
+    def test_rejects_payloads_without_instances(self):
+        response = self.client.post('/api/duplicate-credential-type/', {'credential_types': [{'name': 'Vault'}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class VerifyCredentialTypeValidationTests(TestCase):
+    """verify-credential-type/ rejects malformed payloads with 400 before contacting any Tower."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+
+    def verify(self, **overrides):
+        payload = dict(original_name='Vault', alternative_names=['Vault v2'], missing_in_instances=['tower-1'])
+        payload.update(overrides)
+        return self.client.post('/api/verify-credential-type/', payload, format='json')
+
+    def test_invalid_limit(self):
+        for limit in ('abc', 0, -3):
+            response = self.verify(limit=limit)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('limit', response.data['errors'])
+
+    def test_alternative_names_must_be_a_list(self):
+        response = self.verify(alternative_names='Vault v2')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('alternative_names', response.data['errors'])
+
+    def test_an_alternative_name_is_required(self):
+        response = self.verify(alternative_names=[], alternative_name='')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('alternative_names', response.data['errors'])
+
+    def test_valid_payload(self):
+        response = self.verify(alternative_name='Vault v3', limit='3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'instance': 'tower-1', 'status': 'instance_not_found'}])
+
+
+class CredentialCursorTests(TestCase):
+    """Merged credential listing cursors are checked before they are compared with sort keys."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+
+    def list_page(self, cursor, ordering='name'):
+        return self.client.get('/api/tower-credentials/', {'instances': 'all', 'ordering': ordering, 'cursor': cursor})
+
+    def test_cursor_of_a_page_is_accepted(self):
+        credentials = [{'id': i, 'name': f'cred-{i}', 'tower_instance': 'tower', 'tower_instance_id': 1} for i in range(3)]
+        page = paginate_credentials(credentials, '', ['name'], 2)
+        self.assertEqual(self.list_page(page['next_cursor']).status_code, 200)
+
+    def test_well_formed_keys_compare_with_any_rows(self):
+        credentials = [{'id': i, 'name': f'cred-{i}', 'tower_instance': 'tower', 'tower_instance_id': 1} for i in range(3)]
+        # A numeric name part sorts before text instead of raising TypeError
+        page = paginate_credentials(credentials, '', ['name'], 2, after=[[0, 5], [0, 1], [0, 1]])
+        self.assertEqual([item['id'] for item in page['results']], [0, 1])
+        self.assertEqual(self.list_page(encode_cursor(['name'], [[0, 5], [0, 1], [0, 1]])).status_code, 200)
+
+    def test_crafted_cursors_are_rejected(self):
+        for key in (
+            [[1, 'x'], [0, 1]],                      # wrong length
+            [[1, 'x'], [0, 1], [0, 1], [0, 1]],
+            [[1, 5], [0, 1], [0, 1]],                # rank does not match the value type
+            [[0, 'x'], [0, 1], [0, 1]],
+            [[2, 'x'], [0, 1], [0, 1]],
+            [[3, ''], [0, 1], [0, 1]],
+            [[True, 'x'], [0, 1], [0, 1]],
+            [['1', 'x'], [0, 1], [0, 1]],
+            [[1], [0, 1], [0, 1]],
+            ['x', [0, 1], [0, 1]],
+            {'k': 1},
+        ):
+            self.assertEqual(self.list_page(encode_cursor(['name'], key)).status_code, 400, key)
+
+    def test_garbage_and_mismatched_cursors_are_rejected(self):
+        self.assertEqual(self.list_page('not-base64!').status_code, 400)
+        self.assertEqual(self.list_page(encode_cursor(['-name'], [[1, 'x'], [0, 1], [0, 1]])).status_code, 400)
+
+
+class AuditlogListTests(TestCase):
+    """Server-side filters and cursor paging of the audit log list."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(TOWER_AUDIT=dict(settings.TOWER_AUDIT, ARCHIVE_DIR=directory))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        start = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        self.entries = [
+            Auditlog.objects.create(user=user, action=action, object_type='TowerInstance', object_id=i,
+                                    timestamp=start + timedelta(days=i))
+            for i, (user, action) in enumerate([
+                ('alice', 'created'), ('bob', 'updated'), ('alice', 'updated'), ('alice', 'deleted'), ('bob', 'created'),
+            ])
+        ]
+
+    def ids(self, params):
+        response = self.client.get('/api/audit-logs/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def pks(self, *positions):
+        return [self.entries[position].pk for position in positions]
+
+    def test_filters_by_user_action_and_date_range(self):
+        self.assertEqual(self.ids({'user': 'alice'}), self.pks(3, 2, 0))
+        self.assertEqual(self.ids({'action': 'updated'}), self.pks(2, 1))
+        self.assertEqual(self.ids({'user': 'alice', 'action': 'updated'}), self.pks(2))
+        self.assertEqual(
+            self.ids({'timestamp_after': '2024-06-02T00:00:00Z', 'timestamp_before': '2024-06-04T00:00:00Z'}),
+            self.pks(3, 2, 1)
+        )
+        self.assertEqual(self.ids({'timestamp_after': '2024-06-04T00:00:00Z', 'user': 'bob'}), self.pks(4))
+        self.assertEqual(self.client.get('/api/audit-logs/', {'action': 'archived'}).status_code, 400)
+
+    def test_walks_two_cursor_pages(self):
+        first = self.client.get('/api/audit-logs/', {'limit': 3})
+        self.assertEqual([row['id'] for row in first.data['results']], self.pks(4, 3, 2))
+        self.assertIsNone(first.data['previous'])
+
+        # Rows added after the first page do not shift the second one
+        Auditlog.objects.create(user='carol', action='created', object_type='TowerInstance', object_id=9)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([row['id'] for row in second.data['results']], self.pks(1, 0))
+        self.assertIsNone(second.data['next'])
+        self.assertIsNotNone(second.data['previous'])
+
+
+class AuditArchiveTests(TestCase):
+    """Archiving whole months and reading them back merged with the table."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(TOWER_AUDIT=dict(settings.TOWER_AUDIT, ARCHIVE_DIR=directory))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        start = datetime(2020, 3, 5, 12, 0, 0, 123456, tzinfo=timezone.utc)
+        self.march = [
+            Auditlog.objects.create(user='alice', action='updated', object_type='TowerInstance', object_id=i,
+                                    timestamp=start + timedelta(hours=i))
+            for i in range(3)
+        ]
+        self.april = Auditlog.objects.create(user='bob', action='created', object_type='TowerInstance', object_id=9,
+                                             timestamp=datetime(2020, 4, 2, tzinfo=timezone.utc))
+
+    def list_march(self):
+        response = self.client.get('/api/audit-logs/', {
+            'timestamp_after': '2020-03-01T00:00:00Z', 'timestamp_before': '2020-03-31T23:59:59Z',
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_archive_month_exports_and_deletes(self):
+        self.assertEqual(archive.months_before(datetime(2020, 4, 15, tzinfo=timezone.utc)), [(2020, 3)])
+        self.assertEqual(archive.archive_month(2020, 3), 3)
+
+        self.assertEqual(list(Auditlog.objects.values_list('pk', flat=True)), [self.april.pk])
+        (path,) = archive.archived_months()[(2020, 3)]
+        self.assertEqual(os.path.basename(path), 'auditlog-2020-03.jsonl.gz')
+        self.assertEqual(archive._archived_ids([path]), {entry.pk for entry in self.march})
+
+    def test_reads_merge_archived_and_hot_rows(self):
+        archive.archive_month(2020, 3)
+        late = Auditlog.objects.create(user='carol', action='deleted', object_type='TowerInstance', object_id=5,
+                                       timestamp=datetime(2020, 3, 5, 13, 30, tzinfo=timezone.utc))
+
+        data = self.list_march()
+        self.assertEqual(data['archived_months'], ['2020-03'])
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [self.march[2].pk, late.pk, self.march[1].pk, self.march[0].pk]
+        )
+
+        response = self.client.get('/api/audit-logs/', {'timestamp_after': '2020-03-01T00:00:00Z', 'user': 'alice'})
+        self.assertEqual([row['user'] for row in response.data['results']], ['alice'] * 3)
+
+    def test_rerun_after_an_interrupted_delete_does_not_duplicate_rows(self):
+        with mock.patch.object(archive, '_delete_rows', side_effect=OperationalError('killed')):
+            with self.assertRaises(OperationalError):
+                archive.archive_month(2020, 3)
+        self.assertEqual(Auditlog.objects.filter(user='alice').count(), 3)
+
+        # Rows in both the file and the table are listed once
+        self.assertEqual(len(self.list_march()['results']), 3)
+
+        late = Auditlog.objects.create(user='carol', action='deleted', object_type='TowerInstance', object_id=5,
+                                       timestamp=datetime(2020, 3, 20, tzinfo=timezone.utc))
+        self.assertEqual(archive.archive_month(2020, 3), 1)
+        files = archive.archived_months()[(2020, 3)]
+        self.assertEqual(len(files), 2)
+        self.assertEqual(archive._archived_ids(files[1:]), {late.pk})
+        self.assertFalse(Auditlog.objects.filter(timestamp__lt=datetime(2020, 4, 1, tzinfo=timezone.utc)).exists())
+        self.assertEqual(len(self.list_march()['results']), 4)
+
+    def walk(self, params):
+        ids, response = [], self.client.get('/api/audit-logs/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_skip_newer_archive_months(self):
+        archive.archive_month(2020, 3)
+        archive.archive_month(2020, 4)
+        params = {'timestamp_after': '2020-03-01T00:00:00Z', 'timestamp_before': '2020-04-30T00:00:00Z', 'limit': 2}
+        first = self.client.get('/api/audit-logs/', params)
+        self.assertEqual([row['id'] for row in first.data['results']], [self.april.pk, self.march[2].pk])
+
+        with mock.patch.object(archive, '_iter_file', wraps=archive._iter_file) as read:
+            second = self.client.get(first.data['next'])
+        self.assertEqual([row['id'] for row in second.data['results']], [self.march[1].pk, self.march[0].pk])
+        self.assertEqual([os.path.basename(call.args[0]) for call in read.call_args_list], ['auditlog-2020-03.jsonl.gz'])
+        self.assertIsNone(second.data['next'])
+
+        response = self.client.get('/api/audit-logs/', dict(params, cursor='nonsense'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_in_table_and_archive_are_not_repeated_across_pages(self):
+        with mock.patch.object(archive, '_delete_rows'):
+            archive.archive_month(2020, 3)
+        params = {'timestamp_after': '2020-03-01T00:00:00Z', 'timestamp_before': '2020-03-31T23:59:59Z'}
+        expected = [self.march[2].pk, self.march[1].pk, self.march[0].pk]
+        for limit in (1, 2, 3):
+            self.assertEqual(self.walk(dict(params, limit=limit)), expected)
+
+
+class AuditRollupTests(TestCase):
+    """Daily activity rollups kept by the audit pipeline, rebuilt from table and archive, and charted."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(TOWER_AUDIT=dict(settings.TOWER_AUDIT, ARCHIVE_DIR=directory))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        self.instances = [TowerInstance.objects.create(name=f't{i}', url=f'https://t{i}.example.com') for i in range(3)]
+
+    def rollups(self):
+        return sorted(AuditActivityRollup.objects.values_list('user', 'action', 'object_type', 'count'))
+
+    def test_written_entries_increment_the_rollups(self):
+        with sync_audit_writer():
+            log_actions('alice', 'created', self.instances)
+            log_action('bob', 'updated', self.instances[0])
+            log_action('alice', 'created', self.instances[1])
+        self.assertEqual(self.rollups(), [('alice', 'created', 'TowerInstance', 4),
+                                          ('bob', 'updated', 'TowerInstance', 1)])
+
+        today = localdate().isoformat()
+        response = self.client.get('/api/audit-logs/activity/', {'start': today, 'end': today, 'series': 'user'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['series'], {'alice': [4], 'bob': [1]})
+        self.assertEqual((response.data['total'], response.data['totals']['action']), (5, {'created': 4, 'updated': 1}))
+
+        response = self.client.get('/api/audit-logs/activity/', {'start': today, 'end': today, 'series': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_counts_the_table_and_the_archive(self):
+        noon = datetime(2020, 3, 5, 12, tzinfo=timezone.utc)
+        for user, day in (('alice', 0), ('alice', 0), ('bob', 1), ('bob', 40)):
+            Auditlog.objects.create(user=user, action='deleted', object_type='Credential', object_id=1,
+                                    timestamp=noon + timedelta(days=day))
+        archive.archive_month(2020, 3)
+        AuditActivityRollup.objects.create(day=noon.date(), user='stale', action='deleted', object_type='Credential',
+                                           count=9)
+
+        self.assertEqual(rollups.rebuild_rollups(noon.date(), noon.date() + timedelta(days=40)), 4)
+        self.assertEqual(sorted(AuditActivityRollup.objects.values_list('day', 'user', 'count')), [
+            (noon.date(), 'alice', 2),
+            (noon.date() + timedelta(days=1), 'bob', 1),
+            (noon.date() + timedelta(days=40), 'bob', 1),
+        ])
+        self.assertEqual(rollups.rebuild_rollups(noon.date(), noon.date(), include_archive=False), 0)
+
+
+class CircuitBreakerTests(TestCase):
+    """Breaker transitions, the instance status they drive and the health scoreboard."""
+
+    def setUp(self):
+        self.instance = TowerInstance.objects.create(name='tower', url='https://tower.example.com')
+        self.config = dict(breaker.DEFAULTS, MIN_CALLS=3, FAILURE_RATE=0.5, OPEN_TIMEOUT=10, JITTER=0)
+        self.breaker = breaker.CircuitBreaker(self.instance.pk, self.instance.name, self.config)
+        clock = mock.patch('tower.breaker.time.monotonic', return_value=1000.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+
+    def record_failures(self, times=1):
+        for _ in range(times):
+            self.breaker.allow()
+            breaker.record_result(self.breaker, False, 'timed out')
+
+    def status(self):
+        self.instance.refresh_from_db()
+        return self.instance.status
+
+    def test_closed_open_half_open_closed(self):
+        self.record_failures(2)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+        self.record_failures()
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.assertEqual(self.status(), 'unavailable')
+        with self.assertRaises(breaker.CircuitOpenError):
+            self.breaker.allow()
+
+        # One probe once OPEN_TIMEOUT has passed, the others keep failing fast
+        self.clock.return_value += 10
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, breaker.HALF_OPEN)
+        with self.assertRaises(breaker.CircuitOpenError):
+            self.breaker.allow()
+
+        breaker.record_result(self.breaker, True)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+        self.assertEqual(self.status(), 'active')
+        self.breaker.allow()
+
+    def test_failed_probe_reopens_with_a_longer_timeout(self):
+        self.record_failures(3)
+        self.clock.return_value += 10
+        self.record_failures()
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.assertEqual(self.breaker.retry_in(), 20)
+        self.assertEqual(self.breaker.snapshot()['totals'], {'calls': 4, 'failures': 4, 'rejected': 0})
+
+    def test_status_set_by_hand_is_left_alone(self):
+        TowerInstance.objects.filter(pk=self.instance.pk).update(status='maintenance')
+        self.record_failures(3)
+        self.assertEqual(self.status(), 'maintenance')
+
+    def test_status_changes_from_fan_out_workers_are_written_by_the_caller(self):
+        writers = []
+        update = breaker.update_instance_status
+
+        def record_thread(pk, state):
+            writers.append(threading.get_ident())
+            update(pk, state)
+
+        with mock.patch('tower.breaker.update_instance_status', side_effect=record_thread):
+            outcomes = list(iter_fan_out([self.instance], lambda instance: self.record_failures(3)))
+
+        self.assertIsNone(outcomes[0]['error'])
+        self.assertEqual(writers, [threading.get_ident()])
+        self.assertEqual(self.status(), 'unavailable')
+
+    def test_health_scoreboard(self):
+        other = TowerInstance.objects.create(name='other', url='https://other.example.com')
+        self.record_failures()
+        breaker.record_result(self.breaker, True)
+        with mock.patch.dict(breaker._breakers, {self.instance.pk: self.breaker}, clear=True):
+            healthy, unknown = breaker.health_scoreboard([self.instance, other])
+
+        self.assertEqual(
+            (healthy['state'], healthy['window_calls'], healthy['window_failures'], healthy['score']),
+            (breaker.CLOSED, 2, 1, 0.5)
+        )
+        self.assertEqual((unknown['name'], unknown['totals'], unknown['score']), ('other', None, 1.0))
+
+        self.record_failures()
+        with mock.patch.dict(breaker._breakers, {self.instance.pk: self.breaker}, clear=True):
+            (opened,) = breaker.health_scoreboard([self.instance])
+        self.assertEqual((opened['state'], opened['score']), (breaker.OPEN, 0.0))
+
+
+@override_settings(TOWER_DEADLINES=dict(deadlines.DEFAULTS, MIN_SAMPLES=5, P99_FACTOR=3, MIN_TIMEOUT=1))
+class DeadlineTests(TestCase):
+    """Request budgets, adaptive timeouts and fan-outs cut short by the deadline."""
+    key = ('TowerInstance', 'test')
+
+    def setUp(self):
+        self.addCleanup(deadlines.forget_latencies, self.key)
+
+    def test_call_timeout_is_capped_by_the_budget(self):
+        self.assertEqual(deadlines.call_timeout(self.key, 10), (10, False))
+        with deadlines.request_deadline(30):
+            self.assertEqual(deadlines.call_timeout(self.key, 10), (10, False))
+        with deadlines.request_deadline(2):
+            timeout, limited = deadlines.call_timeout(self.key, 10)
+        self.assertTrue(limited)
+        self.assertLessEqual(timeout, 2)
+
+    def test_spent_budget_raises_and_flags_the_response(self):
+        with deadlines.request_deadline(0) as budget:
+            with self.assertRaises(deadlines.DeadlineExceeded):
+                deadlines.call_timeout(self.key, 10)
+        self.assertTrue(budget.partial)
+
+    def test_adaptive_timeout_after_min_samples(self):
+        for seconds in (0.2, 0.3, 0.4, 0.5):
+            deadlines.record_latency(self.key, seconds)
+        self.assertEqual(deadlines.adaptive_timeout(self.key, 10), 10)
+
+        deadlines.record_latency(self.key, 0.8)
+        self.assertAlmostEqual(deadlines.adaptive_timeout(self.key, 10), 2.4)
+        self.assertEqual(deadlines.adaptive_timeout(self.key, 2), 2)
+
+        deadlines.forget_latencies(self.key)
+        for _ in range(5):
+            deadlines.record_latency(self.key, 0.01)
+        self.assertEqual(deadlines.adaptive_timeout(self.key, 10), 1)
+
+    def test_middleware_budget_and_partial_flag(self):
+        seen = {}
+
+        def view(request):
+            seen['remaining'] = deadlines.remaining()
+            if request.GET.get('partial'):
+                deadlines.mark_partial()
+            return HttpResponse()
+
+        middleware = deadlines.RequestDeadlineMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.get('/', HTTP_X_REQUEST_TIMEOUT='5'))
+        self.assertTrue(4 < seen['remaining'] <= 5)
+        self.assertFalse(response.has_header(deadlines.PARTIAL_HEADER))
+
+        middleware(factory.get('/', HTTP_X_REQUEST_TIMEOUT='3600'))
+        self.assertTrue(59 < seen['remaining'] <= 60)
+        for value in ('soon', '0', '-3', 'nan', 'inf'):
+            middleware(factory.get('/', HTTP_X_REQUEST_TIMEOUT=value))
+            self.assertTrue(24 < seen['remaining'] <= 25, value)
+
+        response = middleware(factory.get('/', {'partial': 1}))
+        self.assertEqual(response[deadlines.PARTIAL_HEADER], 'true')
+        self.assertIsNone(deadlines.remaining())
+
+    def test_fan_out_gives_up_on_instances_when_the_budget_runs_out(self):
+        fast = TowerInstance.objects.create(name='fast', url='https://fast.example.com')
+        slow = TowerInstance.objects.create(name='slow', url='https://slow.example.com')
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def call(instance):
+            if instance == slow:
+                release.wait(5)
+            return instance.name
+
+        with deadlines.request_deadline(0.3) as budget:
+            outcomes = {outcome['instance'].name: outcome for outcome in iter_fan_out([fast, slow], call)}
+
+        self.assertEqual((outcomes['fast']['result'], outcomes['fast']['error']), ('fast', None))
+        self.assertNotIn('timed_out', outcomes['fast'])
+        self.assertTrue(outcomes['slow']['timed_out'])
+        self.assertIsInstance(outcomes['slow']['error'], deadlines.DeadlineExceeded)
+        self.assertTrue(budget.partial)
+
+
+class FanOutTests(TestCase):
+    """Worker threads of iter_fan_out and the paginated Tower helpers they run."""
+
+    def setUp(self):
+        self.instance = TowerInstance.objects.create(name='tower', url='https://tower.example.com')
+
+    def test_fan_out_workers_close_their_database_connections(self):
+        closed_in, called_in = [], []
+
+        def query(instance):
+            called_in.append(threading.get_ident())
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                return cursor.fetchone()[0]
+
+        # (SQLite keeps in-memory test databases open on close(), so the call itself is checked)
+        with mock.patch.object(connections, 'close_all', side_effect=lambda: closed_in.append(threading.get_ident())):
+            outcomes = list(iter_fan_out([self.instance], query))
+        self.assertEqual(outcomes[0]['result'], 1)
+        self.assertEqual(closed_in, called_in)
+        self.assertNotEqual(closed_in, [threading.get_ident()])
+
+    def paged_tower(self, pages=3, delay=0):
+        """Fake Tower listing one credential type per page; pages after the first take ``delay`` seconds."""
+        def route(request):
+            page = int(request['query'].get('page', ['1'])[0])
+            if page > 1:
+                time.sleep(delay)
+            next_url = f"{request['path']}?page={page + 1}" if page < pages else None
+            return 200, {'next': next_url, 'results': [{'name': f'type-{page}'}]}, None
+
+        server, url = start_fake_tower(self, route)
+        TowerInstance.objects.filter(pk=self.instance.pk).update(url=url, username='admin', password='pw')
+        self.instance.refresh_from_db()
+        return server
+
+    def test_iter_tower_results_follows_next_links(self):
+        server = self.paged_tower()
+        for prefetch in (True, False):
+            server.requests.clear()
+            items = list(iter_tower_results(get_tower_session(self.instance), self.instance.url,
+                                            '/api/v2/credential_types/', page_size=1, prefetch=prefetch))
+            self.assertEqual([item['name'] for item in items], ['type-1', 'type-2', 'type-3'])
+            self.assertEqual([request['query'] for request in server.requests],
+                             [{'page_size': ['1']}, {'page': ['2']}, {'page': ['3']}])
+
+    def test_iter_tower_results_prefetches_the_next_page(self):
+        server = self.paged_tower()
+        items = iter_tower_results(get_tower_session(self.instance), self.instance.url, '/api/v2/credential_types/')
+        self.assertEqual(next(items)['name'], 'type-1')
+        # The second page is requested while the caller still holds the first item
+        for _ in range(100):
+            if len(server.requests) == 2:
+                break
+            time.sleep(0.02)
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual([item['name'] for item in items], ['type-2', 'type-3'])
+
+    def test_instance_timeout_covers_all_pages(self):
+        self.paged_tower(delay=0.3)
+        (outcome,) = fetch_credential_types_for_instances([self.instance], timeout=0.5)
+        # Each page alone is faster than the timeout, the three together are not
+        self.assertIsInstance(outcome['error'], requests.RequestException)
+        self.assertLess(outcome['elapsed_ms'], 900)
+
+        with self.assertRaises(requests.RequestException):
+            async_to_sync(async_tower.aget_tower_credential_types)(self.instance, timeout=0.5)
+
+        (outcome,) = fetch_credential_types_for_instances([self.instance], timeout=5)
+        self.assertEqual([item['name'] for item in outcome['result']], ['type-1', 'type-2', 'type-3'])
+
+    def test_iter_tower_results_raises_for_a_failed_page(self):
+        def route(request):
+            if request['query'].get('page') == ['2']:
+                return 500, {'detail': 'boom'}, None
+            # Absolute next links are followed as they are
+            return 200, {'next': f'{url}/api/v2/credentials/?page=2', 'results': [{'name': 'first'}]}, None
+
+        server, url = start_fake_tower(self, route)
+        items = iter_tower_results(utils.adhoc_session('admin', 'pw'), url, '/api/v2/credentials/', prefetch=False)
+        self.assertEqual(next(items)['name'], 'first')
+        with self.assertRaises(requests.HTTPError):
+            next(items)
+        self.assertEqual(server.requests[-1]['path'], '/api/v2/credentials/')
+
+    def test_iter_tower_results_stops_when_closed_early(self):
+        server = self.paged_tower(pages=5)
+        items = iter_tower_results(get_tower_session(self.instance), self.instance.url, '/api/v2/credential_types/',
+                                   prefetch=False)
+        self.assertEqual([next(items)['name'], next(items)['name']], ['type-1', 'type-2'])
+        items.close()
+        self.assertEqual(len(server.requests), 2)
+
+
+class SessionRegistryTests(TestCase):
+    """Pooled Tower sessions: reuse, rotation on changed credentials and unpooled ad-hoc sessions."""
+
+    def setUp(self):
+        self.release = threading.Event()
+
+        def route(request):
+            if request['path'] == '/slow/':
+                self.release.wait(5)
+            return 200, {'version': '4.0'}, None
+
+        self.server, self.url = start_fake_tower(self, route)
+        self.key = ('TowerInstance', 'registry-test')
+        self.addCleanup(utils._sessions.pop, self.key, None)
+
+    def test_sessions_are_reused_until_url_or_credentials_change(self):
+        before = session_pool_stats()
+        session = utils.get_session(self.key, self.url, 'admin', 'pw')
+        self.assertIs(utils.get_session(self.key, self.url, 'admin', 'pw'), session)
+
+        with mock.patch.object(session, 'close', wraps=session.close) as close:
+            rotated = utils.get_session(self.key, self.url, 'admin', 'new-pw')
+        self.assertIsNot(rotated, session)
+        self.assertEqual(rotated.auth, ('admin', 'new-pw'))
+        close.assert_called_once_with()
+        self.assertIsNot(utils.get_session(self.key, self.url + '/other', 'admin', 'new-pw'), rotated)
+
+        stats = session_pool_stats()
+        self.assertEqual((stats['hits'] - before['hits'], stats['misses'] - before['misses']), (1, 3))
+
+    def test_replaced_session_is_closed_after_its_in_flight_request(self):
+        session = utils.get_session(self.key, self.url, 'admin', 'pw')
+        responses = []
+        with mock.patch.object(session, 'close', wraps=session.close) as close:
+            worker = threading.Thread(target=lambda: responses.append(session.get(self.url + '/slow/', timeout=5)))
+            worker.start()
+            for _ in range(100):
+                if self.server.requests:
+                    break
+                time.sleep(0.02)
+
+            utils.get_session(self.key, self.url, 'admin', 'new-pw')
+            close.assert_not_called()
+
+            self.release.set()
+            worker.join(5)
+            self.assertEqual(responses[0].status_code, 200)
+            close.assert_called_once_with()
+
+    def test_adhoc_sessions_stay_out_of_the_registry(self):
+        before = session_pool_stats()
+        session = utils.adhoc_session('admin', 'pw')
+        with mock.patch.object(session, 'close', wraps=session.close) as close:
+            with session:
+                self.assertEqual(session.get(self.url + '/api/v2/ping/', timeout=5).status_code, 200)
+        close.assert_called_once_with()
+        self.assertEqual(session_pool_stats(), before)
+
+
+class CredentialTypeCacheTests(TestCase):
+    """Conditional revalidation of cached credential-type inventories (ETag / 304)."""
+
+    def setUp(self):
+        self.types = [{'name': 'Machine'}, {'name': 'Vault'}]
+
+        def route(request):
+            if request['headers'].get('If-None-Match') == '"v1"':
+                return 304, None, {'ETag': '"v1"'}
+            return 200, {'next': None, 'results': self.types}, {'ETag': '"v1"', 'Last-Modified': 'Wed, 01 May 2024'}
+
+        self.server, url = start_fake_tower(self, route)
+        self.instance = TowerInstance.objects.create(name='tower', url=url, username='admin', password='pw')
+        backend = mock.patch.object(cache, '_backend', cache.LocalMemoryBackend())
+        backend.start()
+        self.addCleanup(backend.stop)
+
+    def test_fetch_sends_validators_and_reports_not_modified(self):
+        response = utils.fetch_tower_credential_types(self.instance)
+        self.assertEqual((response['not_modified'], response['results']), (False, self.types))
+        self.assertEqual((response['etag'], response['last_modified']), ('"v1"', 'Wed, 01 May 2024'))
+
+        response = utils.fetch_tower_credential_types(self.instance, etag='"v1"', last_modified='Wed, 01 May 2024')
+        self.assertEqual(response, {'not_modified': True, 'results': None, 'etag': '"v1"',
+                                    'last_modified': 'Wed, 01 May 2024'})
+        headers = self.server.requests[-1]['headers']
+        self.assertEqual((headers['If-None-Match'], headers['If-Modified-Since']), ('"v1"', 'Wed, 01 May 2024'))
+
+    def test_not_modified_keeps_the_cached_copy(self):
+        original = self.types
+        self.assertEqual(cache.get_cached_credential_types(self.instance), original)
+        entry = cache.get_backend().get(cache._cache_key(self.instance))
+
+        self.types = [{'name': 'changed without a new ETag'}]
+        self.assertEqual(cache.get_cached_credential_types(self.instance, refresh=True), original)
+        revalidated = cache.get_backend().get(cache._cache_key(self.instance))
+        self.assertGreaterEqual(revalidated['fetched_at'], entry['fetched_at'])
+        self.assertEqual(len(self.server.requests), 2)
+
+        # A fresh copy is served without asking Tower
+        cache.get_cached_credential_types(self.instance)
+        self.assertEqual(len(self.server.requests), 2)
+
+
+class InventorySyncTests(TestCase):
+    """Incremental sync of remote inventories into the snapshot tables and their staleness."""
+
+    def setUp(self):
+        self.remote = {
+            '/api/v2/credential_types/': [
+                {'id': 1, 'name': 'Machine', 'kind': 'ssh', 'modified': '2024-05-01T00:00:00Z'},
+                {'id': 2, 'name': 'Vault', 'kind': 'vault', 'modified': '2024-05-01T00:00:00Z'},
+            ],
+            '/api/v2/credentials/': [
+                {'id': 10, 'name': 'deploy', 'credential_type': 1, 'modified': '2024-05-01T00:00:00Z'},
+            ],
+        }
+        def route(request):
+            if request['path'] not in self.remote:
+                return 500, {'detail': 'boom'}, None
+            return 200, {'next': None, 'results': self.remote[request['path']]}, None
+
+        self.server, url = start_fake_tower(self, route)
+        self.instance = TowerInstance.objects.create(name='tower', url=url, username='admin', password='pw')
+
+    def test_sync_rewrites_only_changed_rows(self):
+        (summary,) = sync.sync_instances([self.instance])
+        self.assertEqual(summary['credential_types'], {'created': 2, 'updated': 0, 'deleted': 0})
+        self.assertEqual(summary['credentials'], {'created': 1, 'updated': 0, 'deleted': 0})
+
+        self.remote['/api/v2/credential_types/'] = [
+            {'id': 1, 'name': 'Machine', 'kind': 'ssh', 'modified': '2024-05-01T00:00:00Z'},
+            {'id': 3, 'name': 'Cloud', 'kind': 'cloud', 'modified': '2024-05-02T00:00:00Z'},
+        ]
+        self.remote['/api/v2/credentials/'][0].update(name='deploy-key', modified='2024-05-03T00:00:00Z')
+        (summary,) = sync.sync_instances([self.instance])
+        self.assertEqual(summary['credential_types'], {'created': 1, 'updated': 0, 'deleted': 1})
+        self.assertEqual(summary['credentials'], {'created': 0, 'updated': 1, 'deleted': 0})
+        self.assertEqual(sorted(RemoteCredentialType.objects.values_list('name', flat=True)), ['Cloud', 'Machine'])
+        self.assertEqual(RemoteCredential.objects.get().name, 'deploy-key')
+
+        outcomes, unsynced = sync.snapshot_credential_type_outcomes([self.instance])
+        self.assertEqual(unsynced, [])
+        self.assertFalse(outcomes[self.instance.pk]['stale'])
+        self.assertEqual(len(outcomes[self.instance.pk]['result']), 2)
+
+    def test_failed_sync_keeps_the_previous_snapshot(self):
+        sync.sync_instances([self.instance])
+        synced_at = InventorySync.objects.get().last_synced
+
+        del self.remote['/api/v2/credentials/']
+        (summary,) = sync.sync_instances([self.instance])
+        self.assertEqual(summary['status'], 'error')
+        state = InventorySync.objects.get()
+        self.assertEqual((state.status, state.last_synced), ('error', synced_at))
+        self.assertEqual(RemoteCredentialType.objects.count(), 2)
+
+    def test_is_stale(self):
+        self.assertTrue(sync.is_stale(None))
+        self.assertFalse(sync.is_stale(now() - timedelta(seconds=10)))
+        self.assertTrue(sync.is_stale(now() - timedelta(seconds=901)))
+        with override_settings(TOWER_INVENTORY_STALE_AFTER=5):
+            self.assertTrue(sync.is_stale(now() - timedelta(seconds=10)))
+
+
+class DatabaseHealthCheckTests(TestCase):
+    """The request_started hook closes persistent connections that died while idle."""
+
+    def connection(self, usable=True, max_age=60, in_atomic_block=False):
+        return mock.Mock(connection=object(), in_atomic_block=in_atomic_block, settings_dict={'CONN_MAX_AGE': max_age},
+                         **{'is_usable.return_value': usable})
+
+    def test_only_dead_persistent_connections_are_closed(self):
+        dead, alive = self.connection(usable=False), self.connection()
+        per_request = self.connection(usable=False, max_age=0)
+        in_transaction = self.connection(usable=False, in_atomic_block=True)
+        with mock.patch.object(connections, 'all', return_value=[dead, alive, per_request, in_transaction]):
+            db.check_connections()
+        dead.close.assert_called_once_with()
+        for conn in (alive, per_request, in_transaction):
+            conn.close.assert_not_called()
+        per_request.is_usable.assert_not_called()
+
+
+class BenchmarkInstanceListTests(TransactionTestCase):
+    """benchmark_instance_list compares CONN_MAX_AGE values and restores the original one."""
+
+    def test_reports_each_setting(self):
+        get_user_model().objects.create_user('bench', password='secret', role='admin')
+        TowerInstance.objects.create(name='tower', url='https://tower.example.com')
+        original = connection.settings_dict.get('CONN_MAX_AGE', 0)
+        out = StringIO()
+
+        call_command('benchmark_instance_list', username='bench', requests=3, warmup=1, conn_max_age='0,30', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '3 x GET /api/instances/ against local')
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['CONN_MAX_AGE=0', 'CONN_MAX_AGE=30'])
+        self.assertIn('req/s', lines[1])
+        self.assertEqual(connection.settings_dict.get('CONN_MAX_AGE', 0), original)
+
+    def test_rejects_bad_arguments(self):
+        with self.assertRaisesMessage(CommandError, 'User nobody does not exist.'):
+            call_command('benchmark_instance_list', username='nobody', stdout=StringIO())
+        get_user_model().objects.create_user('bench', password='secret')
+        with self.assertRaises(CommandError):
+            call_command('benchmark_instance_list', username='bench', conn_max_age='0,soon', stdout=StringIO())
+
+
+class SecretCacheTests(TestCase):
+    """Passwords are decrypted once per row version and each read is counted once."""
+
+    def setUp(self):
+        get_secret_cache().clear()
+        self.addCleanup(get_secret_cache().clear)
+        TowerInstance.objects.create(name='tower', url='https://tower.example.com', password='pw')
+
+    def lookups(self):
+        with SECRET_LOOKUPS._lock:
+            return dict(SECRET_LOOKUPS._values)
+
+    def test_priming_is_not_counted_as_a_lookup(self):
+        instance = TowerInstance.objects.defer('password').get()
+        before = self.lookups()
+        with self.assertNumQueries(1):
+            prime_secrets([instance])
+        self.assertEqual(self.lookups(), before)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_instance_password(instance), 'pw')
+        after = self.lookups()
+        self.assertEqual(after.get(('hit',), 0) - before.get(('hit',), 0), 1)
+        self.assertEqual(after.get(('miss',), 0), before.get(('miss',), 0))
+
+    def test_a_new_row_version_is_a_miss(self):
+        instance = TowerInstance.objects.defer('password').get()
+        prime_secrets([instance])
+        instance.password = 'changed'
+        instance.save()
+
+        instance = TowerInstance.objects.defer('password').get()
+        self.assertEqual(get_instance_password(instance), 'changed')
+
+
+class MetricsEndpointTests(TestCase):
+    """/metrics is only served to scrapers that send the configured token."""
+
+    def get(self, token=None, **headers):
+        with override_settings(TOWER_METRICS=dict(settings.TOWER_METRICS, TOKEN=token)):
+            return self.client.get('/metrics', **headers)
+
+    def test_refused_when_no_token_is_configured(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_requires_the_bearer_token(self):
+        self.assertEqual(self.get('s3cret').status_code, 401)
+        self.assertEqual(self.get('s3cret', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+        response = self.get('s3cret', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE tower_http_requests_total counter', response.content)
+
+    def test_renders_status_labels_of_failed_and_answered_calls(self):
+        record_remote('tower', 'GET', 'error', 0.5)
+        record_remote('tower', 'GET', 200, 0.1)
+        response = self.get('s3cret', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertIn(b'tower_remote_requests_total{instance="tower",method="GET",status="200"}', response.content)
+        self.assertIn(b'tower_remote_requests_total{instance="tower",method="GET",status="error"}', response.content)
+
+
+class SamplingProfilerTests(TestCase):
+    """Only requests past their threshold (or picked for sampling) are walked by the sampler."""
+
+    def trace(self, sampled, threshold_ms):
+        config = dict(profiling.get_profiler_config(), INTERVAL_MS=1, THRESHOLD_MS=threshold_ms)
+        trace = profiling.RequestTrace(RequestFactory().get('/'), config, sampled=sampled)
+        profiling._register(trace)
+        self.addCleanup(profiling._unregister, trace)
+        return trace
+
+    def wait_for_samples(self, trace, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not trace.samples and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_requests_are_sampled_once_due(self):
+        fast = self.trace(sampled=False, threshold_ms=60000)
+        sampled = self.trace(sampled=True, threshold_ms=60000)
+        slow = self.trace(sampled=False, threshold_ms=50)
+
+        self.wait_for_samples(sampled)
+        self.wait_for_samples(slow)
+        self.assertGreater(sampled.samples, 0)
+        self.assertGreater(slow.samples, 0)
+        self.assertEqual(fast.samples, 0)
+        self.assertIn('request', {role for role, _ in sampled.stacks})
+
+    def test_sample_one_in_setting(self):
+        for value, expected in ((0, 0), (None, 0), (-5, 0), (3, 3), ('10', 10)):
+            with override_settings(TOWER_PROFILER=dict(settings.TOWER_PROFILER, SAMPLE_ONE_IN=value)):
+                self.assertEqual(profiling.get_profiler_config()['SAMPLE_ONE_IN'], expected)
+
+        with override_settings(TOWER_PROFILER=dict(settings.TOWER_PROFILER, SAMPLE_ONE_IN='often')):
+            with self.assertRaises(ImproperlyConfigured):
+                profiling.get_profiler_config()
+
+
+class DashboardCacheTests(TestCase):
+    """Dashboard counts live in the shared cache and API writes drop them for every worker."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        # Another worker's handle on the same cache
+        self.other_worker = caches.create_connection(dashboard.get_dashboard_config()['ALIAS'])
+        self.other_worker.clear()
+
+    def test_writes_invalidate_the_shared_counts(self):
+        self.assertEqual(self.client.get('/api/dashboard-counts/').data['instances']['total'], 0)
+        self.assertIsNotNone(self.other_worker.get(dashboard.COUNTS_KEY))
+
+        with sync_audit_writer():
+            response = self.client.post('/api/instances/', {'name': 'tower', 'url': 'https://tower.example.com'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self.other_worker.get(dashboard.COUNTS_KEY))
+        self.assertEqual(self.client.get('/api/dashboard-counts/').data['instances']['total'], 1)
+
+    def test_local_writes_keep_the_job_charts(self):
+        chart_key = dashboard._job_chart_key('week')
+        self.other_worker.set(chart_key, {'cached': True})
+        tower = TowerInstance.objects.create(name='tower', url='https://tower.example.com')
+
+        with sync_audit_writer():
+            response = self.client.post('/api/environments/', {
+                'name': 'ee', 'image': 'https://registry.example.com/ee', 'tower_instance': tower.pk,
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.other_worker.get(chart_key), {'cached': True})
+
+        with sync_audit_writer():
+            self.client.patch(f'/api/instances/{tower.pk}/', {'url': 'https://moved.example.com'})
+        self.assertIsNone(self.other_worker.get(chart_key))
+
+    def test_cache_errors_do_not_fail_requests(self):
+        broken = mock.Mock(**{f'{method}.side_effect': DatabaseError('no such table: tower_cache')
+                              for method in ('get', 'set', 'delete', 'delete_many')})
+        with mock.patch('tower.dashboard._cache', return_value=broken), sync_audit_writer():
+            with self.assertLogs('tower.dashboard', 'ERROR'):
+                response = self.client.post('/api/instances/', {'name': 'tower', 'url': 'https://tower.example.com'})
+            self.assertEqual(response.status_code, 201)
+            with self.assertLogs('tower.dashboard', 'ERROR'):
+                self.assertEqual(self.client.get('/api/dashboard-counts/').data['instances']['total'], 1)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """Access tokens carry username/role, so requests are authenticated without loading the user."""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user('admin', password='secret', role='admin')
+        self.viewer = get_user_model().objects.create_user('viewer', password='secret', role='viewer')
+        authentication._user_states.clear()
+        self.addCleanup(authentication._user_states.clear)
+
+    def obtain(self, username):
+        response = self.client.post('/api/token/', {'username': username, 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['access']
+
+    def get(self, path, token):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_issued_token_carries_username_and_role(self):
+        token = AccessToken(self.obtain('admin'))
+        self.assertEqual((token['username'], token['role'], token['user_id']), ('admin', 'admin', self.admin.pk))
+
+    def test_user_info_is_served_from_claims(self):
+        token = self.obtain('viewer')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get('/api/user-info/', token).data, {'username': 'viewer', 'role': 'viewer'})
+        # The user state is cached: no query at all
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/user-info/', token).status_code, 200)
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        token = AccessToken.for_user(self.viewer)
+        self.assertNotIn('role', token)
+        with self.assertNumQueries(1):
+            response = self.get('/api/user-info/', str(token))
+        self.assertEqual(response.data, {'username': 'viewer', 'role': 'viewer'})
+
+    @override_settings(TOWER_JWT_CLAIMS={'REVOCATION_CHECK': False})
+    def test_is_admin_uses_the_claim_role(self):
+        self.assertEqual(self.get('/api/users/', self.obtain('admin')).status_code, 200)
+        self.assertEqual(self.get('/api/users/', self.obtain('viewer')).status_code, 403)
+
+    def test_deactivated_user_keeps_access_until_the_state_expires(self):
+        token = self.obtain('viewer')
+        self.assertEqual(self.get('/api/user-info/', token).status_code, 200)
+        get_user_model().objects.filter(pk=self.viewer.pk).update(is_active=False)
+        self.assertEqual(self.get('/api/user-info/', token).status_code, 200)
+
+        ttl = authentication.get_jwt_claims_config()['REVOCATION_CACHE_TTL']
+        with mock.patch('tower.authentication.time.monotonic', return_value=time.monotonic() + ttl + 1):
+            self.assertEqual(self.get('/api/user-info/', token).status_code, 401)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ChangeTrackingUpdateTests(TestCase):
+    """Updates write only the changed columns and never decrypt the password to diff it."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin', password='secret', role='admin'))
+        self.tower = TowerInstance.objects.create(
+            name='tower', url='https://tower.example.com', username='admin', password='old', region='eu'
+        )
+        self.path = f'/api/instances/{self.tower.pk}/'
+        audit = sync_audit_writer()
+        self.writer = audit.start()
+        self.addCleanup(audit.stop)
+        # Audit rows are asserted on separately: keep them out of the query counts
+        submit = mock.patch.object(self.writer, 'submit')
+        self.submit = submit.start()
+        self.addCleanup(submit.stop)
+
+    def updates(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+
+    def audited_changes(self):
+        (entry,) = self.submit.call_args[0][0]
+        return entry.changes
+
+    def test_narrow_patch_updates_only_the_changed_column(self):
+        with CaptureQueriesContext(connection) as queries, self.assertNumQueries(2):
+            response = self.client.patch(self.path, {'name': 'renamed'})
+        self.assertEqual(response.status_code, 200)
+        (update,) = self.updates(queries.captured_queries)
+        self.assertIn('"name"', update)
+        self.assertNotIn('"password"', update)
+        self.assertNotIn('"url"', update)
+        self.assertEqual(self.audited_changes(), {'name': {'from': 'tower', 'to': 'renamed'}})
+
+    def test_unchanged_put_issues_no_update(self):
+        payload = {'name': 'tower', 'url': 'https://tower.example.com', 'username': 'admin', 'region': 'eu'}
+        with self.assertNumQueries(1):
+            response = self.client.put(self.path, payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.audited_changes(), {})
+
+    def test_password_change_is_encrypted_and_masked(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.path, {'password': 'new'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('password', response.data)
+        (update,) = self.updates(queries.captured_queries)
+        self.assertIn('"password"', update)
+
+        self.tower.refresh_from_db()
+        self.assertEqual(self.tower.password, 'new')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT password FROM tower_towerinstance WHERE id = %s', [self.tower.pk])
+            stored = cursor.fetchone()[0]
+        self.assertNotEqual(stored, 'new')
+        self.assertEqual(self.audited_changes(), {'password': {'from': '********', 'to': '********'}})
+
+
+
+@async_views.async_api_view(['GET'], permission_classes=(IsAdmin,))
+async def admin_only(request):
+    return JsonResponse({'user': request.user.username})
+
+
+# Async URLconf, as tower.urls builds it with TOWER_ASYNC_VIEWS
+urlpatterns = [
+    path('api/credential-type-status/', async_views.credential_type_status),
+    path('api/test-connection/', async_views.test_connection),
+    path('api/admin-only/', admin_only),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, TOWER_HTTP_BACKOFF_FACTOR=0, TOWER_HTTP_RETRIES=2)
+class AsyncViewTests(TestCase):
+    """The ASGI views authenticate, authorize and answer like the DRF views."""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user('admin', password='secret', role='admin')
+        self.viewer = get_user_model().objects.create_user('viewer', password='secret', role='viewer')
+        authentication._user_states.clear()
+        self.addCleanup(authentication._user_states.clear)
+        self.async_client = AsyncClient()
+        self.failures = 0
+
+        def route(request):
+            if request['path'] == '/api/v2/ping/':
+                return 200, {'version': '4.0'}, None
+            if self.failures:
+                self.failures -= 1
+                return 503, {'detail': 'busy'}, None
+            return 200, {'next': None, 'results': [{'name': 'Machine'}, {'name': 'Vault'}]}, None
+
+        self.server, self.url = start_fake_tower(self, route)
+        TowerInstance.objects.create(name='t0', url=self.url, username='admin', password='pw')
+        TowerInstance.objects.create(name='t1', url=self.url + '/', username='admin', password='pw')
+
+    def auth(self, user):
+        return {'AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    async def test_rejects_missing_and_invalid_tokens(self):
+        response = await self.async_client.get('/api/credential-type-status/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/credential-type-status/', AUTHORIZATION='Bearer nonsense')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.server.requests, [])
+
+    async def test_permission_classes_are_checked(self):
+        response = await self.async_client.get('/api/admin-only/', **self.auth(self.viewer))
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get('/api/admin-only/', **self.auth(self.admin))
+        self.assertEqual((response.status_code, response.json()), (200, {'user': 'admin'}))
+
+    async def test_method_and_body_are_validated(self):
+        response = await self.async_client.get('/api/test-connection/', **self.auth(self.viewer))
+        self.assertEqual(response.status_code, 405)
+        response = await self.async_client.post(
+            '/api/test-connection/', 'not json', content_type='application/json', **self.auth(self.viewer)
+        )
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post('/api/test-connection/', {
+            'url': self.url, 'username': 'admin', 'password': 'pw',
+        }, content_type='application/json', **self.auth(self.viewer))
+        self.assertEqual((response.status_code, response.json()), (200, {'message': 'Connection successful!'}))
+
+    async def test_idempotent_calls_are_retried_on_5xx(self):
+        self.failures = 2
+        response = await self.async_client.get(
+            '/api/credential-type-status/', {'source': 'live', 'refresh': '1'}, **self.auth(self.viewer)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({entry['status'] for entry in response.json()['instances']}, {'ok'})
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_results_match_the_sync_view(self):
+        params = {'source': 'live', 'refresh': '1'}
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        with override_settings(ROOT_URLCONF='tower_admin.urls'):
+            expected = client.get('/api/credential-type-status/', params).json()
+        response = async_to_sync(self.async_client.get)('/api/credential-type-status/', params, **self.auth(self.viewer))
+        actual = response.json()
+
+        self.assertEqual(actual['results'], expected['results'])
+        strip = lambda entries: [{k: v for k, v in e.items() if k != 'elapsed_ms'} for e in entries]  # noqa: E731
+        self.assertEqual(strip(actual['instances']), strip(expected['instances']))
+        self.assertEqual(actual['results'][0]['status'], 'Green')
+
+
+class ConnectivityProbeTests(TestCase):
+    """Probe timings, their percentiles and trends, and retention."""
+
+    def setUp(self):
+        self.eu = TowerInstance.objects.create(name='eu-1', url='https://eu.example.com', region='eu')
+        self.us = TowerInstance.objects.create(name='us-1', url='https://us.example.com', region='us')
+
+    def probe(self, instance, timestamp, ok=True, total_ms=None, tls_ms=None):
+        return ConnectivityProbe.objects.create(
+            tower_instance=instance, timestamp=timestamp, ok=ok, total_ms=total_ms, tls_ms=tls_ms
+        )
+
+    def test_latency_percentiles(self):
+        self.assertEqual(probes.latency_percentiles([]), {'count': 0, 'p50': None, 'p90': None, 'p99': None,
+                                                           'max': None})
+        stats = probes.latency_percentiles([None] + list(range(100, 0, -1)))
+        self.assertEqual(stats, {'count': 100, 'p50': 50, 'p90': 90, 'p99': 99, 'max': 100})
+        self.assertEqual(probes.latency_percentiles([7.5])['p99'], 7.5)
+
+    def test_probe_trends_group_successful_probes(self):
+        hour = datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+        self.probe(self.eu, hour + timedelta(minutes=5), total_ms=100, tls_ms=30)
+        self.probe(self.eu, hour + timedelta(minutes=35), total_ms=300, tls_ms=50)
+        self.probe(self.eu, hour + timedelta(minutes=40), ok=False)
+        self.probe(self.us, hour + timedelta(hours=1), total_ms=200, tls_ms=40)
+        self.probe(self.us, hour - timedelta(days=1), total_ms=999)
+
+        trends = probes.probe_trends(hour, bucket='hour', group='region')
+        self.assertEqual([(entry['bucket'], entry['region']) for entry in trends],
+                         [(hour, 'eu'), (hour + timedelta(hours=1), 'us')])
+        eu = trends[0]
+        self.assertEqual((eu['probes'], eu['failures']), (3, 1))
+        self.assertEqual((eu['latency']['count'], eu['latency']['p50'], eu['latency']['max']), (2, 100, 300))
+        self.assertEqual(eu['tls_handshake']['max'], 50)
+
+        daily = probes.probe_trends(hour, bucket='day', group='instance')
+        self.assertEqual([(entry['bucket'], entry['instance'], entry['probes']) for entry in daily],
+                         [(hour.replace(hour=0), 'eu-1', 3), (hour.replace(hour=0), 'us-1', 1)])
+
+    def test_prune_probes(self):
+        old = self.probe(self.eu, now() - timedelta(days=31), total_ms=1)
+        recent = self.probe(self.eu, now() - timedelta(days=29), total_ms=1)
+        self.assertEqual(probes.prune_probes(), 1)
+        self.assertEqual(list(ConnectivityProbe.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertFalse(ConnectivityProbe.objects.filter(pk=old.pk).exists())
+        self.assertEqual(probes.prune_probes(retention_days=1), 1)
+
+    def test_probe_url_times_each_phase(self):
+        server, url = start_fake_tower(self, lambda request: (200, {'version': '4.0'}, None))
+        result = probes.probe_url(url, timeout=5)
+        self.assertTrue(result['ok'], result['error'])
+        self.assertEqual(result['http_status'], 200)
+        self.assertIsNone(result['tls_ms'])
+        self.assertIsNotNone(result['ttfb_ms'])
+        self.assertEqual(server.requests[0]['path'], '/api/v2/ping/')
+
+    def test_hanging_name_resolution_is_bounded_by_the_timeout(self):
+        resolved = threading.Event()
+        self.addCleanup(resolved.set)
+
+        def hanging_getaddrinfo(*args, **kwargs):
+            resolved.wait(5)
+            raise OSError('resolver gave up')
+
+        with mock.patch('tower.probes.socket.getaddrinfo', hanging_getaddrinfo):
+            started = time.monotonic()
+            result = probes.probe_url('https://hanging.example.com', timeout=0.2)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['error'], 'name resolution timed out')
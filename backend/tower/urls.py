@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -5,6 +6,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from . import async_views, views
 from .views import (
     TowerInstanceViewSet,
     CredentialViewSet,
@@ -13,15 +15,22 @@ from .views import (
     TowerCredentialProxy,
     UserViewSet,
     user_info,
-    test_connection,
-    credential_type_status,
-    duplicate_missing_credential_type,
-    verify_credential_type_by_name
+    tower_session_stats,
+    tower_health,
+    connectivity_probes,
+    audit_stats,
+    dashboard_counts,
+    job_chart_data,
 )
 
+# Tower-facing endpoints run as async views under ASGI (see tower.async_views)
+ASYNC_VIEWS = getattr(settings, 'TOWER_ASYNC_VIEWS', False)
+tower_views = async_views if ASYNC_VIEWS else views
+
 router = DefaultRouter()
 
-router.register(r'tower-credentials', TowerCredentialProxy, basename='tower-credentials')
+if not ASYNC_VIEWS:
+    router.register(r'tower-credentials', TowerCredentialProxy, basename='tower-credentials')
 router.register(r'tower', TowerInstanceViewSet, basename='tower')
 router.register(r'instances', TowerInstanceViewSet, basename='instance')
 router.register(r'credentials', CredentialViewSet)
@@ -33,9 +42,18 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('user-info/', user_info),
-    path('test-connection/', test_connection),
-    path('credential-type-status/', credential_type_status),
-    path('duplicate-credential-type/', duplicate_missing_credential_type),
-    path('verify-credential-type/', verify_credential_type_by_name),
+    path('test-connection/', tower_views.test_connection),
+    path('tower-session-stats/', tower_session_stats),
+    path('tower-health/', tower_health),
+    path('connectivity-probes/', connectivity_probes),
+    path('audit-stats/', audit_stats),
+    path('dashboard-counts/', dashboard_counts),
+    path('job-chart-data/', job_chart_data),
+    path('credential-type-status/', tower_views.credential_type_status),
+    path('duplicate-credential-type/', tower_views.duplicate_missing_credential_type),
+    path('verify-credential-type/', tower_views.verify_credential_type_by_name),
     path('', include(router.urls)),
 ]
+
+if ASYNC_VIEWS:
+    urlpatterns.insert(0, path('tower-credentials/', async_views.tower_credentials))
@@ -2,14 +2,53 @@
 Utility functions for the Tower app.
 Provides audit logging and Tower API interaction helpers.
 """
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from urllib.parse import urljoin
+
 import requests
+from django.conf import settings
+from django.db import connections
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.utils.timezone import now
-from .models import Auditlog
+from .audit import get_audit_writer
+from .breaker import flush_status_updates, get_breaker, is_failure_status, record_result, worker_thread
+from .deadlines import (
+    call_timeout, deadline_outcome, latency_key, mark_partial, record_latency, remaining, time_left
+)
+from .metrics import instrumented, record_remote
+from .models import Auditlog, TowerInstance
+from .profiling import profiled_thread, record_tower_call
+from .name_index import CredentialTypeNameIndex
+from .secret_cache import get_instance_password, prime_secrets
+
+logger = logging.getLogger(__name__)
+
 
+def _audit_entry(user, action, obj, changes=None):
+    """Build an unsaved Auditlog row for a model change."""
+    return Auditlog(
+        user=user,
+        action=action,
+        object_type=obj.__class__.__name__,
+        object_repr=str(obj)[:255],
+        object_id=obj.pk,
+        timestamp=now(),
+        changes=changes or {}
+    )
 
+
+@instrumented('log_action')
 def log_action(user, action, obj, changes=None):
     """
-    Create an audit log entry for model changes.
+    Queue an audit log entry for model changes.
+    
+    Entries are written in batches by the audit pipeline (see tower.audit).
     
     Args:
         user (str): Username who performed the action
@@ -18,52 +57,410 @@ def log_action(user, action, obj, changes=None):
         changes (dict): Dictionary of field changes (optional)
     """
     try:
-        Auditlog.objects.create(
-            user=user,
-            action=action,
-            object_type=obj.__class__.__name__,
-            object_repr=str(obj),
-            object_id=obj.pk,
-            timestamp=now(),
-            changes=changes or {}
-        )
-    except Exception as e:
+        get_audit_writer().submit([_audit_entry(user, action, obj, changes)])
+    except Exception:
         # Log the error but don't break the main operation
-        print(f"Error creating audit log: {e}")
+        logger.exception("Error queuing audit log entries")
 
 
-def get_tower_credential_types(tower_instance):
+@instrumented('log_actions')
+def log_actions(user, action, objs, changes=None):
     """
-    Fetch credential types from a Tower instance.
+    Queue one audit log entry per changed object in a single batch.
+    
+    Args:
+        user (str): Username who performed the action
+        action (str): Action performed ('created', 'updated', 'deleted')
+        objs (list): Model instances that were changed
+        changes (dict or list): Field changes applied to all objects, or one
+            dictionary per object (optional)
+    """
+    if not isinstance(changes, list):
+        changes = [changes] * len(objs)
+    try:
+        get_audit_writer().submit([
+            _audit_entry(user, action, obj, obj_changes) for obj, obj_changes in zip(objs, changes)
+        ])
+    except Exception:
+        logger.exception("Error queuing audit log entries")
+
+
+# Process-wide registry of pooled HTTP sessions, keyed per Tower target.
+# Each entry is (fingerprint, session); the fingerprint changes when the
+# URL or credentials change so a stale session is never reused. Replaced
+# sessions are retired: other threads may still be sending requests on them.
+_sessions = {}
+_sessions_lock = threading.Lock()
+_session_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+class TowerSession(requests.Session):
+    """
+    Session that bounds every request by the request deadline (see tower.deadlines),
+    reports it to the circuit breaker of its Tower instance, if any, and records
+    it in the metrics under ``metrics_label`` (see tower.metrics).
+    """
+    breaker = None
+    latency_key = None
+    metrics_label = 'unregistered'
+
+    def __init__(self):
+        super().__init__()
+        self._in_flight = 0
+        self._retired = False
+        self._usage_lock = threading.Lock()
+
+    def retire(self):
+        """Close the session now if it is idle, otherwise once its last in-flight request returns."""
+        with self._usage_lock:
+            self._retired = True
+            idle = not self._in_flight
+        if idle:
+            self.close()
+
+    def request(self, method, url, *args, **kwargs):
+        with self._usage_lock:
+            self._in_flight += 1
+        try:
+            return self._request(method, url, *args, **kwargs)
+        finally:
+            with self._usage_lock:
+                self._in_flight -= 1
+                close = self._retired and not self._in_flight
+            if close:
+                self.close()
+
+    def _request(self, method, url, *args, **kwargs):
+        kwargs['timeout'], budget_bound = call_timeout(self.latency_key, kwargs.get('timeout'))
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.allow()
+
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            record_remote(self.metrics_label, method, 'error', elapsed)
+            record_tower_call(self.metrics_label, method, url, 'error', elapsed)
+            if budget_bound and isinstance(e, requests.Timeout):
+                # Cut short by the request deadline: says nothing about the instance
+                mark_partial()
+                if breaker is not None:
+                    breaker.release()
+            elif breaker is not None:
+                record_result(breaker, False, e)
+            raise
+
+        elapsed = time.monotonic() - started
+        record_remote(self.metrics_label, method, response.status_code, elapsed)
+        record_tower_call(self.metrics_label, method, url, response.status_code, elapsed)
+        failed = is_failure_status(response.status_code)
+        if not failed:
+            record_latency(self.latency_key, elapsed)
+        if breaker is not None:
+            record_result(breaker, not failed, f"HTTP {response.status_code}" if failed else None)
+        return response
+
+
+def _build_session(username, password):
+    """Create a keep-alive session with tuned pool sizes and retry policy."""
+    retries = getattr(settings, 'TOWER_HTTP_RETRIES', 3)
+    retry = Retry(
+        total=retries,
+        connect=0,
+        read=0,
+        status=retries,
+        backoff_factor=getattr(settings, 'TOWER_HTTP_BACKOFF_FACTOR', 0.5),
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, 'TOWER_HTTP_POOL_CONNECTIONS', 4),
+        pool_maxsize=getattr(settings, 'TOWER_HTTP_POOL_MAXSIZE', 16),
+        max_retries=retry,
+    )
+
+    session = TowerSession()
+    session.auth = (username, password)
+    session.verify = False
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def adhoc_session(username, password):
+    """
+    Return a new, unpooled session for a URL that is not a registered Tower target.
+
+    Use it as a context manager so that its connections are closed: URLs
+    typed into the test-connection form must not pile up in the registry.
+    """
+    return _build_session(username, password)
+
+
+def get_session(key, url, username, password):
+    """
+    Return the pooled session registered under ``key``, creating it on a miss.
+    
+    Args:
+        key (tuple): Registry key, e.g. ('TowerInstance', pk)
+        url (str): Tower base URL
+        username (str): Username for authentication
+        password (str): Password for authentication
+        
+    Returns:
+        requests.Session: Session authenticated for the given target
+    """
+    fingerprint = hashlib.sha256(f"{url}\0{username}\0{password}".encode()).hexdigest()
+
+    with _sessions_lock:
+        entry = _sessions.get(key)
+        if entry and entry[0] == fingerprint:
+            _session_stats['hits'] += 1
+            return entry[1]
+
+        _session_stats['misses'] += 1
+        if entry:
+            entry[1].retire()
+        session = _build_session(username, password)
+        _sessions[key] = (fingerprint, session)
+        return session
+
+
+def get_tower_session(tower_instance):
+    """Return the pooled session for a TowerInstance or TowerConfig object."""
+    url = getattr(tower_instance, 'url', None) or getattr(tower_instance, 'base_url', '')
+    if isinstance(tower_instance, TowerInstance):
+        # Decrypted once per row version, not on every load
+        password = get_instance_password(tower_instance)
+    else:
+        password = tower_instance.password
+    session = get_session(
+        (tower_instance.__class__.__name__, tower_instance.pk),
+        url,
+        tower_instance.username,
+        password
+    )
+    if isinstance(tower_instance, TowerInstance):
+        # Calls to an instance known to be down fail fast (see tower.breaker)
+        session.breaker = get_breaker(tower_instance)
+        session.latency_key = latency_key(tower_instance)
+        session.metrics_label = tower_instance.name
+    else:
+        session.metrics_label = tower_instance.__class__.__name__
+    return session
+
+
+def invalidate_tower_session(tower_instance):
+    """Drop and retire the pooled session of a TowerInstance that changed or was deleted."""
+    with _sessions_lock:
+        entry = _sessions.pop((tower_instance.__class__.__name__, tower_instance.pk), None)
+        if entry:
+            _session_stats['invalidations'] += 1
+            entry[1].retire()
+
+
+def session_pool_stats():
+    """
+    Return session registry counters.
+    
+    Returns:
+        dict: hits, misses and invalidations since process start plus the
+        number of live sessions
+    """
+    with _sessions_lock:
+        return dict(_session_stats, sessions=len(_sessions))
+
+
+def _get_tower_page(session, url, params=None, timeout=10, deadline=None):
+    """Fetch and decode a single page of a Tower list endpoint, within the time left until ``deadline``."""
+    response = session.get(url, params=params, timeout=time_left(timeout, deadline))
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_tower_results(session, base_url, path, params=None, page_size=None, prefetch=True, timeout=10,
+                       first_page=None, deadline=None):
+    """
+    Iterate over every item of a paginated Tower /api/v2/ list endpoint.
+    
+    Follows the ``next`` links until the last page. While the caller consumes
+    one page the next one can be fetched in the background, so large lists
+    stream at roughly the speed of the slowest page.
+    
+    Args:
+        session (requests.Session): Authenticated session (see ``get_tower_session``)
+        base_url (str): Tower base URL
+        path (str): List endpoint path, e.g. '/api/v2/credential_types/'
+        params (dict): Extra query parameters for the first page (optional)
+        page_size (int): Items per page (defaults to TOWER_PAGE_SIZE)
+        prefetch (bool): Fetch the next page while the current one is consumed
+        timeout (float): Per-page request timeout in seconds
+        first_page (dict): Already-decoded first page to continue from (optional)
+        deadline (float): ``time.monotonic()`` by which every page must be fetched;
+            each page gets at most the time left (optional)
+        
+    Yields:
+        dict: One item from the ``results`` of each page
+        
+    Raises:
+        requests.RequestException: If any page request fails
+    """
+    if page_size is None:
+        page_size = getattr(settings, 'TOWER_PAGE_SIZE', 200)
+
+    url = base_url.rstrip('/') + path
+    params = dict(params or {}, page_size=page_size)
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    try:
+        page = first_page if first_page is not None else _get_tower_page(session, url, params, timeout, deadline)
+        while True:
+            next_url = page.get('next')
+            pending = None
+            if next_url:
+                # 'next' is usually a path relative to the Tower host
+                next_url = urljoin(url, next_url)
+                if executor:
+                    pending = executor.submit(
+                        contextvars.copy_context().run, _prefetch_tower_page, session, next_url, timeout, deadline
+                    )
+
+            yield from page.get('results', [])
+
+            if not next_url:
+                return
+            if pending:
+                page = pending.result()
+                flush_status_updates()
+            else:
+                page = _get_tower_page(session, next_url, None, timeout, deadline)
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _prefetch_tower_page(session, url, timeout, deadline):
+    with worker_thread():
+        return _get_tower_page(session, url, None, timeout, deadline)
+
+
+@instrumented('fetch_tower_credential_types')
+def fetch_tower_credential_types(tower_instance, etag=None, last_modified=None, timeout=10):
+    """
+    Fetch credential types from a Tower instance, revalidating a cached copy.
+    
+    The validators of a previous response are sent as If-None-Match /
+    If-Modified-Since; when Tower answers 304 the caller keeps its copy.
     
     Args:
         tower_instance: TowerInstance model object
+        etag (str): ETag of the cached copy (optional)
+        last_modified (str): Last-Modified of the cached copy (optional)
+        timeout (float): Time allowed for all pages in seconds
         
     Returns:
-        list: List of credential type dictionaries
+        dict: ``not_modified`` flag, ``results`` (None when not modified) and
+        the ``etag`` / ``last_modified`` validators of the response
         
     Raises:
         requests.RequestException: If API call fails
     """
     if not tower_instance.url or not tower_instance.username:
         raise ValueError("Tower instance missing required connection details")
-    
-    url = tower_instance.url.rstrip('/') + '/api/v2/credential_types/'
-    
+
+    path = '/api/v2/credential_types/'
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    deadline = time.monotonic() + timeout
     try:
-        response = requests.get(
-            url,
-            auth=(tower_instance.username, tower_instance.password),
-            timeout=10,
-            verify=False
+        session = get_tower_session(tower_instance)
+        response = session.get(
+            tower_instance.url.rstrip('/') + path,
+            params={'page_size': getattr(settings, 'TOWER_PAGE_SIZE', 200)},
+            headers=headers,
+            timeout=timeout
         )
+        if response.status_code == 304:
+            return {'not_modified': True, 'results': None, 'etag': etag, 'last_modified': last_modified}
         response.raise_for_status()
-        return response.json().get('results', [])
-    
+
+        results = list(iter_tower_results(
+            session,
+            tower_instance.url,
+            path,
+            timeout=timeout,
+            first_page=response.json(),
+            deadline=deadline
+        ))
+        return {
+            'not_modified': False,
+            'results': results,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
     except requests.exceptions.RequestException as e:
         raise requests.RequestException(f"Failed to fetch credential types from {tower_instance.name}: {e}")
 
 
+@instrumented('get_tower_credential_types')
+def get_tower_credential_types(tower_instance, timeout=10):
+    """
+    Fetch credential types from a Tower instance.
+    
+    Args:
+        tower_instance: TowerInstance model object
+        timeout (float): Time allowed for all pages in seconds
+        
+    Returns:
+        list: List of credential type dictionaries
+        
+    Raises:
+        requests.RequestException: If API call fails
+    """
+    return fetch_tower_credential_types(tower_instance, timeout=timeout)['results']
+
+
+@instrumented('get_tower_credentials')
+def get_tower_credentials(tower_instance, timeout=10):
+    """
+    Fetch all credentials from a Tower instance.
+    
+    Args:
+        tower_instance: TowerInstance model object
+        timeout (float): Time allowed for all pages in seconds
+        
+    Returns:
+        list: List of credential dictionaries
+        
+    Raises:
+        requests.RequestException: If API call fails
+    """
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    try:
+        return list(iter_tower_results(
+            get_tower_session(tower_instance),
+            tower_instance.url,
+            '/api/v2/credentials/',
+            timeout=timeout,
+            deadline=time.monotonic() + timeout
+        ))
+
+    except requests.exceptions.RequestException as e:
+        raise requests.RequestException(f"Failed to fetch credentials from {tower_instance.name}: {e}")
+
+
+@instrumented('create_tower_credential_type')
 def create_tower_credential_type(tower_instance, credential_type_data):
     """
     Create a credential type in a Tower instance.
@@ -84,12 +481,10 @@ def create_tower_credential_type(tower_instance, credential_type_data):
     url = tower_instance.url.rstrip('/') + '/api/v2/credential_types/'
     
     try:
-        response = requests.post(
+        response = get_tower_session(tower_instance).post(
             url,
-            auth=(tower_instance.username, tower_instance.password),
             json=credential_type_data,
-            timeout=10,
-            verify=False
+            timeout=10
         )
         response.raise_for_status()
         return response.json()
@@ -98,6 +493,7 @@ def create_tower_credential_type(tower_instance, credential_type_data):
         raise requests.RequestException(f"Failed to create credential type in {tower_instance.name}: {e}")
 
 
+@instrumented('get_tower_credential_type_by_name')
 def get_tower_credential_type_by_name(tower_instance, name):
     """
     Find a credential type by name in a Tower instance.
@@ -114,18 +510,14 @@ def get_tower_credential_type_by_name(tower_instance, name):
     """
     try:
         credential_types = get_tower_credential_types(tower_instance)
-        
-        for cred_type in credential_types:
-            if cred_type.get('name', '').lower() == name.lower():
-                return cred_type
-                
-        return None
+        return CredentialTypeNameIndex(credential_types).exact(name)
     
     except requests.RequestException:
         # Re-raise the exception from get_tower_credential_types
         raise
 
 
+@instrumented('test_tower_connection')
 def test_tower_connection(url, username, password):
     """
     Test connection to a Tower instance.
@@ -141,14 +533,159 @@ def test_tower_connection(url, username, password):
     test_url = url.rstrip('/') + '/api/v2/ping/'
     
     try:
-        response = requests.get(
-            test_url,
-            auth=(username, password),
-            timeout=5,
-            verify=False
-        )
+        with adhoc_session(username, password) as session:
+            response = session.get(test_url, timeout=5)
         response.raise_for_status()
         return True
     
     except requests.exceptions.RequestException:
         return False
+
+
+
+def iter_fan_out(instances, func, max_workers=None):
+    """
+    Run a Tower helper against many instances concurrently.
+    
+    Outcomes are yielded as soon as each instance finishes, so the total
+    wall time is bounded by the slowest instance rather than the sum.
+    Passwords of TowerInstance objects are cached in one batch beforehand,
+    so worker threads never query the database for them; the instance
+    status changes their breakers record are written once the fan-out
+    finishes, from the calling thread. Workers run in a
+    copy of the caller's context, so the request deadline applies to them;
+    once it passes, the remaining instances are given up on and yielded
+    with a DeadlineExceeded error and ``timed_out`` set.
+    
+    Args:
+        instances (iterable): TowerInstance model objects
+        func (callable): Called as ``func(instance)`` in a worker thread
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+        
+    Yields:
+        dict: ``instance``, ``result``, ``error`` (exception or None) and
+        ``elapsed_ms`` for one instance
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    prime_secrets([instance for instance in instances if isinstance(instance, TowerInstance)])
+
+    if max_workers is None:
+        max_workers = getattr(settings, 'TOWER_FANOUT_MAX_WORKERS', 16)
+    max_workers = max(1, min(max_workers, len(instances)))
+
+    def timed_call(instance):
+        started = time.monotonic()
+        try:
+            with profiled_thread(), worker_thread():
+                result, error = func(instance), None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            # Cache and password lookups may have connected from this worker; nothing else would close it
+            connections.close_all()
+        return {
+            'instance': instance,
+            'result': result,
+            'error': error,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }
+
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {
+        executor.submit(contextvars.copy_context().run, timed_call, instance): instance
+        for instance in instances
+    }
+    pending = set(futures)
+    try:
+        left = remaining()
+        for future in as_completed(futures, timeout=None if left is None else max(0, left)):
+            pending.discard(future)
+            yield future.result()
+    except FuturesTimeoutError:
+        mark_partial()
+        for future in pending:
+            if future.done():
+                yield future.result()
+            else:
+                future.cancel()
+                yield deadline_outcome(futures[future], started)
+    finally:
+        # Abandoned calls finish in the background, bounded by the deadline-capped timeouts
+        executor.shutdown(wait=False, cancel_futures=True)
+        flush_status_updates()
+
+
+def fan_out(instances, func, max_workers=None):
+    """
+    Run a Tower helper against many instances concurrently and collect the outcomes.
+    
+    Args:
+        instances (iterable): TowerInstance model objects
+        func (callable): Called as ``func(instance)`` in a worker thread
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+        
+    Returns:
+        list: Outcome dictionaries (see ``iter_fan_out``) in the order of ``instances``
+    """
+    instances = list(instances)
+    outcomes = {id(o['instance']): o for o in iter_fan_out(instances, func, max_workers)}
+    return [outcomes[id(instance)] for instance in instances]
+
+
+@instrumented('get_tower_job_stats')
+def get_tower_job_stats(tower_instance, period='month', job_type='all', timeout=10):
+    """
+    Fetch the job success/failure graph data of a Tower instance.
+
+    Args:
+        tower_instance: TowerInstance model object
+        period (str): 'month', 'two_weeks', 'week' or 'day'
+        job_type (str): 'all', 'inv_sync', 'playbook_run' or 'scm_update'
+        timeout (float): Request timeout in seconds
+
+    Returns:
+        dict: ``successful`` and ``failed`` lists of [epoch seconds, count] pairs
+
+    Raises:
+        requests.RequestException: If API call fails
+    """
+    if not tower_instance.url or not tower_instance.username:
+        raise ValueError("Tower instance missing required connection details")
+
+    try:
+        session = get_tower_session(tower_instance)
+        response = session.get(
+            tower_instance.url.rstrip('/') + '/api/v2/dashboard/graphs/jobs/',
+            params={'period': period, 'job_type': job_type},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json().get('jobs', {})
+
+    except requests.exceptions.RequestException as e:
+        raise requests.RequestException(f"Failed to fetch job statistics from {tower_instance.name}: {e}")
+
+
+def fetch_credential_types_for_instances(instances, max_workers=None, timeout=None):
+    """
+    Fetch the credential types of every Tower instance exactly once, concurrently.
+    
+    Args:
+        instances (iterable): TowerInstance model objects
+        max_workers (int): Concurrency cap (defaults to TOWER_FANOUT_MAX_WORKERS)
+        timeout (float): Per-instance timeout in seconds, covering all its pages (defaults to TOWER_FANOUT_TIMEOUT)
+        
+    Returns:
+        list: Outcome dictionaries (see ``iter_fan_out``) in the order of ``instances``
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+
+    return fan_out(
+        instances,
+        lambda instance: get_tower_credential_types(instance, timeout=timeout),
+        max_workers=max_workers,
+    )
@@ -1,22 +1,101 @@
+import json
+import logging
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+
 import requests
 import urllib3
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
 from django.contrib.auth import get_user_model
-
-from .models import TowerConfig, TowerInstance, Credential, ExecutionEnvironment, Auditlog
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate, now
+from django_filters.rest_framework import DjangoFilterBackend
+
+from .models import (
+    TowerConfig,
+    TowerInstance,
+    Credential,
+    ExecutionEnvironment,
+    Auditlog,
+    InventorySync,
+    RemoteCredential
+)
 from .serializers import (
     TowerInstanceSerializer,
+    TowerInstanceExpandedSerializer,
     CredentialSerializer,
     ExecutionEnvironmentSerializer,
     AuditlogSerializer,
-    UserSerializer
+    ConnectivityProbeSerializer,
+    UserSerializer,
+    VerifyCredentialTypeSerializer
+)
+from .utils import (
+    log_action,
+    log_actions,
+    get_tower_credential_types,
+    get_tower_credentials,
+    create_tower_credential_type,
+    fan_out,
+    iter_fan_out,
+    iter_tower_results,
+    adhoc_session,
+    get_tower_session,
+    invalidate_tower_session,
+    session_pool_stats
+)
+from .authentication import forget_user
+from .breaker import CLOSED, forget_breaker, get_breaker, health_scoreboard
+from .deadlines import forget_latencies, latency_key
+from .archive import decode_position, encode_position, iter_with_archive, overlapping_months
+from .audit import get_audit_writer
+from .metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REGISTRY,
+    authorized as metrics_authorized,
+    get_metrics_config,
 )
-from .utils import log_action, get_tower_credential_types, create_tower_credential_type, get_tower_credential_type_by_name
+from .dashboard import (
+    JOB_CHART_PERIODS,
+    get_dashboard_counts,
+    get_job_chart_data,
+    invalidate_dashboard,
+    invalidate_job_charts,
+)
+from .credential_search import (
+    merge_credentials,
+    paginate_credentials,
+    parse_listing_params,
+    select_instances,
+    wants_merged_listing,
+)
+from .cache import fetch_cached_credential_types, get_credential_type_index, invalidate_credential_types
+from .rollups import DIMENSIONS as ROLLUP_DIMENSIONS, activity_summary
+from .secret_cache import invalidate_secret
+from .sync import (
+    is_stale,
+    snapshot_credential_outcomes,
+    snapshot_credential_type_outcomes,
+    upsert_credential_type,
+)
+from .filters import AuditlogFilter
+from .pagination import AuditlogCursorPagination
+from .probes import TREND_BUCKETS, TREND_GROUPS, latest_probes, probe_instances, probe_trends
+from .parsers import CSVParser
 from .permissions import IsAdmin, ReadOnlyForViewer
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
@@ -29,31 +108,141 @@ class AuditedModelViewSet(viewsets.ModelViewSet):
     def get_current_user(self):
         """Get current user or default to 'system' if not available."""
         return getattr(self.request.user, 'username', 'system')
-    
-    def track_changes(self, old_instance, new_instance, serializer):
-        """Track changes between old and new instance."""
-        changes = {}
-        for field in serializer.fields:
-            old_val = getattr(old_instance, field, None)
-            new_val = getattr(new_instance, field, None)
-            if old_val != new_val:
-                changes[field] = {'from': old_val, 'to': new_val}
-        return changes
+
+    def get_queryset(self):
+        """Defers secret columns: they are write-only, so reads and updates never load or decrypt them."""
+        queryset = super().get_queryset()
+        secret_fields = getattr(self.get_serializer_class(), 'secret_fields', ())
+        concrete = {f.name for f in queryset.model._meta.concrete_fields}
+        deferred = [name for name in secret_fields if name in concrete]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
 
     def perform_create(self, serializer):
         instance = serializer.save()
         log_action(user=self.get_current_user(), action='created', obj=instance)
+        self.instances_changed([instance])
 
     def perform_update(self, serializer):
-        old_instance = serializer.instance.__class__.objects.get(pk=serializer.instance.pk)
+        # The serializer diffs the validated fields against the loaded instance
         new_instance = serializer.save()
-        changes = self.track_changes(old_instance, new_instance, serializer)
+        changes = getattr(serializer, 'changes', {})
         log_action(user=self.get_current_user(), action='updated', obj=new_instance, changes=changes)
+        self.instances_changed([new_instance])
 
     def perform_destroy(self, instance):
         log_action(user=self.get_current_user(), action='deleted', obj=instance)
+        self.instances_changed([instance])
         instance.delete()
 
+    def instances_changed(self, instances):
+        """Hook called after instances were created, updated or bulk-deleted (before single deletes)."""
+        invalidate_dashboard()
+
+    # Bulk endpoints: POST/PATCH/DELETE <prefix>/bulk/ with a JSON array or CSV upload
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk',
+            parser_classes=[JSONParser, CSVParser])
+    def bulk(self, request):
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        """Validates a whole array and inserts it with one bulk_create."""
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'message': 'Expected a non-empty list of objects.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        with transaction.atomic():
+            instances = model.objects.bulk_create(
+                [model(**attrs) for attrs in serializer.validated_data], batch_size=500
+            )
+        log_actions(user=self.get_current_user(), action='created', objs=instances)
+        self.instances_changed(instances)
+        return Response(self.get_serializer(instances, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        """Partially updates many objects ({id, ...fields}) with grouped bulk_update calls."""
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'message': 'Expected a non-empty list of objects.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ids = [
+                int(item['id']) if isinstance(item, dict) and item.get('id') is not None else None
+                for item in request.data
+            ]
+        except (TypeError, ValueError):
+            return Response({'message': 'Ids must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        instances = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+
+        errors, item_serializers = [], []
+        for pk, item in zip(ids, request.data):
+            instance = instances.get(pk)
+            if instance is None:
+                errors.append({'id': ['Not found.']})
+                continue
+            serializer = self.get_serializer(instance, data=item, partial=True)
+            if serializer.is_valid():
+                errors.append({})
+                item_serializers.append(serializer)
+            else:
+                errors.append(serializer.errors)
+
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Objects changing the same set of columns are written together
+        groups, changed, changes = {}, [], []
+        for serializer in item_serializers:
+            obj_changes, update_fields = serializer.apply_changes(serializer.instance, serializer.validated_data)
+            if update_fields:
+                groups.setdefault(tuple(update_fields), []).append(serializer.instance)
+                changed.append(serializer.instance)
+                changes.append(obj_changes)
+
+        model = self.get_queryset().model
+        with transaction.atomic():
+            for update_fields, objs in groups.items():
+                model.objects.bulk_update(objs, update_fields, batch_size=500)
+
+        log_actions(user=self.get_current_user(), action='updated', objs=changed, changes=changes)
+        self.instances_changed(changed)
+        return Response([serializer.data for serializer in item_serializers])
+
+    def bulk_destroy(self, request):
+        """Deletes many objects ({ids: [...]} or a plain list of ids) in one transaction."""
+        ids = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(ids, list) or not ids:
+            return Response({'message': 'Expected a non-empty list of ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'message': 'Ids must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        requested = Counter(ids)  # Ordered by first occurrence
+        instances = list(self.get_queryset().filter(pk__in=list(requested)))
+        found = {instance.pk for instance in instances}
+
+        with transaction.atomic():
+            self.get_queryset().model.objects.filter(pk__in=found).delete()
+
+        # Only once the rows are gone: a failed delete must leave no audit entries or cache misses behind
+        log_actions(user=self.get_current_user(), action='deleted', objs=instances)
+        self.instances_changed(instances)
+
+        return Response({
+            'deleted': len(instances),
+            'not_found': [pk for pk in requested if pk not in found],
+            'duplicates': [pk for pk, count in requested.items() if count > 1],
+        })
+
 
 # ========================
 # User Management
@@ -63,6 +252,15 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]
 
+    # Tokens keep their claims until they expire; re-check role/is_active in this process now
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        forget_user(serializer.instance.pk)
+
+    def perform_destroy(self, instance):
+        forget_user(instance.pk)
+        super().perform_destroy(instance)
+
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -97,7 +295,8 @@ def test_connection(request):
     test_url = url.rstrip('/') + '/api/v2/ping/'
 
     try:
-        response = requests.get(test_url, auth=(username, password), timeout=5, verify=False)
+        with adhoc_session(username, password) as session:
+            response = session.get(test_url, timeout=5)
         response.raise_for_status()
         return Response({'message': 'Connection successful!'}, status=status.HTTP_200_OK)
     
@@ -128,6 +327,102 @@ def test_connection(request):
         )
 
 
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def tower_session_stats(request):
+    """Returns hit/miss counters of the pooled Tower HTTP sessions."""
+    return Response(session_pool_stats())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def tower_health(request):
+    """Returns the circuit breaker state and recent failure rate of every Tower instance."""
+    instances = TowerInstance.objects.only('id', 'name', 'status').order_by('name')
+    return Response({'results': health_scoreboard(instances)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def audit_stats(request):
+    """Returns queue depth and flush latency of the audit log pipeline."""
+    return Response(get_audit_writer().stats())
+
+
+# ========================
+# Dashboard
+# ========================
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def dashboard_counts(request):
+    """Returns instance/credential/environment counts and recent audit activity (cached)."""
+    return Response(get_dashboard_counts())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def job_chart_data(request):
+    """Returns successful/failed job counts per day summed over all Tower instances (cached)."""
+    period = request.query_params.get('period', 'month')
+    if period not in JOB_CHART_PERIODS:
+        return Response(
+            {'message': f"period must be one of: {', '.join(JOB_CHART_PERIODS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(get_job_chart_data(period))
+
+
+# ========================
+# Connectivity Probes
+# ========================
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated, ReadOnlyForViewer])
+def connectivity_probes(request):
+    """
+    POST: pings every selected TowerInstance concurrently and returns the batch summary.
+    GET: latest probe per instance and latency trends (?days=, ?bucket=hour|day,
+    ?group=region|environment|instance).
+    """
+    if request.method == 'POST':
+        params = request.data or request.query_params
+        try:
+            timeout = float(params['timeout']) if params.get('timeout') else None
+        except (TypeError, ValueError):
+            return Response({'detail': 'timeout must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        instances = select_instances(params).only('id', 'name', 'url', 'region', 'environment')
+        return Response(probe_instances(instances, timeout=timeout))
+
+    bucket = request.query_params.get('bucket', 'hour')
+    group = request.query_params.get('group', 'region')
+    try:
+        days = int(request.query_params.get('days', 7))
+    except ValueError:
+        days = None
+    if not days or days < 1 or bucket not in TREND_BUCKETS or group not in TREND_GROUPS:
+        return Response(
+            {'detail': f"Use ?days=<n>, ?bucket={'|'.join(TREND_BUCKETS)} and ?group={'|'.join(TREND_GROUPS)}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'latest': ConnectivityProbeSerializer(latest_probes().order_by('tower_instance__name'), many=True).data,
+        'trends': probe_trends(now() - timedelta(days=days), bucket=bucket, group=group),
+    })
+
+
+# ========================
+# Metrics
+# ========================
+def metrics(request):
+    """Prometheus scrape endpoint (plain Django view: scrapers send TOWER_METRICS['TOKEN'], not a JWT)."""
+    if not get_metrics_config()['TOKEN']:
+        return HttpResponse('Forbidden: TOWER_METRICS TOKEN is not set\n', status=403, content_type='text/plain')
+    if not metrics_authorized(request):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # ========================
 # Tower Credential Proxy
 # ========================
@@ -136,6 +431,13 @@ class TowerCredentialProxy(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
+        if wants_merged_listing(request.query_params):
+            return self.list_merged(request)
+
+        instance_id = request.query_params.get('instance')
+        if instance_id:
+            return self.list_snapshot(instance_id)
+
         cfg = TowerConfig.objects.first()
         if not cfg:
             return Response(
@@ -143,16 +445,14 @@ class TowerCredentialProxy(viewsets.ViewSet):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        tower_url = cfg.base_url.rstrip('/') + '/api/v2/credentials/'
         try:
-            resp = requests.get(
-                tower_url,
-                auth=(cfg.username, cfg.password),
-                timeout=10,
-                verify=False
-            )
-            resp.raise_for_status()
-            return Response(resp.json().get('results', []))
+            credentials = list(iter_tower_results(
+                get_tower_session(cfg),
+                cfg.base_url,
+                '/api/v2/credentials/',
+                timeout=10
+            ))
+            return Response(credentials)
         
         except requests.exceptions.RequestException as e:
             return Response(
@@ -160,6 +460,78 @@ class TowerCredentialProxy(viewsets.ViewSet):
                 status=status.HTTP_502_BAD_GATEWAY
             )
 
+    def list_snapshot(self, instance_id):
+        """Answers from the synced snapshot of one TowerInstance."""
+        snapshot = _credential_snapshot(instance_id)
+        if snapshot is None:
+            return Response(
+                {"detail": "Inventory of this instance has not been synced yet."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        credentials, headers = snapshot
+        response = Response(credentials)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def list_merged(self, request):
+        """
+        Searches the credentials of every selected TowerInstance at once.
+
+        ?instances=<ids or names>|all, ?region=, ?environment= select the
+        instances; ?search=, ?ordering= and ?limit= / ?cursor= shape the page.
+        """
+        try:
+            listing = parse_listing_params(request.query_params)
+        except ValidationError as e:
+            return Response({'detail': e.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        instances = list(select_instances(request.query_params).defer('password'))
+        snapshot, live_instances = _credential_sources(request.query_params, instances)
+
+        timeout = getattr(settings, 'TOWER_FANOUT_TIMEOUT', 10)
+        live = {
+            o['instance'].pk: o
+            for o in fan_out(live_instances, lambda instance: get_tower_credentials(instance, timeout=timeout))
+        }
+        outcomes = [snapshot.get(instance.pk) or live[instance.pk] for instance in instances]
+        return Response(_merged_credentials_page(request, outcomes, listing))
+
+
+def _credential_sources(params, instances):
+    """Splits instances into snapshot outcomes and the ones to fetch live (as credential_type_status does)."""
+    refresh = params.get('refresh') in ('1', 'true')
+    source = params.get('source', getattr(settings, 'TOWER_INVENTORY_SOURCE', 'snapshot'))
+    if source == 'snapshot' and not refresh:
+        return snapshot_credential_outcomes(instances)
+    return {}, instances
+
+
+def _merged_credentials_page(request, outcomes, listing):
+    """Builds the merged listing response from per-instance credential outcomes."""
+    page = paginate_credentials(merge_credentials(outcomes), **listing)
+    next_cursor = page['next_cursor']
+    return {
+        'count': page['count'],
+        'next': replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None,
+        'results': page['results'],
+        'instances': [_instance_timing(outcome, counted='credentials') for outcome in outcomes],
+    }
+
+
+def _credential_snapshot(instance_id):
+    """Returns (credentials, response headers) from the synced snapshot, or None if never synced."""
+    sync = InventorySync.objects.filter(tower_instance_id=instance_id, last_synced__isnull=False).first()
+    if not sync:
+        return None
+
+    credentials = RemoteCredential.objects.filter(tower_instance_id=instance_id).order_by('remote_id')
+    return [c.data for c in credentials], {
+        'X-Inventory-Last-Synced': sync.last_synced.isoformat(),
+        'X-Inventory-Stale': 'true' if is_stale(sync.last_synced) else 'false',
+    }
+
 
 # ========================
 # Main ViewSets (using base class)
@@ -169,6 +541,44 @@ class TowerInstanceViewSet(AuditedModelViewSet):
     serializer_class = TowerInstanceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_expand(self):
+        """Returns the related collections requested with ?expand=credentials,environments."""
+        if self.action not in ('list', 'retrieve'):
+            return []
+        requested = self.request.query_params.get('expand', '')
+        return [name for name in requested.split(',') if name in TowerInstanceExpandedSerializer.EXPANDABLE]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = self.get_expand()
+        if 'credentials' in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch('credentials', queryset=Credential.objects.only('id', 'name', 'type', 'username', 'tower_instance'))
+            )
+        if 'environments' in expand:
+            queryset = queryset.prefetch_related('environments')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.get_expand():
+            return TowerInstanceExpandedSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def instances_changed(self, instances):
+        super().instances_changed(instances)
+        invalidate_job_charts()
+        for instance in instances:
+            invalidate_secret(instance)
+            invalidate_tower_session(instance)
+            invalidate_credential_types(instance)
+            forget_breaker(instance)
+            forget_latencies(latency_key(instance))
+
 
 class CredentialViewSet(AuditedModelViewSet):
     queryset = Credential.objects.all()
@@ -183,34 +593,126 @@ class ExecutionEnvironmentViewSet(AuditedModelViewSet):
 
 
 class AuditlogViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Auditlog.objects.all().order_by('-timestamp')
+    queryset = Auditlog.objects.all().order_by('-timestamp', '-id')
     serializer_class = AuditlogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AuditlogCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AuditlogFilter
+
+    def list(self, request, *args, **kwargs):
+        filterset = self.filterset_class(request.query_params, queryset=self.get_queryset(), request=request)
+        if filterset.is_valid():
+            months = overlapping_months(filterset.form.cleaned_data.get('timestamp'))
+            if months:
+                return self.list_with_archive(filterset, months)
+        return super().list(request, *args, **kwargs)
+
+    def list_with_archive(self, filterset, months):
+        """
+        Merges hot rows with archived months for date ranges that reach into the archive.
+        Paged forward by a cursor holding the (timestamp, id) of the last row, so deeper
+        pages only read the table and archive months below it.
+        """
+        pagination = self.pagination_class
+        params = self.request.query_params
+        try:
+            limit = min(max(int(params.get('limit', pagination.page_size)), 1), pagination.max_page_size)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            before = decode_position(params['cursor']) if params.get('cursor') else None
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = iter_with_archive(filterset.qs, months, filterset.form.cleaned_data, before=before)
+        page = list(islice(entries, limit + 1))
+
+        url = self.request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, 'cursor', encode_position(page[limit - 1])) if len(page) > limit else None,
+            'previous': None,
+            'archived_months': [f"{year:04d}-{month:02d}" for year, month in months],
+            'results': self.get_serializer(page[:limit], many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def activity(self, request):
+        """Daily activity chart data for ?start=&end= (default: last 30 days), read from the rollups."""
+        params = request.query_params
+        try:
+            end = parse_date(params['end']) if params.get('end') else localdate()
+            start = parse_date(params['start']) if params.get('start') else end and end - timedelta(days=29)
+        except ValueError:
+            start = end = None
+        if start is None or end is None or start > end:
+            return Response(
+                {'detail': 'start and end must be dates (YYYY-MM-DD) with start <= end.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        series = params.get('series', 'action')
+        if series not in ROLLUP_DIMENSIONS:
+            return Response(
+                {'detail': f"series must be one of: {', '.join(ROLLUP_DIMENSIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        filters = {name: params[name] for name in ROLLUP_DIMENSIONS if params.get(name)}
+        return Response(activity_summary(start, end, series=series, filters=filters))
 
 
 # ========================
 # Credential Type Management
 # ========================
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def credential_type_status(request):
-    """Returns all unique CredentialTypes found across Tower instances with their presence status."""
-    instances = TowerInstance.objects.all()
+def _instance_timing(outcome, counted='credential_types'):
+    """Summarizes one fan-out outcome for the response."""
+    timing = {
+        'name': outcome['instance'].name,
+        'elapsed_ms': outcome['elapsed_ms'],
+    }
+    if outcome['error'] is None:
+        timing['status'] = 'ok'
+        timing[counted] = len(outcome['result'])
+    else:
+        # 'timeout': given up on at the request deadline; 'unavailable': its circuit is open
+        breaker = get_breaker(outcome['instance'])
+        if outcome.get('timed_out'):
+            timing['status'] = 'timeout'
+        elif breaker and breaker.state != CLOSED:
+            timing['status'] = 'unavailable'
+        else:
+            timing['status'] = 'error'
+        timing['error'] = str(outcome['error'])
+    timing['source'] = outcome.get('source', 'live')
+    if 'last_synced' in outcome:
+        timing['last_synced'] = outcome['last_synced']
+        timing['stale'] = outcome['stale']
+    return timing
+
+
+def _credential_type_matrix(outcomes):
+    """Builds the per-type presence status from one fetch per instance."""
     all_tower_types = {}
-    
-    # Collect all credential types across instances
-    for instance in instances:
-        try:
-            tower_credential_types = get_tower_credential_types(instance)
-            for c_type in tower_credential_types:
-                name = c_type.get('name')
-                description = c_type.get('description', '')
-                if name and name not in all_tower_types:
-                    all_tower_types[name] = {'name': name, 'description': description}
-        except Exception as e:
-            print(f"Error fetching credential types from {instance.name}: {e}")
-
-    # Calculate status for each credential type
+    names_by_instance = []
+
+    for outcome in outcomes:
+        if outcome['error'] is not None:
+            logger.warning("Error fetching credential types from %s: %s", outcome['instance'].name, outcome['error'])
+            names_by_instance.append(None)
+            continue
+
+        names = set()
+        for c_type in outcome['result']:
+            name = c_type.get('name')
+            if not name:
+                continue
+            names.add(name)
+            if name not in all_tower_types:
+                all_tower_types[name] = {'name': name, 'description': c_type.get('description', '')}
+        names_by_instance.append(names)
+
+    total_instances = len(outcomes)
     results = []
     for name, data in all_tower_types.items():
         type_status = {
@@ -220,106 +722,264 @@ def credential_type_status(request):
             'missing_in_instances': [],
             'status': 'N/A'
         }
-        
-        present_count = 0
-        total_instances = len(instances)
-        
-        for instance in instances:
-            try:
-                tower_credential_types = get_tower_credential_types(instance)
-                if name in [t.get('name') for t in tower_credential_types]:
-                    type_status['present_in_instances'].append(instance.name)
-                    present_count += 1
-                else:
-                    type_status['missing_in_instances'].append(instance.name)
-            except Exception as e:
-                type_status['missing_in_instances'].append(f"{instance.name} (Error: {e})")
-                
+
+        for outcome, names in zip(outcomes, names_by_instance):
+            instance_name = outcome['instance'].name
+            if names is None:
+                type_status['missing_in_instances'].append(f"{instance_name} (Error: {outcome['error']})")
+            elif name in names:
+                type_status['present_in_instances'].append(instance_name)
+            else:
+                type_status['missing_in_instances'].append(instance_name)
+
         # Calculate status based on presence percentage
         if total_instances > 0:
-            percentage_present = (present_count / total_instances) * 100
+            percentage_present = (len(type_status['present_in_instances']) / total_instances) * 100
             if percentage_present == 100:
                 type_status['status'] = 'Green'
             elif percentage_present > 50:
                 type_status['status'] = 'Orange'
             else:
                 type_status['status'] = 'Red'
-            
+
         results.append(type_status)
 
-    return Response(results, status=status.HTTP_200_OK)
+    return results
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def credential_type_status(request):
+    """Returns all unique CredentialTypes found across Tower instances with their presence status."""
+    instances = list(TowerInstance.objects.defer('password'))
+    refresh = request.query_params.get('refresh') in ('1', 'true')
+    source = request.query_params.get('source', getattr(settings, 'TOWER_INVENTORY_SOURCE', 'snapshot'))
+
+    # Synced instances answer from the snapshot table; the rest are fetched live
+    if source == 'snapshot' and not refresh:
+        snapshot, live_instances = snapshot_credential_type_outcomes(instances)
+    else:
+        snapshot, live_instances = {}, instances
+
+    # One concurrent (cached) fetch per live instance; the matrix is then computed in memory
+    live = {o['instance'].pk: o for o in fetch_cached_credential_types(live_instances, refresh=refresh)}
+    outcomes = [snapshot.get(instance.pk) or live[instance.pk] for instance in instances]
+
+    return Response({
+        'results': _credential_type_matrix(outcomes),
+        'instances': [_instance_timing(outcome) for outcome in outcomes],
+    }, status=status.HTTP_200_OK)
+
+
+def _parse_duplicate_jobs(data):
+    """Normalizes single and bulk duplicate payloads to [(type_data, instance_names)]."""
+    if 'credential_types' in data:
+        items = data.get('credential_types')
+        default_instances = data.get('instances') or data.get('missing_in_instances') or []
+    else:
+        items = [data]
+        default_instances = []
+
+    if not isinstance(items, list) or not items:
+        return None
+
+    jobs = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        name = item.get('name')
+        instance_names = item.get('missing_in_instances') or item.get('instances') or default_instances
+        if not name or not instance_names:
+            return None
+        jobs.append(({'name': name, 'description': item.get('description', '')}, list(instance_names)))
+    return jobs
+
+
+def _plan_duplicates(jobs, instances):
+    """
+    Groups duplicate jobs per target instance.
+
+    Returns:
+        tuple: (credential types to create keyed by instance name, results
+        for instance names that do not exist)
+    """
+    types_by_instance, not_found = {}, []
+    for type_data, names in jobs:
+        for name in names:
+            if name in instances:
+                types_by_instance.setdefault(name, []).append(type_data)
+            else:
+                not_found.append({
+                    'instance': name, 'credential_type': type_data['name'], 'status': 'instance_not_found'
+                })
+    return types_by_instance, not_found
+
+
+def _duplicate_outcome_results(outcome, type_list):
+    """Turns one fan-out outcome into per-type results and records created types locally."""
+    instance = outcome['instance']
+    if outcome['error'] is not None:
+        return [
+            {
+                'instance': instance.name,
+                'credential_type': type_data['name'],
+                'status': 'error',
+                'message': str(outcome['error'])
+            }
+            for type_data in type_list
+        ]
+
+    results, created = outcome['result']
+    if created:
+        invalidate_credential_types(instance)
+        for item in created:
+            if item.get('id') is not None:
+                upsert_credential_type(instance, item)
+    return results
+
+
+def _instances_by_name(names):
+    instances = {}
+    for instance in TowerInstance.objects.filter(name__in=names).defer('password'):
+        instances.setdefault(instance.name, instance)
+    return instances
+
+
+def _iter_duplicate_results(jobs):
+    """Creates missing credential types concurrently, yielding results per instance as they finish."""
+    instances = _instances_by_name({name for _, names in jobs for name in names})
+    types_by_instance, not_found = _plan_duplicates(jobs, instances)
+    yield from not_found
+
+    def duplicate(instance):
+        existing = {t.get('name') for t in get_tower_credential_types(instance)}
+        results, created = [], []
+        for type_data in types_by_instance[instance.name]:
+            result = {'instance': instance.name, 'credential_type': type_data['name']}
+            if type_data['name'] in existing:
+                result['status'] = 'already_exists'
+            else:
+                try:
+                    created.append(create_tower_credential_type(instance, type_data))
+                    existing.add(type_data['name'])
+                    result['status'] = 'duplicated'
+                except Exception as e:
+                    result.update(status='error', message=str(e))
+            results.append(result)
+        return results, created
+
+    targets = [instances[name] for name in types_by_instance]
+    for outcome in iter_fan_out(targets, duplicate):
+        yield from _duplicate_outcome_results(outcome, types_by_instance[outcome['instance'].name])
+
+
+def _wants_stream(request):
+    stream = request.GET.get('stream') in ('1', 'true')
+    return stream or 'application/x-ndjson' in request.META.get('HTTP_ACCEPT', '')
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def duplicate_missing_credential_type(request):
-    """Duplicates a credential type to instances where it is missing."""
-    credential_type_name = request.data.get('name')
-    credential_type_description = request.data.get('description', '')
-    missing_in_instances = request.data.get('missing_in_instances', [])
-
-    if not credential_type_name or not missing_in_instances:
+    """
+    Duplicates credential types to instances where they are missing.
+
+    Accepts a single type ({name, description, missing_in_instances}) or a
+    bulk payload ({credential_types: [...], instances: [...]}). With
+    ?stream=1 (or Accept: application/x-ndjson) results are streamed as
+    NDJSON while each instance finishes.
+    """
+    jobs = _parse_duplicate_jobs(request.data)
+    if not jobs:
         return Response(
             {'message': 'Credential type name and missing instances are required.'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    results = []
-    for instance_name in missing_in_instances:
-        try:
-            instance = TowerInstance.objects.get(name=instance_name)
-            tower_credential_types = get_tower_credential_types(instance)
-            
-            if credential_type_name not in [t.get('name') for t in tower_credential_types]:
-                credential_type_data = {
-                    'name': credential_type_name,
-                    'description': credential_type_description,
-                }
-                create_tower_credential_type(instance, credential_type_data)
-                results.append({'instance': instance.name, 'status': 'duplicated'})
-            else:
-                results.append({'instance': instance.name, 'status': 'already_exists'})
-                
-        except TowerInstance.DoesNotExist:
-            results.append({'instance': instance_name, 'status': 'instance_not_found'})
-        except Exception as e:
-            results.append({'instance': instance_name, 'status': 'error', 'message': str(e)})
-            
-    return Response(results, status=status.HTTP_200_OK)
+    results = _iter_duplicate_results(jobs)
+
+    if _wants_stream(request):
+        return StreamingHttpResponse(
+            (json.dumps(result) + '\n' for result in results),
+            content_type='application/x-ndjson'
+        )
+
+    return Response(list(results), status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def verify_credential_type_by_name(request):
-    """Verifies if a credential type exists under an alternative name in missing instances."""
-    original_credential_type_name = request.data.get('original_name')
-    alternative_name = request.data.get('alternative_name')
-    missing_in_instances = request.data.get('missing_in_instances', [])
-
-    if not all([original_credential_type_name, alternative_name, missing_in_instances]):
+    """
+    Verifies if a credential type exists under an alternative name in missing instances.
+
+    Accepts ``alternative_name`` and/or a list of ``alternative_names``. Each
+    instance is checked against its cached name index: exact (case and
+    whitespace insensitive) hits first, plus scored fuzzy ``candidates``.
+    """
+    params, errors = _parse_verify_request(request.data)
+    if errors:
         return Response(
-            {'message': 'Original credential type name, alternative name, and missing instances are required.'}, 
+            {'message': VERIFY_REQUEST_MESSAGE, 'errors': errors},
             status=status.HTTP_400_BAD_REQUEST
         )
+    alternative_names, missing_in_instances, limit = params
+
+    instances = _instances_by_name(missing_in_instances)
+
+    def verify(instance):
+        return _match_alternative_names(get_credential_type_index(instance), alternative_names, limit)
+
+    targets = [instances[name] for name in dict.fromkeys(missing_in_instances) if name in instances]
+    outcomes = {o['instance'].name: o for o in fan_out(targets, verify)}
+    return Response(_verify_results(missing_in_instances, outcomes), status=status.HTTP_200_OK)
+
+
+VERIFY_REQUEST_MESSAGE = 'Original credential type name, alternative name, and missing instances are required.'
+
 
+def _parse_verify_request(data):
+    """Returns ((alternative names, instance names, limit), None), or (None, errors) for an invalid payload."""
+    serializer = VerifyCredentialTypeSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    params = serializer.validated_data
+    return (params['alternative_names'], params['missing_in_instances'], params['limit']), None
+
+
+def _match_alternative_names(index, alternative_names, limit):
+    """Returns (exact match or None, ranked fuzzy candidates) for one instance's name index."""
+    found = next(filter(None, (index.exact(name) for name in alternative_names)), None)
+
+    candidates = {}
+    for name in alternative_names:
+        for candidate in index.search(name, limit=limit):
+            best = candidates.get(candidate['name'])
+            if best is None or candidate['score'] > best['score']:
+                candidates[candidate['name']] = {'name': candidate['name'], 'score': candidate['score']}
+    ranked = sorted(candidates.values(), key=lambda c: (-c['score'], c['name']))[:limit]
+    return found, ranked
+
+
+def _verify_results(missing_in_instances, outcomes):
+    """Builds the verify response from fan-out outcomes keyed by instance name."""
     results = []
     for instance_name in missing_in_instances:
-        try:
-            instance = TowerInstance.objects.get(name=instance_name)
-            found_type = get_tower_credential_type_by_name(instance, alternative_name)
-            
+        outcome = outcomes.get(instance_name)
+        if outcome is None:
+            results.append({'instance': instance_name, 'status': 'instance_not_found'})
+        elif outcome['error'] is not None:
+            results.append({'instance': instance_name, 'status': 'error', 'message': str(outcome['error'])})
+        else:
+            found_type, candidates = outcome['result']
             if found_type:
                 results.append({
-                    'instance': instance.name, 
+                    'instance': instance_name, 
                     'status': 'found', 
-                    'found_name': found_type.get('name')
+                    'found_name': found_type.get('name'),
+                    'candidates': candidates
                 })
             else:
-                results.append({'instance': instance.name, 'status': 'not_found'})
-                
-        except TowerInstance.DoesNotExist:
-            results.append({'instance': instance_name, 'status': 'instance_not_found'})
-        except Exception as e:
-            results.append({'instance': instance_name, 'status': 'error', 'message': str(e)})
+                results.append({'instance': instance_name, 'status': 'not_found', 'candidates': candidates})
             
-    return Response(results, status=status.HTTP_200_OK)
\ No newline at end of file
+    return results
@@ -1,4 +1,6 @@
 import os
 from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tower_admin.settings')
+# Serve the Tower-facing endpoints with the async views (see tower.async_views)
+os.environ.setdefault('TOWER_ASYNC_VIEWS', '1')
 application = get_asgi_application()
\ No newline at end of file
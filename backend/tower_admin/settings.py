@@ -1,5 +1,8 @@
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,6 +33,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tower.metrics.MetricsMiddleware',  # First, so request timings cover the whole stack
+    'tower.profiling.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS should be high in the list
@@ -38,10 +43,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tower.deadlines.RequestDeadlineMiddleware',
 ]
 
 # Allow CORS from any origin (good for development; restrict in production)
 CORS_ALLOW_ALL_ORIGINS = True
+# The frontend may send its own deadline, read the partial-results flag and ask for timings
+CORS_ALLOW_HEADERS = list(default_headers) + ['x-request-timeout', 'x-server-timing']
+CORS_EXPOSE_HEADERS = ['X-Partial-Results', 'Server-Timing']
 
 ROOT_URLCONF = 'tower_admin.urls'
 
@@ -63,16 +72,37 @@ TEMPLATES = [
 WSGI_APPLICATION = 'tower_admin.wsgi.application'
 
 # Database
+# Connection settings come from the environment (defaults: the shared dev
+# database). Connections are kept open for TOWER_DB_CONN_MAX_AGE seconds
+# (0 = one connection per request) and pinged at the start of each request
+# when TOWER_DB_HEALTH_CHECKS is on, so a connection dropped while idle is
+# replaced instead of failing the request.
+#
+# pgbouncer mode: run a local pgbouncer in transaction pooling mode, point
+# TOWER_DB_HOST/PORT at it and set TOWER_DB_PGBOUNCER=1. Server-side
+# cursors (used by QuerySet.iterator()) are then disabled, as they do not
+# survive transaction pooling; keep CONN_MAX_AGE > 0 so each worker holds
+# one cheap local connection and pgbouncer multiplexes the remote ones.
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'AAP_ADMIN',
-        'USER': 'aap_admin_admin',
-        'PASSWORD': '9FC2N',
-        'HOST': 'sinv71.xmp.net.intra',
-        'PORT': '5432',
+        'NAME': os.environ.get('TOWER_DB_NAME', 'AAP_ADMIN'),
+        'USER': os.environ.get('TOWER_DB_USER', 'aap_admin_admin'),
+        'PASSWORD': os.environ.get('TOWER_DB_PASSWORD', '9FC2N'),
+        'HOST': os.environ.get('TOWER_DB_HOST', 'sinv71.xmp.net.intra'),
+        'PORT': os.environ.get('TOWER_DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('TOWER_DB_CONN_MAX_AGE', '60')),
+        'DISABLE_SERVER_SIDE_CURSORS': _env_flag('TOWER_DB_PGBOUNCER', 'false'),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('TOWER_DB_CONNECT_TIMEOUT', '5')),
+        },
     }
 }
+TOWER_DB_HEALTH_CHECKS = _env_flag('TOWER_DB_HEALTH_CHECKS', 'true')
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,11 +138,16 @@ AUTH_USER_MODEL = 'tower.CustomUser' # Add this line
 # Add these settings for Django REST Framework and Simple JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tower.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # JSON rendering time is reported in the Server-Timing header (see TOWER_METRICS)
+    'DEFAULT_RENDERER_CLASSES': (
+        'tower.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 from datetime import timedelta
@@ -128,6 +163,9 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    # Tokens carry username/role claims; requests are authenticated without a user SELECT
+    'TOKEN_OBTAIN_SERIALIZER': 'tower.serializers.TowerTokenObtainPairSerializer',
+    'TOKEN_USER_CLASS': 'tower.authentication.ClaimsTokenUser',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
@@ -135,3 +173,175 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
+
+# Tower fan-out: calls made against every TowerInstance at once run on a
+# bounded thread pool, each with its own timeout (seconds).
+TOWER_FANOUT_MAX_WORKERS = 16
+TOWER_FANOUT_TIMEOUT = 10
+
+# Page size requested from Tower list endpoints; pages are followed via 'next'.
+TOWER_PAGE_SIZE = 200
+
+# Pooled keep-alive sessions per Tower: connection pool sizes and retries with
+# exponential backoff on 502/503/504 for idempotent requests.
+TOWER_HTTP_POOL_CONNECTIONS = 4
+TOWER_HTTP_POOL_MAXSIZE = 16
+TOWER_HTTP_RETRIES = 3
+TOWER_HTTP_BACKOFF_FACTOR = 0.5
+
+# Per-instance circuit breakers (tower.breaker): when FAILURE_RATE of the
+# calls to a Tower in the last WINDOW seconds fail (5xx, timeouts, connection
+# errors; at least MIN_CALLS calls), further calls fail fast for OPEN_TIMEOUT
+# seconds (doubling up to MAX_OPEN_TIMEOUT, +/- JITTER) before one probe is
+# let through. TowerInstance.status follows ('active' / 'unavailable').
+TOWER_CIRCUIT_BREAKER = {
+    'ENABLED': True,
+    'WINDOW': 60,
+    'MIN_CALLS': 3,
+    'FAILURE_RATE': 0.5,
+    'OPEN_TIMEOUT': 30,
+    'MAX_OPEN_TIMEOUT': 300,
+    'JITTER': 0.2,
+}
+
+# Connectivity probes (`manage.py probe_tower_instances`, POST
+# /api/connectivity-probes/): each instance gets TIMEOUT seconds in total for
+# DNS, connect, TLS and /api/v2/ping/; up to MAX_WORKERS run at once. The
+# probe history is pruned after RETENTION_DAYS.
+TOWER_PROBES = {
+    'TIMEOUT': 5,
+    'MAX_WORKERS': 64,
+    'RETENTION_DAYS': 30,
+}
+
+# Request deadlines (tower.deadlines): every request gets REQUEST_BUDGET
+# seconds (a client may ask for less, up to MAX_BUDGET, via the HEADER).
+# Tower calls never wait past it; fan-outs then return what they have with
+# X-Partial-Results: true. Once MIN_SAMPLES latencies of an instance are
+# known, its calls time out after P99_FACTOR x their p99 (at least
+# MIN_TIMEOUT seconds, at most the caller's timeout).
+TOWER_DEADLINES = {
+    'REQUEST_BUDGET': 25,
+    'MAX_BUDGET': 60,
+    'HEADER': 'X-Request-Timeout',
+    'ADAPTIVE': True,
+    'LATENCY_SAMPLES': 200,
+    'MIN_SAMPLES': 20,
+    'P99_FACTOR': 3,
+    'MIN_TIMEOUT': 1,
+}
+
+# Shared by every worker process, so that cache invalidation (dashboard
+# aggregates, credential types with BACKEND 'django') reaches all of them.
+# The database cache needs `manage.py createcachetable` once (until then
+# cache errors are logged and the dashboard is computed uncached); set
+# TOWER_CACHE_BACKEND / TOWER_CACHE_LOCATION to use memcached instead (e.g.
+# django.core.cache.backends.memcached.PyMemcacheCache and host:port).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('TOWER_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('TOWER_CACHE_LOCATION', 'tower_cache'),
+    }
+}
+
+# Cache of remote credential-type inventories. 'local' keeps a per-process
+# copy; 'django' uses the CACHES alias above so gunicorn workers share it.
+# Entries are fresh for TTL seconds and served stale (while revalidating in
+# the background) for STALE_TTL more. Pass ?refresh=1 to bypass.
+TOWER_CREDENTIAL_TYPE_CACHE = {
+    'BACKEND': 'local',
+    'ALIAS': 'default',
+    'TTL': 300,
+    'STALE_TTL': 600,
+}
+
+# Local snapshot of remote inventories, kept fresh by
+# `manage.py sync_tower_inventory --interval <seconds>`. 'snapshot' answers
+# credential-type status from the database (never-synced instances are still
+# fetched live); 'live' always queries the Towers. Snapshots older than
+# STALE_AFTER seconds are flagged as stale in responses.
+TOWER_INVENTORY_SOURCE = 'snapshot'
+TOWER_INVENTORY_SYNC_INTERVAL = 300
+TOWER_INVENTORY_STALE_AFTER = 900
+
+# Audit log pipeline: entries are queued and written with bulk_create every
+# BATCH_SIZE entries or FLUSH_INTERVAL seconds. While the database is down,
+# batches go to SPOOL_PATH and are replayed later. Use MODE 'sync' in tests.
+# `manage.py archive_auditlogs` moves whole months older than RETENTION_DAYS
+# to gzipped JSON Lines files in ARCHIVE_DIR; date-filtered audit queries
+# read them back transparently.
+TOWER_AUDIT = {
+    'MODE': 'async',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+    'SPOOL_PATH': str(BASE_DIR / 'audit_spool.jsonl'),
+    'RETENTION_DAYS': 90,
+    'ARCHIVE_DIR': str(BASE_DIR / 'audit_archive'),
+}
+
+# Dashboard aggregates (dashboard-counts/, job-chart-data/) are cached in the
+# ALIAS cache for COUNTS_TTL / JOB_CHART_TTL seconds. Counts are dropped on
+# every write through the API, job charts when Tower instances change.
+# ALIAS must name a shared cache (see CACHES): with a per-process one, other
+# workers keep serving their copy until it expires.
+TOWER_DASHBOARD = {
+    'ALIAS': 'default',
+    'COUNTS_TTL': 60,
+    'JOB_CHART_TTL': 300,
+}
+
+# Decrypted TowerInstance passwords are cached per process for TTL seconds,
+# keyed by instance id and updated_at, in an LRU of at most MAX_SIZE entries.
+TOWER_SECRET_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 300,
+}
+
+# Claims-based JWT authentication: with REVOCATION_CHECK, whether the user
+# still exists, is active and has the same role is re-read from the database
+# at most once per REVOCATION_CACHE_TTL seconds per user and process, so a
+# deactivated user keeps access for up to that long.
+TOWER_JWT_CLAIMS = {
+    'REVOCATION_CHECK': True,
+    'REVOCATION_CACHE_TTL': 60,
+}
+
+# Async Tower views: asgi.py sets TOWER_ASYNC_VIEWS so that the Tower-facing
+# endpoints run as async views sharing one httpx connection pool per event
+# loop (at most TOWER_ASYNC_MAX_CONNECTIONS open connections). WSGI keeps
+# the sync views.
+TOWER_ASYNC_VIEWS = _env_flag('TOWER_ASYNC_VIEWS', 'false')
+TOWER_ASYNC_MAX_CONNECTIONS = 200
+TOWER_ASYNC_MAX_KEEPALIVE = 50
+
+# Request, database, Tower call, secret cache and audit metrics are served in
+# the Prometheus text format on /metrics (per process: scrape every worker).
+# The scraper must send "Authorization: Bearer <TOKEN>"; without a TOKEN the
+# endpoint answers 403.
+# SERVER_TIMING adds a Server-Timing header splitting each request into
+# database, Tower and render time: 'request' when the client sends
+# X-Server-Timing: 1, 'always', or 'off'.
+TOWER_METRICS = {
+    'TOKEN': os.environ.get('TOWER_METRICS_TOKEN'),
+    'SERVER_TIMING': 'request',
+}
+
+# Sampling profiler for slow requests (TOWER_PROFILER=true to enable). Sync
+# requests running longer than THRESHOLD_MS, and 1 in SAMPLE_ONE_IN requests
+# (0 or less: none) from their start, have their stacks and fan-out worker stacks
+# sampled every INTERVAL_MS. Collapsed stacks (for flamegraph.pl or
+# speedscope) and per-request summaries with the TOP_CALLS slowest SQL
+# statements and Tower calls go to OUTPUT_DIR, rotated at MAX_FILE_BYTES
+# with BACKUP_COUNT old files kept.
+TOWER_PROFILER = {
+    'ENABLED': _env_flag('TOWER_PROFILER', 'false'),
+    'THRESHOLD_MS': 1000,
+    'SAMPLE_ONE_IN': 0,
+    'INTERVAL_MS': 10,
+    'MAX_DEPTH': 64,
+    'TOP_CALLS': 10,
+    'OUTPUT_DIR': str(BASE_DIR / 'profiles'),
+    'MAX_FILE_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
@@ -5,7 +5,8 @@ angular.module('toweradminApp').controller('AuditlogController', function($scope
     // Fetch from backend API
     $http.get("http://127.0.0.1:8000/api/audit-logs/")
         .then(function(response) {
-            $scope.auditlogs = response.data;
+            $scope.auditlogs = response.data.results || response.data;
+            $scope.nextPage = response.data.next || null;
         })
         .catch(function(error) {
             console.error('Error fetching audit logs:', error);
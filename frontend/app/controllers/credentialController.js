@@ -13,7 +13,8 @@ angular.module('towerAdminApp')
     $scope.loadCredentialTypes = function() {
         $http.get('http://127.0.0.1:8000/api/credential-type-status/')
         .then(function(response) {
-            $scope.credentialTypes = response.data;
+            $scope.credentialTypes = response.data.results || response.data;
+            $scope.instanceTimings = response.data.instances || [];
         })
         .catch(function(err) {
             console.error('Error fetching credential types:', err);
@@ -1,5 +1,5 @@
 angular.module('towerAdminApp')
-.controller('DashboardController', function($scope, $http, $timeout, $q) {
+.controller('DashboardController', function($scope, $http, $timeout, $q, apiService) {
 
     // Loader Flags
     $scope.loadingCounts = true;
@@ -30,37 +30,43 @@ angular.module('towerAdminApp')
     let previousCredentialCount = 0;
     let previousEnvironmentCount = 0;
 
-    // Fetch counts
-    const fetchCounts = [
-        $http.get('http://127.0.0.1:8000/api/tower/')
-            .then(function(res) {
-                $scope.instanceCount = res.data.length || 0;
-                if ($scope.instanceCount > previousInstanceCount) {
-                    $scope.showToast("info", "New instances added");
-                }
-                previousInstanceCount = $scope.instanceCount;
-            }),
-
-        $http.get('http://127.0.0.1:8000/api/credentials/')
-            .then(function(res) {
-                $scope.credentialCount = res.data.length || 0;
-                if ($scope.credentialCount > previousCredentialCount) {
-                    $scope.showToast("success", "New credential created");
-                }
-                previousCredentialCount = $scope.credentialCount;
-            }),
-
-        $http.get('http://127.0.0.1:8000/api/environments/')
-            .then(function(res) {
-                $scope.environmentCount = res.data.length || 0;
-                if ($scope.environmentCount > previousEnvironmentCount) {
-                    $scope.showToast("info", "Environment updated recently");
-                }
-                previousEnvironmentCount = $scope.environmentCount;
-            })
-    ];
-
-    $q.all(fetchCounts).then(function() {
+    $scope.jobTotals = { successful: 0, failed: 0 };
+
+    // One aggregated request for the counts, one for the Tower job statistics
+    const fetchCounts = apiService.getDashboardCounts()
+        .then(function(res) {
+            $scope.counts = res.data;
+            $scope.instanceCount = res.data.instances.total;
+            $scope.credentialCount = res.data.credentials.total;
+            $scope.environmentCount = res.data.environments.total;
+
+            if ($scope.instanceCount > previousInstanceCount) {
+                $scope.showToast("info", "New instances added");
+            }
+            if ($scope.credentialCount > previousCredentialCount) {
+                $scope.showToast("success", "New credential created");
+            }
+            if ($scope.environmentCount > previousEnvironmentCount) {
+                $scope.showToast("info", "Environment updated recently");
+            }
+            previousInstanceCount = $scope.instanceCount;
+            previousCredentialCount = $scope.credentialCount;
+            previousEnvironmentCount = $scope.environmentCount;
+        })
+        .catch(function(err) {
+            console.error('Error fetching dashboard counts:', err);
+        });
+
+    const fetchJobs = apiService.getJobChartData()
+        .then(function(res) {
+            $scope.jobTotals = res.data.totals;
+            $scope.jobInstances = res.data.instances;
+        })
+        .catch(function(err) {
+            console.error('Error fetching job chart data:', err);
+        });
+
+    $q.all([fetchCounts, fetchJobs]).then(function() {
         $scope.loadingCounts = false;
 
         $timeout(function() {
@@ -93,7 +99,7 @@ angular.module('towerAdminApp')
                         labels: ['Success', 'Failure'],
                         datasets: [{
                             label: 'Jobs',
-                            data: [40, 60],
+                            data: [$scope.jobTotals.successful, $scope.jobTotals.failed],
                             backgroundColor: ['#59a14f', '#e15759']
                         }]
                     },
@@ -105,7 +111,7 @@ angular.module('towerAdminApp')
             }
 
             // Toast for failed jobs
-            const failedJobs = 20;
+            const failedJobs = $scope.jobTotals.failed;
             if (failedJobs > 0) {
                 $scope.showToast("error", `${failedJobs} jobs failed recently.`);
             }
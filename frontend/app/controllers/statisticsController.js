@@ -1,27 +1,56 @@
 angular.module('towerAdminApp')
-.controller('StatisticsController', function($scope, $timeout) {
+.controller('StatisticsController', function($scope, $timeout, apiService) {
 
     console.log("StatisticsController Loaded");
 
-    // Statistics data
-    $scope.stats = [
-        { name: 'Job Templates', count: 42 },
-        { name: 'Credentials', count: 23 },
-        { name: 'Environments', count: 9 }
-    ];
+    const palette = ['#4e79a7', '#f28e2c', '#e15759', '#76b7b2', '#59a14f', '#edc949', '#af7aa1'];
+    let activityChart = null;
+    let statsChart = null;
+
+    // Range and split of the activity chart (defaults: last 30 days, per action)
+    $scope.range = { days: 30, series: 'action' };
+    $scope.stats = [];
+    $scope.loading = true;
+
+    function isoDate(date) {
+        return date.toISOString().slice(0, 10);
+    }
+
+    function renderCharts(data) {
+        const activityEl = document.getElementById('activityChart');
+        if (activityEl) {
+            if (activityChart) activityChart.destroy();
+            activityChart = new Chart(activityEl, {
+                type: 'line',
+                data: {
+                    labels: data.days,
+                    datasets: Object.keys(data.series).map((name, i) => ({
+                        label: name,
+                        data: data.series[name],
+                        borderColor: palette[i % palette.length],
+                        backgroundColor: palette[i % palette.length],
+                        fill: false
+                    }))
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    scales: { y: { beginAtZero: true } }
+                }
+            });
+        }
 
-    // Delay to ensure the DOM element is rendered before Chart.js runs
-    $timeout(function() {
         const ctx = document.getElementById('statsChart');
         if (ctx) {
-            new Chart(ctx, {
+            if (statsChart) statsChart.destroy();
+            statsChart = new Chart(ctx, {
                 type: 'bar',
                 data: {
                     labels: $scope.stats.map(s => s.name),
                     datasets: [{
-                        label: 'Item Counts',
+                        label: 'Changes',
                         data: $scope.stats.map(s => s.count),
-                        backgroundColor: ['#4e79a7', '#f28e2c', '#e15759']
+                        backgroundColor: palette
                     }]
                 },
                 options: {
@@ -36,6 +65,31 @@ angular.module('towerAdminApp')
                 }
             });
         }
-    }, 100);
+    }
+
+    $scope.loadActivity = function() {
+        $scope.loading = true;
+        const end = new Date();
+        const start = new Date(end.getTime() - ($scope.range.days - 1) * 24 * 60 * 60 * 1000);
+
+        apiService.getAuditActivity({ start: isoDate(start), end: isoDate(end), series: $scope.range.series })
+            .then(function(res) {
+                $scope.activity = res.data;
+                $scope.stats = Object.keys(res.data.totals.object_type).map(name => ({
+                    name: name,
+                    count: res.data.totals.object_type[name]
+                }));
+                // Delay to ensure the DOM element is rendered before Chart.js runs
+                $timeout(function() { renderCharts(res.data); }, 100);
+            })
+            .catch(function(err) {
+                console.error('Error fetching audit activity:', err);
+            })
+            .finally(function() {
+                $scope.loading = false;
+            });
+    };
+
+    $scope.loadActivity();
 
 });
@@ -46,10 +46,11 @@ angular.module('towerAdminApp')
 
         // Statistics (assuming these are from the backend as well)
         getDashboardCounts: function() {
-            return $http.get(BASE_URL + 'dashboard-counts/', getConfig()); // You might need to create this endpoint
+            return $http.get(BASE_URL + 'dashboard-counts/', getConfig());
         },
-        getJobChartData: function() {
-            return $http.get(BASE_URL + 'job-chart-data/', getConfig()); // You might need to create this endpoint
+        getJobChartData: function(period) {
+            const url = period ? BASE_URL + 'job-chart-data/?period=' + period : BASE_URL + 'job-chart-data/';
+            return $http.get(url, getConfig());
         },
 
         // Audit Logs
@@ -57,6 +58,9 @@ angular.module('towerAdminApp')
             const url = limit ? BASE_URL + 'audit-logs/?limit=' + limit : BASE_URL + 'audit-logs/';
             return $http.get(url, getConfig());
         },
+        getAuditActivity: function(params) {
+            return $http.get(BASE_URL + 'audit-logs/activity/', angular.extend({ params: params }, getConfig()));
+        },
 
         // User Management
         getUsers: function() {